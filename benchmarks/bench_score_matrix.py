@@ -0,0 +1,68 @@
+"""
+Compares the original per-cell score-matrix loop with the vectorized builders
+in `src.model`.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_score_matrix
+"""
+import timeit
+
+import numpy as np
+from scipy.stats import poisson
+
+from src import model
+
+
+def build_score_matrix_loop(home_lambda, away_lambda):
+    """The score-matrix construction as it was before vectorization, kept as a baseline."""
+    max_goals_home = int(poisson.ppf(0.9999, home_lambda))
+    max_goals_away = int(poisson.ppf(0.9999, away_lambda))
+
+    score_matrix = np.zeros((max_goals_home + 1, max_goals_away + 1))
+    for i in range(max_goals_home + 1):
+        for j in range(max_goals_away + 1):
+            prob_home = poisson.pmf(k=i, mu=home_lambda)
+            prob_away = poisson.pmf(k=j, mu=away_lambda)
+            score_matrix[i, j] = prob_home * prob_away
+    return score_matrix
+
+
+def make_slate(n_fixtures, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.3, 3.0, n_fixtures), rng.uniform(0.3, 3.0, n_fixtures)
+
+
+def main():
+    for n_fixtures in (10, 100, 1000):
+        home_lambdas, away_lambdas = make_slate(n_fixtures)
+
+        # Sanity check: all three builders must agree.
+        stacked = model.build_score_matrices(home_lambdas, away_lambdas)
+        for n, (home_lambda, away_lambda) in enumerate(zip(home_lambdas, away_lambdas)):
+            expected = build_score_matrix_loop(home_lambda, away_lambda)
+            h, a = expected.shape
+            assert np.allclose(model.build_score_matrix(home_lambda, away_lambda), expected)
+            assert np.allclose(stacked[n, :h, :a], expected)
+            assert not stacked[n, h:, :].any() and not stacked[n, :, a:].any()
+
+        number = 1 if n_fixtures >= 1000 else 3
+        loop = timeit.timeit(
+            lambda: [build_score_matrix_loop(h, a) for h, a in zip(home_lambdas, away_lambdas)], number=number
+        ) / number
+        vectorized = timeit.timeit(
+            lambda: [model.build_score_matrix(h, a) for h, a in zip(home_lambdas, away_lambdas)], number=number
+        ) / number
+        batched = timeit.timeit(
+            lambda: model.build_score_matrices(home_lambdas, away_lambdas), number=number
+        ) / number
+
+        print(
+            f"{n_fixtures:>5} fixtures | loop {loop * 1000:9.1f} ms | "
+            f"vectorized {vectorized * 1000:8.1f} ms ({loop / vectorized:6.1f}x) | "
+            f"batched {batched * 1000:7.2f} ms ({loop / batched:7.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Times the hot paths of the collector and the dashboards on synthetic data and
+writes the results to JSON, so runs on different commits can be compared.
+
+Covered: the Poisson model (API stubbed out), market probabilities, value-bet
+detection, settlement, the statistics breakdowns and the history store.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_suite                     # slates up to 10k fixtures, histories up to 1M bets
+    python -m benchmarks.bench_suite --quick             # smaller sizes, for a fast check
+    python -m benchmarks.bench_suite --only statistics   # a single suite
+    python -m benchmarks.bench_suite --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+"""
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from src import api_client, history_store, model, odds_matrix, probabilities, settlement, statistics, team_strength, value_finder
+from benchmarks import synthetic
+
+SLATE_SIZES = (10, 100, 1000, 10000)
+HISTORY_SIZES = (1000, 10000, 100000, 1000000)
+QUICK_SLATE_SIZES = (10, 100, 1000)
+QUICK_HISTORY_SIZES = (1000, 10000, 100000)
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+
+def measure(func, size, repeat=3, autorange=True):
+    """
+    Times `func` like `timeit`: calls are batched until a batch takes at least
+    0.2 s (one call per batch if `autorange` is False), then the best of
+    `repeat` batches is kept. Sizes of 1M and more are timed once.
+
+    Returns:
+        dict: Seconds per call (best and mean) and microseconds per item.
+    """
+    timer = timeit.Timer(func)
+    number = timer.autorange()[0] if autorange else 1
+    if size >= 1_000_000:
+        repeat = 1
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    best = min(times)
+    return {
+        "best_s": best,
+        "mean_s": sum(times) / len(times),
+        "calls": number * repeat,
+        "per_item_us": best / size * 1e6,
+    }
+
+
+class Stubbed:
+    """Replaces the API client and the model's on-disk caches for the duration of a benchmark."""
+
+    def __init__(self, with_standings=True):
+        self.with_standings = with_standings
+
+    def __enter__(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="bench-model-")
+        self.saved = (api_client.make_api_request, team_strength.TEAM_STRENGTH_DIR, model.LEAGUE_STATS_DIR)
+        api_client.make_api_request = synthetic.make_api_stub(self.with_standings)
+        team_strength.TEAM_STRENGTH_DIR = os.path.join(self.tmp_dir, "team_strength")
+        model.LEAGUE_STATS_DIR = os.path.join(self.tmp_dir, "league_stats")
+        reset_model_caches()
+        return self
+
+    def __exit__(self, *exc):
+        api_client.make_api_request, team_strength.TEAM_STRENGTH_DIR, model.LEAGUE_STATS_DIR = self.saved
+        reset_model_caches()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def reset_model_caches():
+    team_strength._tables.clear()
+    model._league_stats_memo.clear()
+
+
+def bench_model(slate_sizes):
+    results = []
+    for n in slate_sizes:
+        fixtures = synthetic.make_slate(n)
+        args = [
+            (f["teams"]["home"]["id"], f["teams"]["away"]["id"], f["league"]["id"], f["league"]["season"])
+            for f in fixtures
+        ]
+        # Tables are built on the first call of each league, then reused: time the steady state.
+        with Stubbed(with_standings=True):
+            [model.calculate_poisson_probabilities(*a) for a in args]
+            results.append(("model.calculate_poisson_probabilities[table]", n, measure(
+                lambda: [model.calculate_poisson_probabilities(*a) for a in args], n)))
+            results.append(("model.calculate_poisson_probabilities_batch", n, measure(
+                lambda: model.calculate_poisson_probabilities_batch(fixtures), n)))
+        # Leagues without standings: two `teams/statistics` requests per fixture (stubbed).
+        if n <= 1000:
+            with Stubbed(with_standings=False):
+                [model.calculate_poisson_probabilities(*a) for a in args]
+                results.append(("model.calculate_poisson_probabilities[stats]", n, measure(
+                    lambda: [model.calculate_poisson_probabilities(*a) for a in args], n)))
+    return results
+
+
+def _slate_inputs(n):
+    rng = np.random.default_rng(n)
+    home_lambdas = rng.uniform(0.3, 3.0, n)
+    away_lambdas = rng.uniform(0.3, 3.0, n)
+    return model.build_score_matrices(home_lambdas, away_lambdas), home_lambdas, away_lambdas
+
+
+def bench_probabilities(slate_sizes):
+    results = []
+    for n in slate_sizes:
+        matrices, home_lambdas, away_lambdas = _slate_inputs(n)
+        singles = [
+            (model.build_score_matrix(h, a), h, a) for h, a in zip(home_lambdas, away_lambdas)
+        ]
+        results.append(("probabilities.get_market_probabilities", n, measure(
+            lambda: [probabilities.get_market_probabilities(*s) for s in singles], n)))
+        results.append(("probabilities.get_market_probabilities_batch", n, measure(
+            lambda: probabilities.get_market_probabilities_batch(matrices, home_lambdas, away_lambdas), n)))
+    return results
+
+
+def bench_value_finder(slate_sizes):
+    results = []
+    for n in slate_sizes:
+        matrices, home_lambdas, away_lambdas = _slate_inputs(n)
+        probs = odds_matrix.stack_probabilities(
+            probabilities.get_market_probabilities_batch(matrices, home_lambdas, away_lambdas, lines=(2.5,))
+        )
+        responses = [synthetic.odds_response(fixture_id) for fixture_id in range(1, n + 1)]
+        results.append(("value_finder.index_odds", n, measure(
+            lambda: [value_finder.index_odds(r) for r in responses], n)))
+        # Every bookmaker of a 10-bookmaker slate, compared with our probabilities in one batch.
+        multi = {"response": [synthetic.odds_response(fixture_id, bookmakers=10)["response"][0] for fixture_id in range(1, n + 1)]}
+        results.append(("odds_matrix.OddsMatrix.from_index", n, measure(
+            lambda: odds_matrix.OddsMatrix.from_index(value_finder.index_odds(multi)), n)))
+        matrix = odds_matrix.OddsMatrix.from_index(value_finder.index_odds(multi))
+        results.append(("odds_matrix.find_value_bets[preferred]", n, measure(
+            lambda: odds_matrix.find_value_bets(probs, matrix.preferred_prices(), matrix.preferred_bookmakers()), n)))
+        results.append(("odds_matrix.find_value_bets[best]", n, measure(
+            lambda: odds_matrix.find_value_bets(probs, matrix.best_prices(), matrix.best_bookmakers()), n)))
+    return results
+
+
+def bench_settlement(history_sizes):
+    results = []
+    for n in history_sizes:
+        bets = synthetic.make_history(n)[["market", "bet_value"]].to_dict("records")
+        scores = synthetic.make_final_scores(n)
+        results.append(("settlement.settle_bet", n, measure(
+            lambda: [settlement.settle_bet(b, s) for b, s in zip(bets, scores)], n)))
+    return results
+
+
+def bench_statistics(history_sizes):
+    functions = [
+        ("statistics.get_stats_by_league", statistics.get_stats_by_league),
+        ("statistics.get_stats_by_market", statistics.get_stats_by_market),
+        ("statistics.get_stats_by_odds_range", statistics.get_stats_by_odds_range),
+        ("statistics.get_stats_by_value_range", statistics.get_stats_by_value_range),
+        ("statistics.get_stats_by_prob_range", statistics.get_stats_by_prob_range),
+        ("statistics.compute_all_stats", statistics.compute_all_stats),
+    ]
+    results = []
+    for n in history_sizes:
+        settled = synthetic.make_history(n, pending_share=0.0)
+        for name, func in functions:
+            results.append((name, n, measure(lambda: func(settled), n)))
+    return results
+
+
+def bench_history_store(history_sizes):
+    results = []
+    for n in history_sizes:
+        records = history_store.frame_to_records(synthetic.make_history(n))
+        settled = [record for record in records if record.get("outcome")]
+        with tempfile.TemporaryDirectory(prefix="bench-history-") as tmp_dir:
+            runs = iter(range(10 ** 9))
+
+            def save():
+                # Each call writes a fresh store, as a collector run writes its own segment.
+                history_store.append_bets(records, root=os.path.join(tmp_dir, f"run-{next(runs)}"))
+
+            results.append(("history_store.append_bets", n, measure(save, n, autorange=False)))
+            for run_dir in os.listdir(tmp_dir):
+                shutil.rmtree(os.path.join(tmp_dir, run_dir))
+
+            root = os.path.join(tmp_dir, "store")
+            history_store.append_bets(records, root=root)
+            history_store.record_outcomes(settled, root=root)
+            results.append(("history_store.load_frame[segments]", n, measure(
+                lambda: history_store.load_frame(root), n, autorange=False)))
+            # Only the first compaction folds the segments and patches in: time that one.
+            results.append(("history_store.compact", n, measure(
+                lambda: history_store.compact(root), n, repeat=1, autorange=False)))
+            results.append(("history_store.load_frame[parquet]", n, measure(
+                lambda: history_store.load_frame(root), n, autorange=False)))
+    return results
+
+
+SUITES = {
+    "model": (bench_model, "slate"),
+    "probabilities": (bench_probabilities, "slate"),
+    "value_finder": (bench_value_finder, "slate"),
+    "settlement": (bench_settlement, "history"),
+    "statistics": (bench_statistics, "history"),
+    "history_store": (bench_history_store, "history"),
+}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(slate_sizes, history_sizes, only=None):
+    """
+    Runs the suites and returns the results document.
+
+    Args:
+        only (str, optional): Run only the suites whose name contains this string.
+    """
+    benchmarks = []
+    for suite, (bench, kind) in SUITES.items():
+        if only and only not in suite:
+            continue
+        for name, size, timing in bench(slate_sizes if kind == "slate" else history_sizes):
+            benchmarks.append({"name": name, "size": size, **timing})
+            print(f"{name:<50} {size:>8} | {timing['best_s'] * 1000:10.2f} ms | {timing['per_item_us']:9.2f} us/item")
+
+    return {
+        "commit": git_commit(),
+        "created_utc": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "benchmarks": benchmarks,
+    }
+
+
+def compare(old_path, new_path):
+    """Prints the best time of every benchmark of two result files, with the ratio new/old."""
+    with open(old_path) as f:
+        old = {(b["name"], b["size"]): b for b in json.load(f)["benchmarks"]}
+    with open(new_path) as f:
+        new = json.load(f)["benchmarks"]
+    for bench in new:
+        before = old.get((bench["name"], bench["size"]))
+        if before is None:
+            continue
+        ratio = bench["best_s"] / before["best_s"]
+        flag = "  <-- slower" if ratio > 1.1 else ""
+        print(
+            f"{bench['name']:<50} {bench['size']:>8} | {before['best_s'] * 1000:10.2f} ms -> "
+            f"{bench['best_s'] * 1000:10.2f} ms | x{ratio:5.2f}{flag}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the model, probability, statistics and storage hot paths.")
+    parser.add_argument("--quick", action="store_true", help="Smaller slates and histories.")
+    parser.add_argument("--only", help=f"Only run the suites whose name contains this string ({', '.join(SUITES)}).")
+    parser.add_argument("--output", help="Path of the JSON results (default: benchmarks/results/<commit>.json).")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run(
+        QUICK_SLATE_SIZES if args.quick else SLATE_SIZES,
+        QUICK_HISTORY_SIZES if args.quick else HISTORY_SIZES,
+        only=args.only,
+    )
+    output = args.output or os.path.join(RESULTS_DIR, f"{(results['commit'] or 'local')[:12]}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Load tests of the collector against the replay server (`src/replay.py`), with
+no network access and no API quota spent.
+
+    python -m benchmarks.replay_archive build .cache/replay --fixtures 5000
+    python -m benchmarks.replay_archive run .cache/replay --concurrency 1 8 32 --latency 0.05 --error-rate 0.02
+
+`build` writes a synthetic archive: a slate of fixtures in the leagues of
+config/leagues.json, with their odds, standings, team statistics and final
+scores. Any archive recorded with API_RECORD_DIR can be replayed the same way.
+
+`run` starts the replay server and runs `data_collector.py` once per
+concurrency level, each time in a fresh working directory (empty history and
+caches). With `--passes 2` a second run follows in the same directory: it
+settles the bets of the first one and hits the response cache.
+"""
+import argparse
+from datetime import date
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from src import replay, value_finder
+from benchmarks import synthetic
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_archive(archive_dir, n_fixtures, with_standings=True, seed=0, bookmakers=1):
+    """
+    Writes a synthetic archive covering every request a collector run makes.
+
+    Returns:
+        int: The number of responses written.
+    """
+    with open(os.path.join(REPO_ROOT, "config", "leagues.json"), "r") as f:
+        league_ids = sorted(set(json.load(f).values()))
+    fixtures = synthetic.make_slate(n_fixtures, seed=seed, league_ids=league_ids)
+    responses = [("fixtures", {"date": date.today().isoformat()}, {"results": len(fixtures), "response": fixtures})]
+
+    leagues = sorted({f["league"]["id"] for f in fixtures})
+    responses.append(("leagues", {"current": "true"}, {"response": [
+        {"league": {"id": league_id}, "seasons": [{"year": synthetic.SEASON, "current": True}]} for league_id in leagues
+    ]}))
+    for league_id in leagues:
+        standings = synthetic.standings_response(league_id, seed) if with_standings else {"response": []}
+        responses.append(("standings", {"league": league_id, "season": synthetic.SEASON}, standings))
+
+    teams = sorted({(f["teams"][side]["id"], f["league"]["id"]) for f in fixtures for side in ("home", "away")})
+    for team_id, league_id in teams:
+        responses.append((
+            "teams/statistics", {"team": team_id, "league": league_id, "season": synthetic.SEASON},
+            synthetic.team_statistics_response(team_id, seed),
+        ))
+    for fixture_data in fixtures:
+        fixture_id = fixture_data["fixture"]["id"]
+        responses.append(("odds", {"fixture": fixture_id}, synthetic.odds_response(fixture_id, seed, bookmakers)))
+        responses.append(("fixtures", {"id": fixture_id}, {"response": [synthetic.finished_fixture(fixture_data, seed)]}))
+
+    # Paged bulk odds, by date and by league, as `value_finder.fetch_bulk_odds` requests them.
+    day = date.today().isoformat()
+    by_league = {}
+    for fixture_data in fixtures:
+        by_league.setdefault(fixture_data["league"]["id"], []).append(fixture_data)
+    bulk_queries = [({"date": day}, fixtures)] + [
+        ({"league": league_id, "season": synthetic.SEASON, "date": day}, league_fixtures)
+        for league_id, league_fixtures in by_league.items()
+    ]
+    for params, covered in bulk_queries:
+        total = max(1, -(-len(covered) // value_finder.ODDS_PAGE_SIZE))
+        for page in range(1, total + 1):
+            chunk = covered[(page - 1) * value_finder.ODDS_PAGE_SIZE:page * value_finder.ODDS_PAGE_SIZE]
+            entries = [synthetic.odds_response(f["fixture"]["id"], seed, bookmakers)["response"][0] for f in chunk]
+            responses.append(("odds", {**params, "page": page}, {
+                "paging": {"current": page, "total": total}, "results": len(entries), "response": entries,
+            }))
+
+    for endpoint, params, payload in responses:
+        replay.record(archive_dir, endpoint, params, payload)
+    return len(responses)
+
+
+def run_collector(work_dir, base_url, concurrency, rate_limit, collector_args=()):
+    """Runs data_collector.py against the replay server and returns (seconds, run profile)."""
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO_ROOT,
+        API_KEY="replay",
+        API_BASE_URL=base_url,
+        API_RATE_LIMIT_PER_MINUTE=str(rate_limit or 1_000_000),
+        API_RECORD_DIR="",
+    )
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, os.path.join(REPO_ROOT, "data_collector.py"), "--concurrency", str(concurrency), *collector_args],
+        cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:])
+        raise RuntimeError(f"data_collector.py exited with status {completed.returncode}")
+    with open(os.path.join(work_dir, "run_profile.json"), "r") as f:
+        return elapsed, json.load(f)
+
+
+def run_load_test(archive_dir, concurrency_levels, passes=1, collector_args=(), **server_options):
+    """
+    Runs the collector once per concurrency level (and pass) against a replay server.
+
+    Args:
+        archive_dir (str): The archive to replay.
+        concurrency_levels (list): Values of `data_collector.py --concurrency`.
+        passes (int): Runs per level in the same working directory.
+        collector_args (tuple): Extra arguments of data_collector.py.
+        **server_options: See `replay.ReplayServer`.
+
+    Returns:
+        list: One result dict per run.
+    """
+    server = replay.start_server(archive_dir, **server_options)
+    print(f"Replaying {len(server.archive)} responses on {server.base_url}")
+    results = []
+    try:
+        for concurrency in concurrency_levels:
+            work_dir = tempfile.mkdtemp(prefix="replay-run-")
+            shutil.copytree(os.path.join(REPO_ROOT, "config"), os.path.join(work_dir, "config"))
+            try:
+                for run_pass in range(1, passes + 1):
+                    before = dict(server.stats)
+                    elapsed, profile = run_collector(
+                        work_dir, server.base_url, concurrency, server_options.get("rate_limit_per_minute"), collector_args
+                    )
+                    http = profile.get("http", {})
+                    result = {
+                        "concurrency": concurrency,
+                        "pass": run_pass,
+                        "wall_s": round(elapsed, 2),
+                        "fixtures_analyzed": profile["counters"].get("fixtures_analyzed", 0),
+                        "bets_settled": profile["counters"].get("bets_settled", 0),
+                        "requests": http.get("requests", 0),
+                        "retries": http.get("retries", 0),
+                        "failures": http.get("failures", 0),
+                        "cache_hits": sum(summary["cache_hits"] for summary in profile["api"].values()),
+                        "throttle_wait_s": round(http.get("throttle_wait", 0.0), 2),
+                        "server": {key: server.stats[key] - before[key] for key in server.stats},
+                    }
+                    results.append(result)
+                    print(
+                        f"concurrency {concurrency:>3} pass {run_pass} | {result['wall_s']:8.2f}s | "
+                        f"{result['fixtures_analyzed']} fixtures, {result['bets_settled']} settled | "
+                        f"{result['requests']} requests, {result['retries']} retries, {result['failures']} failures, "
+                        f"{result['cache_hits']} cache hits, {result['throttle_wait_s']}s throttled"
+                    )
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load tests of the collector against recorded API responses.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Write a synthetic archive.")
+    build.add_argument("archive", help="Output directory.")
+    build.add_argument("--fixtures", type=int, default=1000)
+    build.add_argument("--no-standings", action="store_true", help="Force the teams/statistics fallback of the model.")
+    build.add_argument("--seed", type=int, default=0)
+    build.add_argument("--bookmakers", type=int, default=1, help="Bookmakers quoting each fixture.")
+
+    run = subparsers.add_parser("run", help="Run the collector against an archive.")
+    run.add_argument("archive", help="Archive directory (synthetic or recorded with API_RECORD_DIR).")
+    run.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    run.add_argument("--passes", type=int, default=1, help="Runs per concurrency level in the same directory.")
+    run.add_argument("--latency", type=float, default=0.05)
+    run.add_argument("--jitter", type=float, default=0.0)
+    run.add_argument("--error-rate", type=float, default=0.0)
+    run.add_argument("--rate-429", type=float, default=0.0)
+    run.add_argument("--rate-limit", type=int, default=0, help="Server-side requests per minute (0: no limit).")
+    run.add_argument("--daily-quota", type=int, default=0)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--per-fixture-odds", action="store_true", help="Passed to data_collector.py.")
+    run.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        written = build_archive(
+            args.archive, args.fixtures, with_standings=not args.no_standings, seed=args.seed, bookmakers=args.bookmakers
+        )
+        print(f"Wrote {written} responses to '{args.archive}'.")
+        return
+
+    results = run_load_test(
+        args.archive, args.concurrency, passes=args.passes,
+        collector_args=("--per-fixture-odds",) if args.per_fixture_odds else (), latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, rate_429=args.rate_429, rate_limit_per_minute=args.rate_limit,
+        daily_quota=args.daily_quota, seed=args.seed,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Synthetic inputs for the benchmarks: fixture slates, API responses and bet histories
+shaped like the real ones, generated from a seed so every run times the same data.
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+TEAMS_PER_LEAGUE = 20
+SEASON = 2025
+
+MARKETS = [
+    ("1X2", "Home"), ("1X2", "Draw"), ("1X2", "Away"),
+    ("O/U 2.5", "Over"), ("O/U 2.5", "Under"),
+    ("BTTS", "Yes"), ("BTTS", "No"),
+]
+
+
+def make_slate(n_fixtures, n_leagues=40, seed=0, league_ids=None):
+    """
+    Fixtures in the format of the `fixtures` endpoint, spread over `n_leagues` leagues.
+    League IDs start at 1 (or are drawn from `league_ids`) and team IDs are `league_id * 100 + n`.
+    """
+    rng = np.random.default_rng(seed)
+    league_ids = list(league_ids) if league_ids else list(range(1, n_leagues + 1))
+    kickoff = datetime(2025, 9, 1, 18, 0, tzinfo=timezone.utc)
+    fixtures = []
+    for fixture_id in range(1, n_fixtures + 1):
+        league_id = int(league_ids[rng.integers(len(league_ids))])
+        home, away = rng.choice(TEAMS_PER_LEAGUE, size=2, replace=False)
+        fixtures.append({
+            "fixture": {"id": fixture_id, "date": kickoff.isoformat(), "status": {"short": "NS"}},
+            "league": {"id": league_id, "season": SEASON, "name": f"League {league_id}"},
+            "teams": {
+                "home": {"id": league_id * 100 + int(home), "name": f"Team {league_id}-{home}"},
+                "away": {"id": league_id * 100 + int(away), "name": f"Team {league_id}-{away}"},
+            },
+        })
+    return fixtures
+
+
+def _record(rng, played):
+    return {
+        "played": int(played),
+        "goals": {"for": int(rng.poisson(1.4 * played)), "against": int(rng.poisson(1.2 * played))},
+    }
+
+
+def standings_response(league_id, seed=0):
+    """A `standings` response for a league of the slate."""
+    rng = np.random.default_rng(seed + league_id)
+    entries = [
+        {"team": {"id": league_id * 100 + n}, "home": _record(rng, 10), "away": _record(rng, 10)}
+        for n in range(TEAMS_PER_LEAGUE)
+    ]
+    return {"response": [{"league": {"id": league_id, "standings": [entries]}}]}
+
+
+def team_statistics_response(team_id, seed=0):
+    """A `teams/statistics` response for a team of the slate."""
+    rng = np.random.default_rng(seed + team_id)
+    return {
+        "response": {
+            "fixtures": {"played": {"home": 10, "away": 10}},
+            "goals": {
+                "for": {"total": {"home": int(rng.poisson(14)), "away": int(rng.poisson(11))}},
+                "against": {"total": {"home": int(rng.poisson(11)), "away": int(rng.poisson(14))}},
+            },
+        }
+    }
+
+
+def make_api_stub(with_standings=True, seed=0):
+    """
+    Returns a stand-in for `api_client.make_api_request` answering from the
+    synthetic data, with no network access.
+
+    Args:
+        with_standings (bool): If False, standings are empty, so the model falls
+            back to `teams/statistics` requests.
+    """
+    def make_api_request(endpoint, params=None, use_cache=True):
+        params = params or {}
+        if endpoint == "standings":
+            return standings_response(int(params["league"]), seed) if with_standings else {"response": []}
+        if endpoint == "teams/statistics":
+            return team_statistics_response(int(params["team"]), seed)
+        return {"response": []}
+
+    return make_api_request
+
+
+def odds_response(fixture_id, seed=0, bookmakers=1):
+    """
+    An `odds` response for a fixture of the slate. Bet365 (ID 8) is listed first;
+    the other bookmakers (IDs 1, 2, ...) quote its prices give or take 10%.
+    """
+    rng = np.random.default_rng(seed + fixture_id)
+    prices = rng.uniform(1.2, 6.0, 7)
+
+    def bet(name, values):
+        return {"name": name, "values": [{"value": value, "odd": f"{odd:.2f}"} for value, odd in values]}
+
+    def bookmaker(bookmaker_id, name, odds):
+        home, draw, away, over, under, yes, no = odds.round(2).tolist()
+        return {"id": bookmaker_id, "name": name, "bets": [
+            bet("Match Winner", [("Home", home), ("Draw", draw), ("Away", away)]),
+            bet("Goals Over/Under", [("Over 2.5", over), ("Under 2.5", under)]),
+            bet("Both Teams Score", [("Yes", yes), ("No", no)]),
+        ]}
+
+    listed = [bookmaker(8, "Bet365", prices)] + [
+        bookmaker(i, f"Bookmaker {i}", prices * rng.uniform(0.9, 1.1, 7)) for i in range(1, bookmakers)
+    ]
+    return {"response": [{"fixture": {"id": fixture_id}, "bookmakers": listed}]}
+
+
+def finished_fixture(fixture_data, seed=0):
+    """The fixture of the slate as the `fixtures?id=` endpoint returns it once played."""
+    rng = np.random.default_rng(seed + fixture_data["fixture"]["id"])
+    home, away = rng.poisson(1.4, 2).tolist()
+    return {
+        **fixture_data,
+        "fixture": {**fixture_data["fixture"], "status": {"short": "FT"}},
+        "goals": {"home": home, "away": away},
+    }
+
+
+def make_history(n_bets, n_leagues=40, pending_share=0.05, seed=0):
+    """
+    A bet history of `n_bets` bets in the `history_store` format.
+
+    Returns:
+        pd.DataFrame: Columns of `history_store.COLUMNS`; pending bets have no outcome.
+    """
+    rng = np.random.default_rng(seed)
+    fixture_ids = np.arange(n_bets) // 3 + 1
+    markets = rng.integers(0, len(MARKETS), n_bets)
+    leagues = rng.integers(1, n_leagues + 1, n_bets)
+    odds = rng.uniform(1.2, 6.0, n_bets).round(2)
+    probability = np.clip(rng.uniform(1.0, 1.6, n_bets) / odds, 0.05, 0.99)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    match_dates = [start + timedelta(hours=int(h)) for h in (fixture_ids * 7) % (24 * 600)]
+    outcomes = rng.choice(np.array(["Win", "Loss", "Push"], dtype=object), n_bets, p=[0.47, 0.51, 0.02])
+    outcomes[rng.random(n_bets) < pending_share] = None
+
+    return pd.DataFrame({
+        "fixture_id": fixture_ids,
+        "match": [f"Team {league}-{f % 20} vs Team {league}-{(f + 7) % 20}" for league, f in zip(leagues, fixture_ids)],
+        "league": [f"League {league}" for league in leagues],
+        "match_date": [d.isoformat() for d in match_dates],
+        "market": [MARKETS[m][0] for m in markets],
+        "bet_value": [MARKETS[m][1] for m in markets],
+        "probability": probability,
+        "odds": odds,
+        "value": probability * odds,
+        "timestamp": [(d - timedelta(hours=10)).replace(tzinfo=None).isoformat() for d in match_dates],
+        "outcome": outcomes,
+    })
+
+
+def make_final_scores(n, seed=0):
+    """Final scores in the format of the `fixtures` endpoint `goals` object."""
+    rng = np.random.default_rng(seed)
+    goals = rng.poisson(1.4, size=(n, 2)).tolist()
+    return [{"home": home, "away": away} for home, away in goals]
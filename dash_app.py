@@ -1,54 +1,130 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+import threading
+import time
+
 import dash
 import dash_bootstrap_components as dbc
 from dash import html, dash_table, dcc, Input, Output, State
 import pandas as pd
-import json
-import os
-from src import statistics
+from decouple import config
+from src import dashboard_data, history_store, stats_cube, stats_memo
 
-# --- Data Loading and Preparation ---
-HISTORY_FILE = "history.json"
+# How often (seconds) the history store is checked for new data.
+RELOAD_INTERVAL = config("DASH_RELOAD_INTERVAL", default=30, cast=int)
 
+# --- Data Loading and Preparation ---
 def load_data():
-    """Loads all historical value bets from the history file."""
-    if not os.path.exists(HISTORY_FILE):
-        return pd.DataFrame()
-    with open(HISTORY_FILE, "r") as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError:
-            return pd.DataFrame()
-    if not data:
-        return pd.DataFrame()
-    return pd.DataFrame(data)
-
-def prepare_data(df):
-    """Prepares the dataframe for display and filtering."""
-    if df.empty:
-        return df
+    """
+    Loads the prepared history (see src/dashboard_data.py) and its version.
+    Bets without a valid date are left out.
+    """
+    bets, version = dashboard_data.load_prepared_bets()
+    return bets.dropna(subset=['display_date_dt']), version
 
-    if 'match_date' in df.columns:
-        match_dates_dt = pd.to_datetime(df['match_date'], errors='coerce', utc=True)
-        timestamps_dt = pd.to_datetime(df['timestamp'], errors='coerce', utc=True)
-        df['display_date_dt'] = match_dates_dt.fillna(timestamps_dt)
-    else:
-        df['display_date_dt'] = pd.to_datetime(df['timestamp'], errors='coerce', utc=True)
+# History table columns: (id in the prepared frame, displayed name).
+HISTORY_COLUMNS = [
+    ("date", "Date"), ("match", "Match"), ("league", "Ligue"), ("market", "Marché"), ("bet_value", "Pari"),
+    ("probability", "Notre Prob."), ("odds", "Cote"), ("value", "Valeur"), ("outcome", "Résultat"),
+]
+DATE_FORMAT = '%Y-%m-%d %H:%M'
+# Outcome shown for bets that are not settled yet.
+PENDING_LABEL = 'En attente'
+
+# Operators of the DataTable filter row: (filter_query tokens, operator).
+FILTER_OPERATORS = [
+    (('>=', 'ge '), '>='), (('<=', 'le '), '<='), (('<', 'lt '), '<'), (('>', 'gt '), '>'),
+    (('!=', 'ne '), '!='), (('=', 'eq '), '='), (('contains ',), 'contains'), (('datestartswith ',), 'datestartswith'),
+]
 
-    df.dropna(subset=['display_date_dt'], inplace=True)
-    df['Date'] = df['display_date_dt'].dt.strftime('%Y-%m-%d %H:%M')
+def split_filter_part(filter_part):
+    """
+    Parses one `{column} operator value` clause of a DataTable filter_query.
 
-    df.rename(columns={
-        "match": "Match", "league": "Ligue", "market": "Marché",
-        "bet_value": "Pari", "probability": "Notre Prob.", "odds": "Cote",
-        "value": "Valeur", "outcome": "Résultat"
-    }, inplace=True)
+    Returns:
+        tuple: (column, operator, value), or (None, None, None) if the clause is not understood.
+    """
+    filter_part = filter_part.strip()
+    if not filter_part.startswith('{') or '}' not in filter_part:
+        return None, None, None
+    name, rest = filter_part[1:].split('}', 1)
+    rest = rest.lstrip()
+    # Dash may prefix operators with 'i'/'s' (case-insensitive/sensitive); text filters here are case-insensitive anyway.
+    if rest[:1] in ('i', 's') and any(rest[1:].startswith(token) for tokens, _ in FILTER_OPERATORS for token in tokens):
+        rest = rest[1:]
+    for tokens, operator in FILTER_OPERATORS:
+        token = next((token for token in tokens if rest.startswith(token)), None)
+        if token is None:
+            continue
+        value_part = rest[len(token):].strip()
+        if len(value_part) > 1 and value_part[0] == value_part[-1] and value_part[0] in ("'", '"', '`'):
+            value = value_part[1:-1].replace('\\' + value_part[0], value_part[0])
+        else:
+            try:
+                value = float(value_part)
+            except ValueError:
+                value = value_part
+        return name, operator, value
+    return None, None, None
 
-    df['Résultat'] = df['Résultat'].fillna('En attente')
+def filter_history(df, filter_query):
+    """Applies a DataTable filter_query (clauses joined by ' && ') to the history."""
+    if not filter_query:
+        return df
+    for filter_part in filter_query.split(' && '):
+        column, operator, value = split_filter_part(filter_part)
+        if column == 'date':
+            # The displayed date is formatted per page; filters match the same text.
+            df = df.assign(date=df['display_date_dt'].dt.strftime(DATE_FORMAT))
+        elif column == 'outcome':
+            # Pending bets are displayed with PENDING_LABEL; filters match the same text.
+            df = df.assign(outcome=df['outcome'].astype(object).fillna(PENDING_LABEL))
+        elif column not in df.columns:
+            continue
+        if operator == 'contains':
+            df = df[df[column].astype(str).str.contains(str(value), case=False, na=False, regex=False)]
+        elif operator == 'datestartswith':
+            df = df[df[column].astype(str).str.startswith(str(value), na=False)]
+        elif operator in ('=', '!='):
+            matches = df[column] == value
+            df = df[matches if operator == '=' else ~matches]
+        else:
+            comparisons = {'>=': 'ge', '<=': 'le', '<': 'lt', '>': 'gt'}
+            try:
+                df = df[getattr(df[column], comparisons[operator])(value)]
+            except TypeError:
+                continue
     return df
 
-# Load and prepare data once at startup
-df_raw = load_data()
-df_prepared = prepare_data(df_raw.copy())
+# Everything the callbacks read, replaced as a whole when the history changes.
+# Callbacks take a reference to the current snapshot once, so a reload never
+# changes the data under a callback that is already running.
+DataSnapshot = namedtuple("DataSnapshot", ["bets", "stats_cells", "version", "loaded_at"])
+
+def load_snapshot():
+    """Loads the prepared history and the stats cube."""
+    bets, version = load_data()
+    return DataSnapshot(bets, stats_cube.load_cube(), version, datetime.now(timezone.utc))
+
+snapshot = load_snapshot()
+
+def watch_history_store():
+    """Polls the history store and swaps in a fresh snapshot when its files change."""
+    global snapshot
+    while True:
+        time.sleep(RELOAD_INTERVAL)
+        try:
+            if history_store.store_version() != snapshot.version:
+                snapshot = load_snapshot()
+                print(f"History reloaded (version {snapshot.version}, {len(snapshot.bets)} bets).")
+        except Exception as e:
+            # Keep serving the current data; the next poll tries again.
+            print(f"Warning: could not reload the history: {e}")
+
+threading.Thread(target=watch_history_store, name="history-watcher", daemon=True).start()
+
+def format_data_status(data):
+    return f"Données version {data.version} chargées le {data.loaded_at.strftime('%d/%m/%Y à %H:%M:%S UTC')} ({len(data.bets)} paris)"
 
 # --- App Layout ---
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME])
@@ -72,6 +148,11 @@ def build_stats_card(title, metric_val, metric_label, data, id_suffix):
 
 app.layout = dbc.Container([
     html.H1("Bilan & Historique des Value Bets (Dash Version)"),
+    html.Small(format_data_status(snapshot), id='data-status', className="text-muted"),
+    # The page checks for a reloaded snapshot at the watcher's pace; the version
+    # store changes only when new data is in, which refreshes every output.
+    dcc.Interval(id='data-refresh', interval=RELOAD_INTERVAL * 1000),
+    dcc.Store(id='data-version', data=snapshot.version),
     html.Hr(),
 
     dbc.Row([
@@ -82,14 +163,15 @@ app.layout = dbc.Container([
                     dbc.Label("Filtrer par ligue :"),
                     dcc.Dropdown(
                         id='league-filter',
-                        options=[{'label': i, 'value': i} for i in sorted(df_prepared['Ligue'].unique())],
-                        value=list(df_prepared['Ligue'].unique()),
+                        options=[{'label': i, 'value': i} for i in sorted(snapshot.bets['league'].dropna().unique())],
+                        value=list(snapshot.bets['league'].dropna().unique()),
                         multi=True,
                     ),
                 ]),
                 html.Div([
                     dbc.Label("Rechercher une équipe :", className="mt-3"),
-                    dbc.Input(id='team-search', type='text', placeholder='Entrez un nom d\'équipe...'),
+                    # Debounced: the callbacks run once the user pauses typing, not on every keystroke.
+                    dbc.Input(id='team-search', type='text', placeholder='Entrez un nom d\'équipe...', debounce=400),
                 ]),
             ], body=True),
             html.Hr(),
@@ -108,16 +190,23 @@ app.layout = dbc.Container([
         dbc.Col(
             dash_table.DataTable(
                 id='history-table',
-                columns=[{"name": i, "id": i} for i in ["Date", "Match", "Ligue", "Marché", "Pari", "Notre Prob.", "Cote", "Valeur", "Résultat"]],
+                columns=[{"name": name, "id": column} for column, name in HISTORY_COLUMNS],
                 style_cell={'textAlign': 'left', 'fontFamily': 'sans-serif'},
                 style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'},
                 style_data_conditional=[
-                    {'if': {'column_id': 'Résultat', 'filter_query': '{Résultat} = "Win"'}, 'color': 'green', 'fontWeight': 'bold'},
-                    {'if': {'column_id': 'Résultat', 'filter_query': '{Résultat} = "Loss"'}, 'color': 'red', 'fontWeight': 'bold'},
-                    {'if': {'column_id': 'Résultat', 'filter_query': '{Résultat} = "Push"'}, 'color': 'grey', 'fontWeight': 'bold'},
+                    {'if': {'column_id': 'outcome', 'filter_query': '{outcome} = "Win"'}, 'color': 'green', 'fontWeight': 'bold'},
+                    {'if': {'column_id': 'outcome', 'filter_query': '{outcome} = "Loss"'}, 'color': 'red', 'fontWeight': 'bold'},
+                    {'if': {'column_id': 'outcome', 'filter_query': '{outcome} = "Push"'}, 'color': 'grey', 'fontWeight': 'bold'},
                 ],
+                # Paging, sorting and filtering run on the server: only the visible page is sent.
+                page_current=0,
                 page_size=15,
-                sort_action="native",
+                page_action="custom",
+                sort_action="custom",
+                sort_mode="single",
+                sort_by=[],
+                filter_action="custom",
+                filter_query="",
             ),
             md=8,
         ),
@@ -139,9 +228,74 @@ app.layout = dbc.Container([
 ], fluid=True)
 
 # --- Callbacks ---
+@app.callback(
+    [Output('data-version', 'data'),
+     Output('data-status', 'children')],
+    [Input('data-refresh', 'n_intervals')],
+    [State('data-version', 'data')]
+)
+def check_data_version(_, shown_version):
+    data = snapshot
+    if data.version == shown_version:
+        return dash.no_update, dash.no_update
+    return data.version, format_data_status(data)
+
+@app.callback(
+    [Output('league-filter', 'options'),
+     Output('league-filter', 'value')],
+    [Input('data-version', 'data')],
+    [State('league-filter', 'options'),
+     State('league-filter', 'value')],
+    prevent_initial_call=True
+)
+def update_league_options(_, options, selected_leagues):
+    leagues = sorted(snapshot.bets['league'].dropna().unique())
+    # Leagues that appear with the new data are selected, like every league at startup.
+    known = {option['value'] for option in options or []}
+    new_leagues = [league for league in leagues if league not in known]
+    return [{'label': i, 'value': i} for i in leagues], (selected_leagues or []) + new_leagues
+
+def filter_bets(bets, selected_leagues, search_query):
+    """Rows of the history matching the league filter and the team search."""
+    filtered_df = bets[bets['league'].isin(selected_leagues or [])]
+    if search_query:
+        filtered_df = filtered_df[filtered_df['match'].str.contains(search_query, case=False, na=False, regex=False)]
+    return filtered_df
+
 @app.callback(
     [Output('history-table', 'data'),
-     Output('metric-total-settled', 'children'),
+     Output('history-table', 'page_count')],
+    [Input('league-filter', 'value'),
+     Input('team-search', 'value'),
+     Input('history-table', 'page_current'),
+     Input('history-table', 'page_size'),
+     Input('history-table', 'sort_by'),
+     Input('history-table', 'filter_query'),
+     Input('data-version', 'data')]
+)
+def update_history_table(selected_leagues, search_query, page_current, page_size, sort_by, filter_query, _):
+    page_df = filter_history(filter_bets(snapshot.bets, selected_leagues, search_query), filter_query)
+
+    if sort_by and (sort_by[0]['column_id'] == 'date' or sort_by[0]['column_id'] in page_df.columns):
+        column = sort_by[0]['column_id']
+        # 'date' is display text; its chronological order is the parsed datetime's.
+        page_df = page_df.sort_values(
+            by='display_date_dt' if column == 'date' else column,
+            ascending=sort_by[0]['direction'] == 'asc',
+            kind='stable',
+        )
+
+    page_count = max(1, -(-len(page_df) // page_size))
+    start = min(page_current or 0, page_count - 1) * page_size
+    page = page_df.iloc[start:start + page_size]
+    rows = page.assign(
+        date=page['display_date_dt'].dt.strftime(DATE_FORMAT),
+        outcome=page['outcome'].astype(object).fillna(PENDING_LABEL),
+    )
+    return rows[[column for column, _ in HISTORY_COLUMNS]].to_dict('records'), page_count
+
+@app.callback(
+    [Output('metric-total-settled', 'children'),
      Output('metric-win-rate', 'children'),
      Output('metric-profit', 'children'),
      Output('metric-roi', 'children'),
@@ -152,26 +306,23 @@ app.layout = dbc.Container([
      Output('metric-val-prob', 'children'), Output('metric-label-prob', 'children'), Output('stats-table-prob', 'children'),
      ],
     [Input('league-filter', 'value'),
-     Input('team-search', 'value')]
+     Input('team-search', 'value'),
+     Input('data-version', 'data')]
 )
-def update_outputs(selected_leagues, search_query):
-    # --- Filter Data ---
-    filtered_df = df_prepared[df_prepared['Ligue'].isin(selected_leagues)]
-    if search_query:
-        filtered_df = filtered_df[filtered_df['Match'].str.contains(search_query, case=False, na=False)]
-
-    sorted_df = filtered_df.sort_values(by="display_date_dt", ascending=False)
-
+def update_outputs(selected_leagues, search_query, _):
+    data = snapshot
     # --- Calculate Overall Metrics ---
-    settled_bets = sorted_df.dropna(subset=['Résultat'])
-    total_settled = len(settled_bets)
+    # Memoized per (data version, leagues, search): filter combinations already
+    # viewed, by any user, are not recomputed.
+    summary = stats_memo.performance_summary(
+        data.version, data.bets, data.stats_cells, selected_leagues, search_query, min_bets=10
+    )
+    totals = summary['totals']
+    total_settled = totals['bets']
     if total_settled > 0:
-        wins = settled_bets[settled_bets['Résultat'] == 'Win']
-        losses = settled_bets[settled_bets['Résultat'] == 'Loss']
-        win_rate = f"{len(wins) / total_settled:.2%}"
-        profit = (wins['Cote'] - 1).sum() - len(losses)
-        roi = f"{(profit / total_settled):.2%}"
-        profit_str = f"{profit:+.2f} u"
+        win_rate = f"{totals['win_rate']:.2%}"
+        roi = f"{totals['roi']:.2%}"
+        profit_str = f"{totals['profit']:+.2f} u"
     else:
         win_rate, profit_str, roi = "0.00%", "0.00 u", "0.00%"
 
@@ -192,23 +343,17 @@ def update_outputs(selected_leagues, search_query):
             return metric_val, metric_label, table
         return "-", king_prefix, None
 
-    league_stats = statistics.get_stats_by_league(settled_bets, min_bets=10).head(10)
-    mv_league, ml_league, table_league = generate_stats_output(league_stats, 'Ligue', "Roi des Ligues")
-
-    market_stats = statistics.get_stats_by_market(settled_bets)
-    mv_market, ml_market, table_market = generate_stats_output(market_stats, 'Type de Pari', "Roi des Marchés")
+    all_stats = summary['stats']
 
-    odds_stats = statistics.get_stats_by_odds_range(settled_bets)
-    mv_odds, ml_odds, table_odds = generate_stats_output(odds_stats, 'Tranche de Cotes', "Reine des Cotes")
-
-    value_stats = statistics.get_stats_by_value_range(settled_bets)
-    mv_value, ml_value, table_value = generate_stats_output(value_stats, 'Tranche de Valeur', "Reine de la Valeur")
+    league_stats = all_stats['league'].head(10)
+    mv_league, ml_league, table_league = generate_stats_output(league_stats, 'Ligue', "Roi des Ligues")
 
-    prob_stats = statistics.get_stats_by_prob_range(settled_bets)
-    mv_prob, ml_prob, table_prob = generate_stats_output(prob_stats, 'Tranche de Proba', "Reine de la Proba")
+    mv_market, ml_market, table_market = generate_stats_output(all_stats['market'], 'Type de Pari', "Roi des Marchés")
+    mv_odds, ml_odds, table_odds = generate_stats_output(all_stats['odds'], 'Tranche de Cotes', "Reine des Cotes")
+    mv_value, ml_value, table_value = generate_stats_output(all_stats['value'], 'Tranche de Valeur', "Reine de la Valeur")
+    mv_prob, ml_prob, table_prob = generate_stats_output(all_stats['prob'], 'Tranche de Proba', "Reine de la Proba")
 
     return (
-        sorted_df.to_dict('records'),
         total_settled, win_rate, profit_str, roi,
         mv_league, ml_league, table_league,
         mv_market, ml_market, table_market,
@@ -1,9 +1,13 @@
-from datetime import datetime, date
+from datetime import datetime, date, timedelta, timezone
+import argparse
+import asyncio
+import functools
 import json
 import os
-from src import api_client, model, probabilities, value_finder
 
-HISTORY_FILE = "history.json"
+import numpy as np
+
+from src import api_client, checkpoint, history_store, instrumentation, ledger, model, odds_matrix, probabilities, response_cache, stats_cube, team_strength, value_finder
 
 def load_allowed_leagues():
     """Loads the list of allowed league IDs from the config file."""
@@ -15,9 +19,74 @@ def load_allowed_leagues():
         print("Warning: config/leagues.json not found. No league filter will be applied.")
         return None
 
-def get_daily_fixtures():
-    """Fetches all fixtures for the current day."""
-    today = date.today().strftime('%Y-%m-%d')
+def load_league_priority():
+    """
+    Returns a mapping of league ID to priority rank (0 = most important).
+    Leagues are ranked in the order they are listed in config/leagues.json.
+    """
+    try:
+        with open("config/leagues.json", "r") as f:
+            leagues_data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {league_id: rank for rank, league_id in enumerate(leagues_data.values())}
+
+def estimate_fixture_cost(fixture_data, include_odds=True):
+    """
+    Counts the API calls analysing a fixture will cost, ignoring requests already cached.
+    `include_odds` is False when the odds are fetched in bulk beforehand.
+    """
+    league_id = fixture_data['league']['id']
+    season = fixture_data['league']['season']
+    home_team_id = fixture_data['teams']['home']['id']
+    away_team_id = fixture_data['teams']['away']['id']
+    requests_needed = [("odds", {"fixture": fixture_data['fixture']['id']})] if include_odds else []
+
+    table = team_strength.get_table(league_id, season)
+    if table is None or not table.lookup([home_team_id, away_team_id])[1].all():
+        requests_needed += [
+            ("teams/statistics", {"team": home_team_id, "league": league_id, "season": season}),
+            ("teams/statistics", {"team": away_team_id, "league": league_id, "season": season}),
+        ]
+    return sum(1 for endpoint, params in requests_needed if not response_cache.contains(endpoint, params))
+
+def plan_fixtures(fixtures, league_priority, remaining_quota, include_odds=True):
+    """
+    Orders fixtures by league priority (then kickoff time) and keeps those that
+    fit in the remaining daily API quota, so the most valuable leagues are
+    analysed before the quota runs out.
+
+    Args:
+        fixtures (list): Fixtures from the API.
+        league_priority (dict): League ID to rank, as returned by `load_league_priority`.
+        remaining_quota (int or None): API calls left today, or None if unknown.
+        include_odds (bool): Whether each fixture costs an `odds` request (False with bulk odds).
+
+    Returns:
+        list: The fixtures to analyse, in order.
+    """
+    unranked = len(league_priority)
+    ordered = sorted(
+        fixtures,
+        key=lambda f: (league_priority.get(f['league']['id'], unranked), f['fixture'].get('date') or '')
+    )
+    if remaining_quota is None:
+        return ordered
+
+    planned = []
+    budget = remaining_quota
+    for fixture_data in ordered:
+        cost = estimate_fixture_cost(fixture_data, include_odds)
+        if cost <= budget:
+            planned.append(fixture_data)
+            budget -= cost
+    if len(planned) < len(ordered):
+        print(f"API quota allows {len(planned)} of {len(ordered)} matches ({remaining_quota} calls left). Lower-priority leagues are skipped.")
+    return planned
+
+def get_daily_fixtures(today=None):
+    """Fetches all fixtures for the current day (or for `today`, as YYYY-MM-DD)."""
+    today = today or date.today().strftime('%Y-%m-%d')
     endpoint = "fixtures"
     params = {"date": today}
 
@@ -30,18 +99,400 @@ def get_daily_fixtures():
 
     return response['response']
 
-def run_analysis(existing_fixture_ids: set):
+def ingest_odds(fixtures, day_fixtures, day, concurrency=1):
+    """
+    Pulls the odds of the fixtures to analyse in paged bulk `odds` requests (by
+    date or by league, see `value_finder.plan_bulk_odds_queries`) before the
+    model runs, instead of one request per fixture.
+
+    Args:
+        fixtures (list): The fixtures to analyse.
+        day_fixtures (list): Every fixture of the day.
+        day (str): The date, as YYYY-MM-DD.
+        concurrency (int): Pages fetched in parallel. 1 fetches them one after the other.
+
+    Returns:
+        dict: Fixture ID to its `value_finder.index_odds` entry (every bookmaker), or to
+        None when the bulk answer shows it has no odds. Fixtures left out (a page failed)
+        fall back to a per-fixture request.
+    """
+    queries, pages = value_finder.plan_bulk_odds_queries(fixtures, day_fixtures, day)
+    print(f"Fetching odds in bulk ({len(queries)} queries, about {pages} pages)...")
+    if concurrency > 1:
+        async def fetch():
+            async with api_client.create_async_session(limit=concurrency) as session:
+                return await value_finder.fetch_bulk_odds_async(session, queries, concurrency)
+        odds_index, complete = asyncio.run(fetch())
+    else:
+        odds_index, complete = value_finder.fetch_bulk_odds(queries)
+
+    wanted = [f['fixture']['id'] for f in fixtures]
+    found = sum(1 for fixture_id in wanted if fixture_id in odds_index and odds_index[fixture_id]['bookmakers'])
+    print(f"Bulk odds found for {found} of {len(wanted)} matches.")
+    if complete and found:
+        # A complete answer is authoritative: matches missing from it have no odds.
+        return {fixture_id: odds_index.get(fixture_id) for fixture_id in wanted}
+    return {fixture_id: odds_index[fixture_id] for fixture_id in wanted if fixture_id in odds_index}
+
+def build_bet_records(fixture_data, value_bets_found):
+    """
+    Turns the value bets found for a fixture (see `odds_matrix.find_value_bets`)
+    into history records.
+    """
+    fixture_id = fixture_data['fixture']['id']
+    home_team_name = fixture_data['teams']['home']['name']
+    away_team_name = fixture_data['teams']['away']['name']
+    league_name = fixture_data['league']['name']
+    match_date = fixture_data['fixture']['date']
+
+    if not value_bets_found:
+        print(f"{home_team_name} vs {away_team_name}: no value bets found.")
+        return []
+
+    print(f"--- {home_team_name} vs {away_team_name}: found {len(value_bets_found)} value bets ---")
+    return [
+        {
+            "fixture_id": fixture_id,
+            "match": f"{home_team_name} vs {away_team_name}",
+            "league": league_name,
+            "match_date": match_date,
+            "market": bet['market'],
+            "bet_value": bet['value'],
+            "probability": bet['prob'],
+            "odds": bet['odds'],
+            "bookmaker": bet.get('bookmaker'),
+            "value": bet['prob'] * bet['odds'],
+            "timestamp": datetime.now().isoformat()
+        }
+        for bet in value_bets_found
+    ]
+
+ODDS_LINES = ("best", "preferred")
+
+def record_value_bets(analysed, on_fixture_done=None, odds_line="best"):
+    """
+    Compares our probabilities with the odds of analysed fixtures in one batched
+    operation (see `odds_matrix`) and turns the value bets into records.
+
+    Args:
+        analysed (list): (fixture_data, probabilities from `odds_matrix.stack_probabilities`,
+            fixture odds index entry) tuples. Fixtures that cannot be analysed (no odds,
+            unusable data) have None probabilities and odds: they get no bet.
+        on_fixture_done (callable, optional): Called with (fixture_data, bets) for each fixture.
+        odds_line (str): 'best' compares with the best price over all bookmakers,
+            'preferred' with the odds of `value_finder.PREFERRED_BOOKMAKER_ID` only.
+            Each bet records the bookmaker of its odds.
+
+    Returns:
+        list: The bet records of every fixture, in the order of `analysed`.
+    """
+    if not analysed:
+        return []
+    compared = [(fixture_data, probs, odds) for fixture_data, probs, odds in analysed if probs is not None]
+    value_bets = iter([])
+    if compared:
+        with instrumentation.timer("value_detection"):
+            matrix = odds_matrix.OddsMatrix.from_index({f['fixture']['id']: odds for f, _, odds in compared})
+            if odds_line == "best":
+                prices, bookmakers = matrix.best_prices(), matrix.best_bookmakers()
+            else:
+                prices, bookmakers = matrix.preferred_prices(), matrix.preferred_bookmakers()
+            value_bets = iter(odds_matrix.find_value_bets([probs for _, probs, _ in compared], prices, bookmakers))
+        print(f"\nValue detection on {len(compared)} matches ({odds_line} odds, {len(matrix.bookmaker_ids)} bookmakers):")
+
+    newly_found_bets = []
+    for fixture_data, probs, _ in analysed:
+        bets = [] if probs is None else build_bet_records(fixture_data, next(value_bets))
+        if on_fixture_done:
+            with instrumentation.timer("history_write"):
+                on_fixture_done(fixture_data, bets)
+        newly_found_bets.extend(bets)
+    return newly_found_bets
+
+def _needs_requests(fixture_id, table_probs, prefetched_odds):
+    """
+    Tells whether gathering the inputs of a fixture costs API requests (team statistics
+    or odds), rather than coming from `run_table_model` and the bulk odds.
+    """
+    return fixture_id not in table_probs or prefetched_odds is None or fixture_id not in prefetched_odds
+
+def _request_failed(response):
+    """Tells whether an API request failed (no response, or an error in its body) and is worth retrying."""
+    return response is None or bool(response.get('errors'))
+
+def _has_no_odds(fixture_id, prefetched_odds):
+    """Tells whether the bulk odds (see `ingest_odds`) show that a fixture has no odds."""
+    if prefetched_odds is None or fixture_id not in prefetched_odds:
+        return False
+    fixture_odds = prefetched_odds[fixture_id]
+    return not fixture_odds or not fixture_odds['bookmakers']
+
+def _probabilities_row(score_matrix, home_lambda, away_lambda):
+    """Probabilities of one fixture, as a row of `odds_matrix.stack_probabilities`."""
+    with instrumentation.timer("probabilities"):
+        markets = probabilities.get_market_probabilities_batch(
+            score_matrix[np.newaxis], [home_lambda], [away_lambda], lines=(2.5,)
+        )
+        return odds_matrix.stack_probabilities(markets)[0]
+
+def run_table_model(fixtures):
+    """
+    Runs the model on every fixture covered by a team-strength table at once,
+    with one vectorized lookup per league (see `model.calculate_poisson_probabilities_batch`).
+    This needs no API call beyond the standings of each league.
+
+    Returns:
+        dict: Fixture ID to its probabilities (a row of `odds_matrix.stack_probabilities`),
+        for the fixtures whose two teams are in a table.
+    """
+    if not fixtures:
+        return {}
+    with instrumentation.timer("model"):
+        score_matrices, home_lambdas, away_lambdas, found = model.calculate_poisson_probabilities_batch(fixtures)
+    if not found.any():
+        return {}
+    with instrumentation.timer("probabilities"):
+        markets = probabilities.get_market_probabilities_batch(
+            score_matrices[found], home_lambdas[found], away_lambdas[found], lines=(2.5,)
+        )
+        rows = odds_matrix.stack_probabilities(markets)
+    fixture_ids = [fixtures[position]['fixture']['id'] for position in np.flatnonzero(found)]
+    return dict(zip(fixture_ids, rows))
+
+def analyze_fixtures(fixtures, on_fixture_done=None, prefetched_odds=None, odds_line="best"):
+    """
+    Analyses fixtures and returns the value bets found.
+
+    The model runs first on every fixture covered by a team-strength table, in
+    one batch (see `run_table_model`); the others fall back to their team
+    statistics one at a time. Value bets are looked for in batches (see
+    `record_value_bets`) and `on_fixture_done(fixture_data, bets)` is called for
+    each fixture right after it is compared.
+
+    A fixture whose inputs cost API requests is compared as soon as they are
+    gathered, together with the fixtures gathered before it, so a run that stops
+    never loses requests it already paid for. Fixtures whose inputs need no
+    request wait and are compared together. With per-fixture odds requests every
+    fixture costs one, so each is compared on its own: durability over batching.
+
+    Fixtures that cannot be analysed (no odds, unusable data) are passed to
+    `on_fixture_done` without bets, so a restarted run does not fetch them again;
+    those whose requests failed are not, so it retries them.
+
+    `prefetched_odds` (see `ingest_odds`) replaces the per-fixture odds requests
+    of the fixtures it covers; those without odds are skipped before the model runs.
+    """
+    table_probs = run_table_model([f for f in fixtures if not _has_no_odds(f['fixture']['id'], prefetched_odds)])
+
+    newly_found_bets = []
+    analysed = []
+    for fixture_data in fixtures:
+        fixture_id = fixture_data.get('fixture', {}).get('id')
+        fixture_inputs = _gather_fixture_inputs(fixture_data, table_probs.get(fixture_id), prefetched_odds)
+        if fixture_inputs is None:
+            continue
+        analysed.append((fixture_data, *fixture_inputs))
+        if _needs_requests(fixture_id, table_probs, prefetched_odds):
+            newly_found_bets.extend(record_value_bets(analysed, on_fixture_done, odds_line))
+            analysed = []
+
+    newly_found_bets.extend(record_value_bets(analysed, on_fixture_done, odds_line))
+    return newly_found_bets
+
+def _gather_fixture_inputs(fixture_data, our_probs=None, prefetched_odds=None):
+    """
+    Gathers everything one fixture needs and, unless `our_probs` already comes
+    from `run_table_model`, runs the model on its team statistics.
+
+    Returns:
+        tuple: (our_probs, fixture odds index entry); (None, None) if the fixture
+        cannot be analysed (no odds, unusable data), so it is checkpointed without
+        bets; or None if a request failed, so a restarted run retries it.
+    """
+    try:
+        fixture_id = fixture_data['fixture']['id']
+        print(f"\nAnalyzing: {fixture_data['teams']['home']['name']} vs {fixture_data['teams']['away']['name']}")
+        instrumentation.count("fixtures_analyzed")
+        if _has_no_odds(fixture_id, prefetched_odds):
+            print("No odds available.")
+            return None, None
+
+        if our_probs is None:
+            home_team_id = fixture_data['teams']['home']['id']
+            away_team_id = fixture_data['teams']['away']['id']
+            league_id = fixture_data['league']['id']
+            season = fixture_data['league']['season']
+
+            league_averages = model.get_league_stats(league_id, season)
+            if not league_averages:
+                return None, None
+
+            home_stats_response = model.get_team_stats(home_team_id, league_id, season)
+            away_stats_response = model.get_team_stats(away_team_id, league_id, season)
+            if _request_failed(home_stats_response) or _request_failed(away_stats_response):
+                return None
+            with instrumentation.timer("model_from_stats"):
+                model_result = model.calculate_poisson_from_stats(home_stats_response, away_stats_response, league_averages)
+            if model_result is None:
+                return None, None
+            our_probs = _probabilities_row(*model_result)
+
+        if prefetched_odds is not None and fixture_id in prefetched_odds:
+            fixture_odds = prefetched_odds[fixture_id]
+        else:
+            with instrumentation.timer("odds_fetch"):
+                fixture_odds = value_finder.get_fixture_odds_index(fixture_id)
+            if fixture_odds is None:
+                return None
+        if not fixture_odds or not fixture_odds['bookmakers']:
+            return None, None
+        return our_probs, fixture_odds
+
+    except (KeyError, TypeError) as e:
+        fixture_id = fixture_data.get('fixture', {}).get('id')
+        print(f"Error processing fixture {fixture_id or 'N/A'}. Missing data: {e}")
+        # Without an ID there is nothing to checkpoint.
+        return None if fixture_id is None else (None, None)
+
+async def _fetch_fixture_inputs(session, semaphore, fixture_data, our_probs=None, prefetched_odds=None):
+    """
+    Async counterpart of `_gather_fixture_inputs`, with the same return values.
+    """
+    try:
+        fixture_id = fixture_data['fixture']['id']
+        print(f"\nAnalyzing: {fixture_data['teams']['home']['name']} vs {fixture_data['teams']['away']['name']}")
+        instrumentation.count("fixtures_analyzed")
+        if _has_no_odds(fixture_id, prefetched_odds):
+            return None, None
+
+        if our_probs is None:
+            home_team_id = fixture_data['teams']['home']['id']
+            away_team_id = fixture_data['teams']['away']['id']
+            league_id = fixture_data['league']['id']
+            season = fixture_data['league']['season']
+
+            league_averages = model.get_league_stats(league_id, season)
+            if not league_averages:
+                return None, None
+
+            async with semaphore:
+                home_stats_response, away_stats_response = await asyncio.gather(
+                    model.get_team_stats_async(session, home_team_id, league_id, season),
+                    model.get_team_stats_async(session, away_team_id, league_id, season),
+                )
+            if _request_failed(home_stats_response) or _request_failed(away_stats_response):
+                return None
+            with instrumentation.timer("model_from_stats"):
+                model_result = model.calculate_poisson_from_stats(home_stats_response, away_stats_response, league_averages)
+            if model_result is None:
+                return None, None
+            our_probs = _probabilities_row(*model_result)
+
+        # Odds are only fetched once the model succeeded, as in the serial path.
+        if prefetched_odds is not None and fixture_id in prefetched_odds:
+            fixture_odds = prefetched_odds[fixture_id]
+        else:
+            async with semaphore:
+                with instrumentation.timer("odds_fetch"):
+                    fixture_odds = await value_finder.get_fixture_odds_index_async(session, fixture_id)
+            if fixture_odds is None:
+                return None
+        if not fixture_odds or not fixture_odds['bookmakers']:
+            return None, None
+        return our_probs, fixture_odds
+
+    except (KeyError, TypeError) as e:
+        fixture_id = fixture_data.get('fixture', {}).get('id')
+        print(f"Error processing fixture {fixture_id or 'N/A'}. Missing data: {e}")
+        return None if fixture_id is None else (None, None)
+
+async def analyze_fixtures_async(fixtures, concurrency, on_fixture_done=None, prefetched_odds=None, odds_line="best"):
+    """
+    Analyses fixtures concurrently, with at most `concurrency` fixtures fetching
+    data at the same time. Table-covered fixtures are modelled in one batch and
+    fixtures whose inputs cost API requests are compared as soon as they are
+    gathered, as in `analyze_fixtures`.
+
+    Fixtures are compared and passed to `on_fixture_done` in fixture order: one that
+    finishes early waits for those before it (at most `concurrency` are in flight).
+    The result and the history files written by `on_fixture_done` are therefore
+    the same as in a serial run. `on_fixture_done`, `prefetched_odds` and
+    `odds_line` are used as in `analyze_fixtures`.
+    """
+    # Team strengths and league averages are shared by every fixture of a league:
+    # load them once up front rather than from inside the concurrent tasks.
+    with instrumentation.timer("league_tables"):
+        for league_id, season in {(f['league']['id'], f['league']['season']) for f in fixtures}:
+            team_strength.get_table(league_id, season)
+            model.get_league_stats(league_id, season)
+    table_probs = run_table_model([f for f in fixtures if not _has_no_odds(f['fixture']['id'], prefetched_odds)])
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze_fixture(session, position, fixture_data):
+        fixture_inputs = await _fetch_fixture_inputs(
+            session, semaphore, fixture_data, table_probs.get(fixture_data.get('fixture', {}).get('id')), prefetched_odds
+        )
+        return position, fixture_inputs
+
+    newly_found_bets = []
+    analysed = []
+    gathered = {}  # Position to inputs, for fixtures done before an earlier one.
+    next_position = 0
+    async with api_client.create_async_session(limit=concurrency) as session:
+        tasks = [analyze_fixture(session, position, fixture_data) for position, fixture_data in enumerate(fixtures)]
+        for next_fixture in asyncio.as_completed(tasks):
+            position, fixture_inputs = await next_fixture
+            gathered[position] = fixture_inputs
+            while next_position in gathered:
+                fixture_data, fixture_inputs = fixtures[next_position], gathered.pop(next_position)
+                next_position += 1
+                if fixture_inputs is None:
+                    continue
+                analysed.append((fixture_data, *fixture_inputs))
+                if _needs_requests(fixture_data['fixture']['id'], table_probs, prefetched_odds):
+                    newly_found_bets.extend(record_value_bets(analysed, on_fixture_done, odds_line))
+                    analysed = []
+    newly_found_bets.extend(record_value_bets(analysed, on_fixture_done, odds_line))
+    return newly_found_bets
+
+def checkpoint_fixture(fixture_data, bets, segment, bet_ledger=None):
+    """
+    Durably saves the bets of an analysed fixture and marks it as done, so that
+    nothing is lost if the run dies and a restarted run skips the fixture.
+    """
+    history_store.append_bets(bets, segment=segment)
+    if bet_ledger is not None:
+        bet_ledger.add_bets(bets)
+    checkpoint.mark_completed(fixture_data['fixture']['id'], bets_found=len(bets))
+
+def run_analysis(existing_fixture_ids: set, concurrency: int = 1, on_fixture_done=None, bulk_odds: bool = True,
+                 odds_line: str = "best"):
     """
     Runs the full analysis pipeline for new fixtures and returns the new bets
     and a summary of the execution.
+
+    Fixtures already analysed today (see `checkpoint`) are skipped, so a
+    restarted run resumes where the previous one stopped.
+
+    Args:
+        existing_fixture_ids (set): Fixtures already in the history, which are skipped.
+        concurrency (int): Number of fixtures analysed in parallel. 1 runs serially.
+        on_fixture_done (callable, optional): Called with (fixture_data, bets) for each
+            analysed fixture once its value bets are found, e.g. `checkpoint_fixture`.
+        bulk_odds (bool): Fetch the odds in paged bulk requests before the analysis
+            (see `ingest_odds`) rather than one request per fixture.
+        odds_line (str): Odds the probabilities are compared with, 'best' (best price
+            over all bookmakers) or 'preferred' (see `record_value_bets`).
     """
     if not api_client.API_KEY or api_client.API_KEY == 'VotreCléApiIci':
         print("ERROR: API key not found or not set. Exiting.")
         return None, {}
 
-    newly_found_bets = []
     allowed_league_ids = load_allowed_leagues()
-    fixtures = get_daily_fixtures()
+    today = date.today().strftime('%Y-%m-%d')
+    with instrumentation.timer("fixtures_fetch"):
+        fixtures = get_daily_fixtures(today)
 
     if not fixtures:
         return [], {"fixtures_found": 0, "fixtures_analyzed": 0}
@@ -49,7 +500,13 @@ def run_analysis(existing_fixture_ids: set):
     print(f"Found {len(fixtures)} total matches for today.")
 
     # Filter out fixtures that have already been analyzed
-    new_fixtures = [f for f in fixtures if f['fixture']['id'] not in existing_fixture_ids]
+    completed_today = checkpoint.load_completed()
+    new_fixtures = [
+        f for f in fixtures
+        if f['fixture']['id'] not in existing_fixture_ids and f['fixture']['id'] not in completed_today
+    ]
+    if completed_today:
+        print(f"Resuming: {len(completed_today)} matches were already analysed today.")
 
     if allowed_league_ids:
         filtered_fixtures = [
@@ -60,53 +517,27 @@ def run_analysis(existing_fixture_ids: set):
         filtered_fixtures = new_fixtures
         print(f"Analyzing {len(filtered_fixtures)} new matches.")
 
-    for fixture_data in filtered_fixtures:
-        try:
-            fixture_id = fixture_data['fixture']['id']
-            home_team_name = fixture_data['teams']['home']['name']
-            away_team_name = fixture_data['teams']['away']['name']
-            league_name = fixture_data['league']['name']
-            match_date = fixture_data['fixture']['date']
-
-            print(f"\nAnalyzing: {home_team_name} vs {away_team_name}")
-
-            score_matrix, home_lambda, away_lambda = model.calculate_poisson_probabilities(
-                fixture_data['teams']['home']['id'],
-                fixture_data['teams']['away']['id'],
-                fixture_data['league']['id'],
-                fixture_data['league']['season']
-            )
-            if score_matrix is None: continue
-
-            our_probs = probabilities.get_market_probabilities(score_matrix, home_lambda, away_lambda)
-            if not our_probs: continue
-
-            bookmaker_odds = value_finder.get_odds_for_fixture(fixture_id)
-            if not bookmaker_odds: continue
-
-            value_bets_found = value_finder.find_value_bets(our_probs, bookmaker_odds)
-
-            if value_bets_found:
-                print(f"--- Found {len(value_bets_found)} value bets ---")
-                for bet in value_bets_found:
-                    bet_details = {
-                        "fixture_id": fixture_id,
-                        "match": f"{home_team_name} vs {away_team_name}",
-                        "league": league_name,
-                        "match_date": match_date,
-                        "market": bet['market'],
-                        "bet_value": bet['value'],
-                        "probability": bet['prob'],
-                        "odds": bet['odds'],
-                        "value": bet['prob'] * bet['odds'],
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    newly_found_bets.append(bet_details)
-            else:
-                print("No value bets found.")
-
-        except (KeyError, TypeError) as e:
-            print(f"Error processing fixture {fixture_data.get('fixture', {}).get('id', 'N/A')}. Missing data: {e}")
+    remaining_quota = api_client.get_remaining_quota()
+    if bulk_odds and remaining_quota is not None:
+        # Keep enough quota for the bulk odds pages; the fixtures then cost no odds request.
+        _, odds_pages = value_finder.plan_bulk_odds_queries(filtered_fixtures, fixtures, today)
+        remaining_quota = max(0, remaining_quota - odds_pages)
+    with instrumentation.timer("planning"):
+        filtered_fixtures = plan_fixtures(filtered_fixtures, load_league_priority(), remaining_quota, include_odds=not bulk_odds)
+
+    prefetched_odds = None
+    if bulk_odds and filtered_fixtures:
+        with instrumentation.timer("odds_ingest"):
+            prefetched_odds = ingest_odds(filtered_fixtures, fixtures, today, concurrency)
+
+    with instrumentation.timer("analysis"):
+        if concurrency > 1:
+            newly_found_bets = asyncio.run(analyze_fixtures_async(
+                filtered_fixtures, concurrency, on_fixture_done, prefetched_odds, odds_line
+            ))
+        else:
+            newly_found_bets = analyze_fixtures(filtered_fixtures, on_fixture_done, prefetched_odds, odds_line)
+    instrumentation.count("value_bets_found", len(newly_found_bets))
 
     stats_summary = {
         "fixtures_found": len(fixtures),
@@ -115,18 +546,65 @@ def run_analysis(existing_fixture_ids: set):
     return newly_found_bets, stats_summary
 
 
-def get_fixture_details(fixture_id: int):
-    """Fetches details for a single fixture by its ID."""
-    endpoint = "fixtures"
-    params = {"id": fixture_id}
-    return api_client.make_api_request(endpoint, params)
+# API-Football accepts up to 20 ids in a single `fixtures?ids=` lookup.
+FIXTURE_IDS_PER_REQUEST = 20
+# A match is not worth checking before this long after kickoff (90' + half-time + stoppage).
+MIN_MINUTES_AFTER_KICKOFF = 110
+FINISHED_STATUSES = ['FT', 'AET', 'PEN']
+
+async def fetch_fixtures_by_ids_async(fixture_ids, concurrency):
+    """
+    Fetches fixture details in multi-id batches, running the batches concurrently.
+
+    Args:
+        fixture_ids (list): Fixture IDs to look up.
+        concurrency (int): Maximum number of batch requests in flight.
+
+    Returns:
+        dict: Fixture ID to fixture info, for every fixture the API returned.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    batches = [
+        fixture_ids[i:i + FIXTURE_IDS_PER_REQUEST]
+        for i in range(0, len(fixture_ids), FIXTURE_IDS_PER_REQUEST)
+    ]
+
+    async def fetch_batch(session, batch):
+        async with semaphore:
+            params = {"ids": "-".join(str(fixture_id) for fixture_id in batch)}
+            return await api_client.make_api_request_async(session, "fixtures", params)
+
+    async with api_client.create_async_session(limit=concurrency) as session:
+        responses = await asyncio.gather(*(fetch_batch(session, batch) for batch in batches))
+
+    fixtures_by_id = {}
+    for response in responses:
+        for fixture_info in (response or {}).get('response') or []:
+            fixtures_by_id[fixture_info['fixture']['id']] = fixture_info
+    return fixtures_by_id
+
+def has_kicked_off_long_enough(bet, now):
+    """
+    Tells whether a bet's match could be finished, judging from its `match_date`.
+    Bets without a usable match date are always checked.
+    """
+    try:
+        kickoff = datetime.fromisoformat(bet['match_date'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    if kickoff.tzinfo is None:
+        kickoff = kickoff.replace(tzinfo=timezone.utc)
+    return now >= kickoff + timedelta(minutes=MIN_MINUTES_AFTER_KICKOFF)
 
 from src import settlement
 
-def update_pending_bets(historical_bets: list):
+def update_pending_bets(historical_bets: list, concurrency: int = 4):
     """
     Checks for results of pending bets and updates them.
     Returns the updated list of historical bets.
+
+    Pending fixtures are looked up in multi-id batches, and fixtures that
+    cannot be finished yet (according to their kickoff time) are not looked up at all.
     """
     print(f"\nChecking for results of pending bets...")
 
@@ -143,60 +621,137 @@ def update_pending_bets(historical_bets: list):
         print("No pending bets to check.")
         return historical_bets
 
-    print(f"Found {len(pending_bets_by_fixture)} fixtures with pending bets.")
+    now = datetime.now(timezone.utc)
+    fixture_ids_to_check = sorted(
+        fixture_id for fixture_id, bet_indices in pending_bets_by_fixture.items()
+        if has_kicked_off_long_enough(historical_bets[bet_indices[0]], now)
+    )
+    print(
+        f"Found {len(pending_bets_by_fixture)} fixtures with pending bets "
+        f"({len(pending_bets_by_fixture) - len(fixture_ids_to_check)} not finished yet)."
+    )
+    if not fixture_ids_to_check:
+        return historical_bets
 
-    for fixture_id, bet_indices in pending_bets_by_fixture.items():
-        fixture_details_response = get_fixture_details(fixture_id)
+    with instrumentation.timer("settlement_fetch"):
+        fixtures_by_id = asyncio.run(fetch_fixtures_by_ids_async(fixture_ids_to_check, max(1, concurrency)))
+    finished_fixtures = []
+    newly_settled = []
 
-        if not fixture_details_response or not fixture_details_response.get('response'):
+    for fixture_id in fixture_ids_to_check:
+        fixture_info = fixtures_by_id.get(fixture_id)
+        if not fixture_info:
             continue
 
-        fixture_info = fixture_details_response['response'][0]
         fixture_status = fixture_info['fixture']['status']['short']
 
-        finished_statuses = ['FT', 'AET', 'PEN']
-
-        if fixture_status in finished_statuses:
+        if fixture_status in FINISHED_STATUSES:
+            finished_fixtures.append(fixture_info)
             final_score = fixture_info['goals']
             print(f"Settling bets for finished fixture {fixture_id} (Score: {final_score['home']}-{final_score['away']}).")
 
-            for index in bet_indices:
+            for index in pending_bets_by_fixture[fixture_id]:
                 bet_to_settle = historical_bets[index]
-                outcome = settlement.settle_bet(bet_to_settle, final_score)
+                with instrumentation.timer("settlement"):
+                    outcome = settlement.settle_bet(bet_to_settle, final_score)
                 if outcome:
                     historical_bets[index]['outcome'] = outcome
+                    newly_settled.append(historical_bets[index])
                     print(f"  -> Bet on {bet_to_settle['market']} ({bet_to_settle['bet_value']}) resulted in a {outcome}.")
 
+    instrumentation.count("bets_settled", len(newly_settled))
+    # Keep the team-strength tables current with the results we just saw.
+    with instrumentation.timer("team_strength_update"):
+        team_strength.apply_settled_fixtures(finished_fixtures)
+
     return historical_bets
 
 
 if __name__ == "__main__":
-    print("Starting data collection...")
+    parser = argparse.ArgumentParser(description="Daily value bet collection.")
+    parser.add_argument(
+        "--concurrency", type=int, default=1,
+        help="Number of fixtures to analyse in parallel (1 = serial)."
+    )
+    parser.add_argument(
+        "--prewarm-leagues", action="store_true",
+        help="Compute league averages for every league in config/leagues.json before the analysis."
+    )
+    parser.add_argument(
+        "--per-fixture-odds", action="store_true",
+        help="Request the odds of each fixture separately instead of in bulk by date or league."
+    )
+    parser.add_argument(
+        "--odds-line", choices=ODDS_LINES, default="best",
+        help="Compare our probabilities with the best price over all bookmakers, or with the preferred bookmaker only."
+    )
+    parser.add_argument(
+        "--ledger", default=ledger.LEDGER_DB,
+        help="Path of an SQLite bet ledger to use for settlement and duplicate checks (LEDGER_DB)."
+    )
+    args = parser.parse_args()
 
-    # Load existing history
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r") as f:
-            try:
-                historical_bets = json.load(f)
-            except json.JSONDecodeError:
-                historical_bets = []
-    else:
-        historical_bets = []
+    print("Starting data collection...")
 
-    # 1. Update results for pending bets
-    historical_bets = update_pending_bets(historical_bets)
+    if args.prewarm_leagues:
+        warmed = model.prewarm_league_stats(load_allowed_leagues() or [])
+        print(f"League averages ready for {warmed} leagues.")
+
+    # Load existing history. The legacy history.json is migrated into the
+    # append-only store on the first run.
+    if not history_store.store_exists() and os.path.exists(history_store.LEGACY_HISTORY_FILE):
+        migrated = history_store.migrate_from_json()
+        print(f"Migrated {migrated} bets from '{history_store.LEGACY_HISTORY_FILE}' to '{history_store.HISTORY_DIR}/'.")
+
+    # With a ledger, only pending bets are loaded and fixture lookups hit its indexes.
+    bet_ledger = ledger.Ledger(args.ledger) if args.ledger else None
+    with instrumentation.timer("history_load"):
+        if bet_ledger is not None:
+            if bet_ledger.count() == 0:
+                imported = bet_ledger.add_bets(history_store.load_records())
+                print(f"Ledger '{args.ledger}' initialised with {imported} bets from the history store.")
+            historical_bets = bet_ledger.pending_bets()
+        else:
+            historical_bets = history_store.load_records()
+
+    # 1. Update results for pending bets. Settlement runs first so it always gets
+    #    its share of the daily API quota before new fixtures are analysed.
+    pending_bets = [bet for bet in historical_bets if "outcome" not in bet]
+    with instrumentation.timer("update_pending_bets"):
+        historical_bets = update_pending_bets(historical_bets, concurrency=args.concurrency)
+    settled_bets = [bet for bet in pending_bets if "outcome" in bet]
+    with instrumentation.timer("outcomes_write"):
+        outcome_patch = history_store.record_outcomes(settled_bets)
+        if bet_ledger is not None:
+            bet_ledger.record_outcomes(settled_bets)
+    # Then the performance aggregates the dashboards read, once the outcomes are
+    # stored. The cube records the patch it counted, so it never counts one twice.
+    if outcome_patch:
+        with instrumentation.timer("stats_cube_update"):
+            stats_cube.add_settled_bets(settled_bets, outcome_patch)
 
     # 2. Run analysis for new fixtures
-    existing_ids = {bet['fixture_id'] for bet in historical_bets}
-    new_results, stats = run_analysis(existing_ids)
+    if bet_ledger is not None:
+        existing_ids = bet_ledger.known_fixtures()
+    else:
+        existing_ids = {bet['fixture_id'] for bet in historical_bets}
+    # Each fixture's bets are written once the value bets are found (one segment for the run).
+    save_fixture = functools.partial(
+        checkpoint_fixture, segment=history_store.new_file_name(), bet_ledger=bet_ledger
+    )
+    with instrumentation.timer("run_analysis"):
+        new_results, stats = run_analysis(
+            existing_ids, concurrency=args.concurrency, on_fixture_done=save_fixture,
+            bulk_odds=not args.per_fixture_odds, odds_line=args.odds_line
+        )
 
     if new_results is not None:
-        # Append new results to history and save
-        updated_history = historical_bets + new_results
-        with open(HISTORY_FILE, "w") as f:
-            json.dump(updated_history, f, indent=4)
+        if bet_ledger is not None:
+            total_bets = bet_ledger.count()
+        else:
+            total_bets = len(historical_bets) + len(new_results)
         print(f"\nData collection complete. Found {len(new_results)} new value bets.")
-        print(f"History file '{HISTORY_FILE}' updated with a total of {len(updated_history)} bets.")
+        print(f"History store '{history_store.HISTORY_DIR}/' updated with a total of {total_bets} bets.")
 
         # 3. Save run status
         status = {
@@ -205,8 +760,30 @@ if __name__ == "__main__":
             "fixtures_analyzed": stats.get("fixtures_analyzed", 0),
             "new_bets_found": len(new_results)
         }
-        with open("status.json", "w") as f:
+        with open("status.json.tmp", "w") as f:
             json.dump(status, f, indent=4)
+        os.replace("status.json.tmp", "status.json")
         print("Status file 'status.json' updated.")
     else:
         print("\nData collection failed.")
+
+    if bet_ledger is not None:
+        bet_ledger.close()
+
+    request_stats = api_client.get_request_stats()
+    print(
+        f"API usage: {request_stats['requests']} requests, {request_stats['retries']} retries, "
+        f"{request_stats['failures']} failures, {request_stats['quota_skips']} skipped for quota, "
+        f"{request_stats['throttle_wait']:.1f}s throttled, latency avg {request_stats['latency_avg']:.2f}s / "
+        f"max {request_stats['latency_max']:.2f}s."
+    )
+    cache_stats = response_cache.get_cache_stats()
+    print(
+        f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+        f"({cache_stats['hit_ratio']:.0%} hit ratio), {cache_stats['evictions']} evictions."
+    )
+
+    # 4. Per-stage timings and per-endpoint API calls, next to status.json (shown by the dashboard).
+    profile = instrumentation.write_profile(extra={"http": request_stats, "response_cache": cache_stats})
+    print(instrumentation.format_profile(profile))
+    print(f"Run profile '{instrumentation.PROFILE_FILE}' updated.")
@@ -1,30 +1,417 @@
+import asyncio
+import random
+import threading
+import time
+
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
 from decouple import config
 
+from . import instrumentation, replay, response_cache
+
 API_KEY = config("API_KEY", default=None)
 API_HOST = config("API_HOST", default="api-football-v1.p.rapidapi.com")
+# Point this at a replay server (see `replay`) to run without the real API.
+API_BASE_URL = config("API_BASE_URL", default=f"https://{API_HOST}/v3")
+# When set, every response returned is also saved to this directory, for replay.
+RECORD_DIR = config("API_RECORD_DIR", default="")
+
+# --- HTTP client tuning ---
+# Timeouts are in seconds. A request that exceeds them is retried like a 5xx.
+CONNECT_TIMEOUT = config("API_CONNECT_TIMEOUT", default=5.0, cast=float)
+READ_TIMEOUT = config("API_READ_TIMEOUT", default=30.0, cast=float)
+POOL_SIZE = config("API_POOL_SIZE", default=10, cast=int)
+MAX_RETRIES = config("API_MAX_RETRIES", default=4, cast=int)
+BACKOFF_BASE = config("API_BACKOFF_BASE", default=0.5, cast=float)
+BACKOFF_MAX = config("API_BACKOFF_MAX", default=30.0, cast=float)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# --- Rate limiting ---
+# Starting points only: both are corrected from the x-ratelimit-* headers
+# returned by RapidAPI as soon as the first response comes back.
+RATE_LIMIT_PER_MINUTE = config("API_RATE_LIMIT_PER_MINUTE", default=30, cast=int)
+DAILY_QUOTA = config("API_DAILY_QUOTA", default=0, cast=int)  # 0 means unknown until the API reports it
+
+_session = None
+_session_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "retries": 0,
+    "failures": 0,
+    "quota_skips": 0,
+    "throttle_wait": 0.0,
+    "latency_total": 0.0,
+    "latency_max": 0.0,
+}
+
+
+class TokenBucket:
+    """
+    Token bucket that spaces out request starts to stay under a per-minute limit.
+
+    The bucket holds up to one minute's worth of tokens, so short bursts go out
+    immediately and sustained traffic is smoothed to the refill rate.
+    """
+
+    def __init__(self, rate_per_minute):
+        self._lock = threading.Lock()
+        self._set_rate(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
 
-def make_api_request(endpoint, params=None):
+    def _set_rate(self, rate_per_minute):
+        self.capacity = max(1.0, float(rate_per_minute))
+        self.fill_rate = self.capacity / 60.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    def reserve(self):
+        """
+        Takes one token and returns how many seconds the caller must wait before using it.
+        Callers sleep themselves, so the same bucket serves threads and coroutines.
+        """
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.fill_rate
+
+    def try_take(self):
+        """Takes one token if one is available, without waiting. Returns False otherwise."""
+        with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def sync(self, limit=None, remaining=None):
+        """Adapts the bucket to the limit and remaining count reported by the server."""
+        with self._lock:
+            self._refill()
+            if limit:
+                self._set_rate(limit)
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+
+    def drain(self):
+        """Empties the bucket, e.g. after a 429, so the next request waits for a refill."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+_bucket = TokenBucket(RATE_LIMIT_PER_MINUTE)
+
+_quota_lock = threading.Lock()
+_quota = {"limit": DAILY_QUOTA or None, "remaining": DAILY_QUOTA or None}
+
+
+def get_session():
+    """
+    Returns the shared HTTP session, creating it on first use.
+
+    The session keeps connections to the API host alive between calls, so a
+    run pays for one TLS handshake per pooled connection instead of one per request.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "X-RapidAPI-Key": API_KEY,
+                    "X-RapidAPI-Host": API_HOST
+                })
+                _session = session
+    return _session
+
+
+def get_request_stats():
+    """
+    Returns a snapshot of the HTTP counters for the current process.
+
+    Returns:
+        dict: Request, retry and failure counts plus total, mean and max latency in seconds.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["latency_avg"] = stats["latency_total"] / stats["requests"] if stats["requests"] else 0.0
+    return stats
+
+
+def get_remaining_quota():
+    """
+    Returns the number of API calls left in the daily quota.
+
+    Returns:
+        int or None: Calls remaining today, or None while the quota is unknown.
+    """
+    with _quota_lock:
+        return _quota["remaining"]
+
+
+def _header_int(headers, name):
+    try:
+        return int(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _update_limits(headers):
+    """Feeds the RapidAPI rate-limit headers back into the limiter and the quota tracker."""
+    _bucket.sync(
+        limit=_header_int(headers, "X-RateLimit-Limit"),
+        remaining=_header_int(headers, "X-RateLimit-Remaining"),
+    )
+    daily_limit = _header_int(headers, "x-ratelimit-requests-limit")
+    daily_remaining = _header_int(headers, "x-ratelimit-requests-remaining")
+    with _quota_lock:
+        if daily_limit is not None:
+            _quota["limit"] = daily_limit
+        if daily_remaining is not None:
+            _quota["remaining"] = daily_remaining
+
+
+def _take_quota():
+    """
+    Books one call against the daily quota.
+
+    Returns:
+        bool: False if the quota is known to be exhausted.
+    """
+    with _quota_lock:
+        if _quota["remaining"] is None:
+            return True
+        if _quota["remaining"] <= 0:
+            return False
+        _quota["remaining"] -= 1
+        return True
+
+
+def _throttle():
+    delay = _bucket.reserve()
+    if delay > 0:
+        _record(throttle_wait=delay)
+        time.sleep(delay)
+
+
+def reset_request_stats():
+    """Resets the HTTP counters to zero."""
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0 if isinstance(_stats[key], int) else 0.0
+
+
+def _record(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+def _record_latency(endpoint, elapsed):
+    instrumentation.record_api_call(endpoint, elapsed)
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["latency_total"] += elapsed
+        _stats["latency_max"] = max(_stats["latency_max"], elapsed)
+
+
+def _record_response(endpoint, params, payload):
+    """Saves the response to the replay archive when recording is on (API_RECORD_DIR)."""
+    if not RECORD_DIR:
+        return
+    try:
+        replay.record(RECORD_DIR, endpoint, params, payload)
+    except OSError as e:
+        print(f"Warning: could not record response of {endpoint}: {e}")
+
+
+def _backoff_delay(attempt, retry_after=None):
+    """
+    Computes how long to wait before retry number `attempt` (0-based).
+
+    Uses exponential backoff with full jitter. A numeric `Retry-After` header
+    sent by the server is treated as a lower bound.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+def make_api_request(endpoint, params=None, use_cache=True):
     """
     Makes a request to the API-Football endpoint.
 
+    Responses are served from and stored in the on-disk response cache
+    (see `response_cache`) unless `use_cache` is False. With API_RECORD_DIR set,
+    they are also saved for replay (see `replay`).
+
     Args:
         endpoint (str): The API endpoint to call (e.g., '/fixtures').
         params (dict, optional): A dictionary of query parameters. Defaults to None.
+        use_cache (bool, optional): Whether to use the response cache. Defaults to True.
 
     Returns:
         dict: The JSON response from the API, or None if the request fails.
     """
-    url = f"https://{API_HOST}/v3/{endpoint}"
-    headers = {
-        "X-RapidAPI-Key": API_KEY,
-        "X-RapidAPI-Host": API_HOST
-    }
+    if use_cache:
+        cached = response_cache.get(endpoint, params)
+        if cached is not None:
+            instrumentation.record_api_cache_hit(endpoint)
+            _record_response(endpoint, params, cached)
+            return cached
 
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred: {e}")
-        return None
+    url = f"{API_BASE_URL}/{endpoint}"
+    session = get_session()
+
+    for attempt in range(MAX_RETRIES + 1):
+        if not _take_quota():
+            print(f"Daily API quota exhausted. Skipping request to {endpoint}.")
+            _record(quota_skips=1)
+            return None
+        _throttle()
+
+        retry_after = None
+        start = time.perf_counter()
+        try:
+            response = session.get(url, params=params, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            _record_latency(endpoint, time.perf_counter() - start)
+            _update_limits(response.headers)
+            if response.status_code == 429:
+                _bucket.drain()
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()  # Raises an HTTPError for other bad responses (4xx)
+                payload = response.json()
+                if use_cache:
+                    response_cache.put(endpoint, params, payload)
+                _record_response(endpoint, params, payload)
+                return payload
+            error = f"HTTP {response.status_code} for {endpoint}"
+            retry_after = response.headers.get("Retry-After")
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            _record_latency(endpoint, time.perf_counter() - start)
+            error = e
+        except requests.exceptions.RequestException as e:
+            print(f"An error occurred: {e}")
+            _record(failures=1)
+            return None
+
+        if attempt == MAX_RETRIES:
+            break
+        delay = _backoff_delay(attempt, retry_after)
+        print(f"Request to {endpoint} failed ({error}). Retrying in {delay:.1f}s...")
+        _record(retries=1)
+        time.sleep(delay)
+
+    print(f"An error occurred: {error} (gave up after {MAX_RETRIES} retries)")
+    _record(failures=1)
+    return None
+
+
+def create_async_session(limit=None):
+    """
+    Creates an aiohttp session for `make_api_request_async`.
+
+    The caller owns the session and must close it (use it as an async context manager).
+
+    Args:
+        limit (int, optional): Maximum number of simultaneous connections. Defaults to POOL_SIZE.
+
+    Returns:
+        aiohttp.ClientSession: A session with the API headers and timeouts configured.
+    """
+    return aiohttp.ClientSession(
+        headers={
+            "X-RapidAPI-Key": API_KEY or "",
+            "X-RapidAPI-Host": API_HOST
+        },
+        connector=aiohttp.TCPConnector(limit=limit or POOL_SIZE),
+        timeout=aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+    )
+
+
+async def make_api_request_async(session, endpoint, params=None, use_cache=True):
+    """
+    Async counterpart of `make_api_request`.
+
+    Shares the response cache, rate limiter, quota tracker and counters with the
+    synchronous client, so both can be mixed within one run.
+
+    Args:
+        session (aiohttp.ClientSession): A session from `create_async_session`.
+        endpoint (str): The API endpoint to call (e.g., '/fixtures').
+        params (dict, optional): A dictionary of query parameters. Defaults to None.
+        use_cache (bool, optional): Whether to use the response cache. Defaults to True.
+
+    Returns:
+        dict: The JSON response from the API, or None if the request fails.
+    """
+    if use_cache:
+        cached = response_cache.get(endpoint, params)
+        if cached is not None:
+            instrumentation.record_api_cache_hit(endpoint)
+            _record_response(endpoint, params, cached)
+            return cached
+
+    url = f"{API_BASE_URL}/{endpoint}"
+    query = {k: str(v) for k, v in (params or {}).items()}
+
+    for attempt in range(MAX_RETRIES + 1):
+        if not _take_quota():
+            print(f"Daily API quota exhausted. Skipping request to {endpoint}.")
+            _record(quota_skips=1)
+            return None
+        delay = _bucket.reserve()
+        if delay > 0:
+            _record(throttle_wait=delay)
+            await asyncio.sleep(delay)
+
+        retry_after = None
+        start = time.perf_counter()
+        try:
+            async with session.get(url, params=query) as response:
+                _record_latency(endpoint, time.perf_counter() - start)
+                _update_limits(response.headers)
+                if response.status == 429:
+                    _bucket.drain()
+                if response.status not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    payload = await response.json(content_type=None)
+                    if use_cache:
+                        response_cache.put(endpoint, params, payload)
+                    _record_response(endpoint, params, payload)
+                    return payload
+                error = f"HTTP {response.status} for {endpoint}"
+                retry_after = response.headers.get("Retry-After")
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            _record_latency(endpoint, time.perf_counter() - start)
+            error = e
+        except (aiohttp.ClientError, ValueError) as e:
+            print(f"An error occurred: {e}")
+            _record(failures=1)
+            return None
+
+        if attempt == MAX_RETRIES:
+            break
+        delay = _backoff_delay(attempt, retry_after)
+        print(f"Request to {endpoint} failed ({error}). Retrying in {delay:.1f}s...")
+        _record(retries=1)
+        await asyncio.sleep(delay)
+
+    print(f"An error occurred: {error} (gave up after {MAX_RETRIES} retries)")
+    _record(failures=1)
+    return None
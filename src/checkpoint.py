@@ -0,0 +1,44 @@
+from datetime import date
+import json
+import os
+
+from decouple import config
+
+# Journal of the fixtures the collector has finished analysing, one file per day.
+# Each line is written and fsynced as soon as a fixture is done, so a run that
+# dies halfway (quota, network, crash) can be restarted without redoing the
+# fixtures already analysed, including those that produced no value bet.
+
+CHECKPOINT_DIR = config("CHECKPOINT_DIR", default=".cache/checkpoints")
+
+
+def _journal_path(run_date=None):
+    run_date = run_date or date.today()
+    return os.path.join(CHECKPOINT_DIR, f"analyzed-{run_date.isoformat()}.jsonl")
+
+
+def load_completed(run_date=None):
+    """
+    Returns the IDs of the fixtures already analysed on `run_date` (today by default).
+    """
+    completed = set()
+    try:
+        with open(_journal_path(run_date), "r") as f:
+            for line in f:
+                try:
+                    completed.add(json.loads(line)["fixture_id"])
+                except (json.JSONDecodeError, KeyError):
+                    continue  # A torn last line from an interrupted write.
+    except OSError:
+        pass
+    return completed
+
+
+def mark_completed(fixture_id, bets_found=0, run_date=None):
+    """Durably records that a fixture has been analysed."""
+    path = _journal_path(run_date)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps({"fixture_id": fixture_id, "bets_found": bets_found}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
@@ -0,0 +1,99 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+from decouple import config
+
+from . import history_store, statistics
+
+# Preparation of the bet history for the dashboards, shared by the Dash and
+# Streamlit apps. The prepared frame is compact and typed (categoricals,
+# parsed UTC dates, precomputed range bins) and is written to a Parquet
+# sidecar named after the history store version, so a dashboard cold start
+# reads one binary file instead of parsing the history again.
+
+PREPARED_DIR = config("DASHBOARD_CACHE_DIR", default=".cache/dashboard")
+
+CATEGORY_COLUMNS = ["match", "league", "market", "bet_value", "outcome"]
+# Money and probability columns stay float64: float32 shows as 0.5400000214576721
+# in the tables and would compute profit differently from the stats cube.
+FLOAT_COLUMNS = ["probability", "odds", "value"]
+# Bumped when the prepared format changes, so older sidecars are not read.
+PREPARED_FORMAT = 2
+RANGES = {ranges[0]: ranges for ranges in (statistics.ODDS_RANGES, statistics.VALUE_RANGES, statistics.PROB_RANGES)}
+
+
+def _parse_dates(values):
+    return pd.to_datetime(values, errors="coerce", utc=True, format="ISO8601")
+
+
+def prepare_bets(df):
+    """
+    Builds the typed dashboard frame from a raw history frame.
+
+    Columns keep the names `src.statistics` expects. `display_date_dt` is the
+    match date, falling back to the bet timestamp; it is NaT when neither can
+    be parsed, and those rows are kept so callers can report them.
+
+    Args:
+        df (pd.DataFrame): The history, as returned by `history_store.load_frame`.
+
+    Returns:
+        pd.DataFrame: One row per bet, most recent match first.
+    """
+    prepared = pd.DataFrame(index=df.index)
+    prepared["fixture_id"] = pd.to_numeric(df["fixture_id"], errors="coerce").astype("Int64")
+    for column in CATEGORY_COLUMNS:
+        values = df[column] if column in df.columns else pd.Series(None, index=df.index, dtype=object)
+        prepared[column] = values.astype(object).where(values.notna(), None).astype("category")
+    for column in FLOAT_COLUMNS:
+        values = df[column] if column in df.columns else pd.Series(np.nan, index=df.index)
+        values = pd.to_numeric(values, errors="coerce").astype(float)
+        _, bins, labels, _ = RANGES[column]
+        prepared[statistics.RANGE_COLUMNS[column]] = pd.cut(values, bins=bins, labels=labels, right=False)
+        prepared[column] = values
+
+    # Prioritize the official match_date, but fall back to the timestamp if match_date is invalid/missing.
+    dates = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns, UTC]")
+    for column in ("timestamp", "match_date"):
+        if column in df.columns:
+            dates = _parse_dates(df[column]).fillna(dates)
+    prepared["display_date_dt"] = dates
+
+    return prepared.sort_values(by="display_date_dt", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def _sidecar_path(version):
+    return os.path.join(PREPARED_DIR, f"bets-v{PREPARED_FORMAT}-{version}.parquet")
+
+
+def load_prepared_bets():
+    """
+    Loads the prepared history, from the sidecar of the current store version
+    when it exists, otherwise from the history store (then writing the sidecar).
+
+    Returns:
+        tuple: (prepared DataFrame, store version).
+    """
+    version = history_store.store_version()
+    path = _sidecar_path(version)
+    if os.path.exists(path):
+        try:
+            return pd.read_parquet(path), version
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read prepared history '{path}': {e}")
+
+    prepared = prepare_bets(history_store.load_frame())
+    try:
+        os.makedirs(PREPARED_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        prepared.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        # Sidecars of older versions are never read again.
+        for old_path in glob.glob(os.path.join(PREPARED_DIR, "bets-*.parquet")):
+            if old_path != path:
+                os.remove(old_path)
+    except OSError as e:
+        print(f"Warning: could not write prepared history '{path}': {e}")
+    return prepared, version
@@ -0,0 +1,301 @@
+from datetime import datetime, timezone
+import glob
+import hashlib
+import json
+import os
+import sys
+
+import pandas as pd
+from decouple import config
+
+# Storage layer for the bet history.
+#
+# The history lives in a directory instead of a single JSON file:
+#   bets.parquet        compacted base, rewritten only by `compact()`
+#   segments/*.jsonl    new bets, one append-only file per collector run
+#   patches/*.jsonl     outcome updates ({fixture_id, market, bet_value, outcome})
+# A daily run therefore writes a few small files instead of rewriting the whole
+# history. Readers combine base + segments and then apply the patches in order.
+
+HISTORY_DIR = config("HISTORY_DIR", default="history")
+LEGACY_HISTORY_FILE = "history.json"
+
+BASE_FILE = "bets.parquet"
+SEGMENTS_DIR = "segments"
+PATCHES_DIR = "patches"
+
+# A bet is identified by its fixture, market and selection.
+BET_KEY = ["fixture_id", "market", "bet_value"]
+
+COLUMNS = [
+    "fixture_id", "match", "league", "match_date", "market", "bet_value",
+    "probability", "odds", "bookmaker", "value", "timestamp", "outcome",
+]
+
+
+def _path(*parts, root=None):
+    return os.path.join(root or HISTORY_DIR, *parts)
+
+
+def store_exists(root=None):
+    """Tells whether the history directory holds any data."""
+    return bool(os.path.exists(_path(BASE_FILE, root=root)) or _list_files(SEGMENTS_DIR, root) or _list_files(PATCHES_DIR, root))
+
+
+def _list_files(kind, root=None):
+    # File names start with a UTC timestamp, so sorting them gives write order.
+    return sorted(glob.glob(_path(kind, "*.jsonl", root=root)))
+
+
+def new_file_name():
+    """Returns a unique, time-ordered name for a new segment or patch file."""
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')}-{os.getpid()}.jsonl"
+
+
+def store_version(root=None):
+    """
+    Returns a short fingerprint of the history files (names, sizes and modification
+    times), which changes whenever a run appends, patches or compacts the history.
+    Cheap enough to poll: only file metadata is read.
+    """
+    root = root or HISTORY_DIR
+    paths = sorted(glob.glob(os.path.join(root, "**", "*"), recursive=True)) + [LEGACY_HISTORY_FILE]
+    fingerprint = hashlib.sha1()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if os.path.isfile(path):
+            fingerprint.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}\n".encode())
+    return fingerprint.hexdigest()[:12]
+
+
+def _read_jsonl(paths):
+    rows = []
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn last line from an interrupted write: everything before it is intact.
+                    print(f"Warning: skipping unreadable line in {path}.")
+    return rows
+
+
+def _append_jsonl(path, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _empty_frame():
+    return pd.DataFrame(columns=COLUMNS)
+
+
+def _load_legacy_frame(path=LEGACY_HISTORY_FILE):
+    if not os.path.exists(path):
+        return _empty_frame()
+    with open(path, "r") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            return _empty_frame()
+    return pd.DataFrame(data) if data else _empty_frame()
+
+
+def _apply_patches(df, patches):
+    if df.empty or not patches:
+        return df
+    outcomes = (
+        pd.DataFrame(patches)
+        .drop_duplicates(subset=BET_KEY, keep="last")
+        .set_index(BET_KEY)["outcome"]
+    )
+    new_outcomes = outcomes.reindex(pd.MultiIndex.from_frame(df[BET_KEY])).to_numpy()
+    patched = pd.notna(new_outcomes)
+    if patched.any():
+        if "outcome" not in df.columns:
+            df["outcome"] = None
+        df["outcome"] = df["outcome"].astype(object)
+        df.loc[patched, "outcome"] = new_outcomes[patched]
+    return df
+
+
+def load_frame(root=None):
+    """
+    Loads the full bet history as a DataFrame.
+
+    Falls back to the legacy `history.json` when the store has not been created yet.
+
+    Returns:
+        pd.DataFrame: One row per bet. Pending bets have a missing `outcome`.
+    """
+    if not store_exists(root):
+        return _load_legacy_frame()
+
+    frames = []
+    base_path = _path(BASE_FILE, root=root)
+    if os.path.exists(base_path):
+        frames.append(pd.read_parquet(base_path))
+    segment_rows = _read_jsonl(_list_files(SEGMENTS_DIR, root))
+    if segment_rows:
+        frames.append(pd.DataFrame(segment_rows))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return _empty_frame()
+
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return _apply_patches(df, _read_jsonl(_list_files(PATCHES_DIR, root)))
+
+
+def frame_to_records(df):
+    """
+    Converts a history DataFrame back to the list-of-dicts format used by the
+    collector, leaving out missing values (so pending bets have no `outcome` key).
+    """
+    return [
+        {key: value for key, value in record.items() if value is not None and not (isinstance(value, float) and value != value)}
+        for record in df.to_dict("records")
+    ]
+
+
+def load_records(root=None):
+    """
+    Loads the full bet history in the collector's list-of-dicts format.
+    """
+    return frame_to_records(load_frame(root))
+
+
+def append_bets(bets, root=None, segment=None):
+    """
+    Appends new bets to the history as a new segment (or to `segment` if given).
+
+    Args:
+        bets (list): Bet records.
+        segment (str, optional): Name of the segment file to append to (see `new_file_name`).
+
+    Returns:
+        str: The segment file name, so later appends of the same run can reuse it.
+    """
+    segment = segment or new_file_name()
+    if bets:
+        _append_jsonl(_path(SEGMENTS_DIR, segment, root=root), bets)
+    return segment
+
+
+def record_outcomes(settled_bets, root=None):
+    """
+    Records the outcome of settled bets as a patch, without rewriting any existing data.
+
+    Args:
+        settled_bets (list): Bet records that now carry an `outcome`.
+
+    Returns:
+        str: The name of the patch file written, or None if there was nothing to record.
+    """
+    patches = [
+        {**{key: bet[key] for key in BET_KEY}, "outcome": bet["outcome"]}
+        for bet in settled_bets if bet.get("outcome")
+    ]
+    if not patches:
+        return None
+    patch = new_file_name()
+    _append_jsonl(_path(PATCHES_DIR, patch, root=root), patches)
+    return patch
+
+
+def _write_base(df, root=None):
+    base_path = _path(BASE_FILE, root=root)
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    df = df.reindex(columns=list(dict.fromkeys(COLUMNS + list(df.columns))))
+    for column in ("match_date", "outcome"):
+        df[column] = df[column].astype(object).where(df[column].notna(), None)
+    tmp_path = f"{base_path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, base_path)
+
+
+def pending_file_count(root=None):
+    """Returns the number of segment and patch files not yet folded into the base file."""
+    return len(_list_files(SEGMENTS_DIR, root)) + len(_list_files(PATCHES_DIR, root))
+
+
+def compact(root=None):
+    """
+    Folds all segments and patches into the Parquet base file.
+
+    Returns:
+        int: The number of bets in the compacted history.
+    """
+    # Only the files seen now are removed afterwards, so a concurrent append is never lost.
+    segment_files = _list_files(SEGMENTS_DIR, root)
+    patch_files = _list_files(PATCHES_DIR, root)
+
+    frames = []
+    base_path = _path(BASE_FILE, root=root)
+    if os.path.exists(base_path):
+        frames.append(pd.read_parquet(base_path))
+    segment_rows = _read_jsonl(segment_files)
+    if segment_rows:
+        frames.append(pd.DataFrame(segment_rows))
+    frames = [frame for frame in frames if not frame.empty]
+    df = pd.concat(frames, ignore_index=True) if frames else _empty_frame()
+    df = _apply_patches(df, _read_jsonl(patch_files))
+
+    _write_base(df, root)
+    for path in segment_files + patch_files:
+        os.remove(path)
+    return len(df)
+
+
+def migrate_from_json(json_path=LEGACY_HISTORY_FILE, root=None):
+    """
+    One-time import of the legacy `history.json` into the store.
+
+    Returns:
+        int: The number of bets imported, or 0 if the store already exists or there is nothing to import.
+    """
+    if store_exists(root):
+        print(f"History store '{root or HISTORY_DIR}' already exists. Nothing to migrate.")
+        return 0
+    df = _load_legacy_frame(json_path)
+    if df.empty:
+        return 0
+    _write_base(df, root)
+    return len(df)
+
+
+def export_json(json_path, root=None):
+    """Writes the whole history to a JSON file in the legacy `history.json` format."""
+    records = load_records(root)
+    with open(json_path, "w") as f:
+        json.dump(records, f, indent=4)
+    return len(records)
+
+
+def _compact_command(min_files=0):
+    pending = pending_file_count()
+    if pending < min_files:
+        print(f"{pending} segment/patch files, fewer than {min_files}: nothing to compact.")
+        return
+    print(f"Compacted history: {compact()} bets.")
+
+
+if __name__ == "__main__":
+    commands = {
+        "migrate": lambda: print(f"Migrated {migrate_from_json()} bets from '{LEGACY_HISTORY_FILE}'."),
+        "compact": lambda: _compact_command(int(sys.argv[2]) if len(sys.argv) > 2 else 0),
+        "export": lambda: print(f"Exported {export_json(sys.argv[2] if len(sys.argv) > 2 else LEGACY_HISTORY_FILE)} bets."),
+    }
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print("Usage: python -m src.history_store [migrate | compact [min files] | export [path]]")
+        sys.exit(1)
+    commands[sys.argv[1]]()
@@ -0,0 +1,155 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from decouple import config
+
+# Lightweight timers and counters for the daily run. Each pipeline stage is
+# timed every time it runs (once per fixture for the per-fixture stages) and
+# each API call is timed per endpoint, so the run profile can report p50/p95
+# durations and tell where the time goes. Everything is kept in memory for the
+# current process and written once at the end of the run.
+
+PROFILE_FILE = config("RUN_PROFILE_FILE", default="run_profile.json")
+
+_lock = threading.Lock()
+_stage_timings = defaultdict(list)
+_api_timings = defaultdict(list)
+_api_cache_hits = defaultdict(int)
+_counters = defaultdict(int)
+_started = time.perf_counter()
+
+
+@contextmanager
+def timer(stage):
+    """
+    Times the enclosed block as one occurrence of `stage`. Stages may nest, e.g.
+    the model stage includes the team statistics it fetches.
+
+    Usage:
+        with instrumentation.timer("odds_fetch"):
+            ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(stage, time.perf_counter() - start)
+
+
+def record_timing(stage, seconds):
+    with _lock:
+        _stage_timings[stage].append(seconds)
+
+
+def count(name, increment=1):
+    """Adds `increment` to the counter `name`."""
+    with _lock:
+        _counters[name] += increment
+
+
+def record_api_call(endpoint, seconds):
+    """Records the latency of one HTTP request (a retry counts as another request)."""
+    with _lock:
+        _api_timings[endpoint.strip("/")].append(seconds)
+
+
+def record_api_cache_hit(endpoint):
+    with _lock:
+        _api_cache_hits[endpoint.strip("/")] += 1
+
+
+def reset():
+    """Clears every timing and counter, and restarts the run clock."""
+    global _started
+    with _lock:
+        _stage_timings.clear()
+        _api_timings.clear()
+        _api_cache_hits.clear()
+        _counters.clear()
+        _started = time.perf_counter()
+
+
+def _summarize(timings):
+    values = np.asarray(timings, dtype=float)
+    p50, p95 = np.percentile(values, [50, 95])
+    return {
+        "count": int(values.size),
+        "total_s": round(float(values.sum()), 4),
+        "p50_s": round(float(p50), 4),
+        "p95_s": round(float(p95), 4),
+        "max_s": round(float(values.max()), 4),
+    }
+
+
+def get_profile():
+    """
+    Returns the profile of the current run.
+
+    Returns:
+        dict: 'stages' (stage -> count, total, p50, p95 and max in seconds, longest
+        total first), 'api' (endpoint -> HTTP requests, cache hits and latency
+        percentiles), 'counters' and the total 'duration_s'.
+    """
+    with _lock:
+        stage_timings = {stage: list(timings) for stage, timings in _stage_timings.items()}
+        api_timings = {endpoint: list(timings) for endpoint, timings in _api_timings.items()}
+        api_cache_hits = dict(_api_cache_hits)
+        counters = dict(_counters)
+        duration = time.perf_counter() - _started
+
+    stages = {stage: _summarize(timings) for stage, timings in stage_timings.items()}
+    api = {}
+    for endpoint in sorted(set(api_timings) | set(api_cache_hits)):
+        summary = _summarize(api_timings[endpoint]) if endpoint in api_timings else {"count": 0}
+        api[endpoint] = {
+            "requests": summary.pop("count"),
+            "cache_hits": api_cache_hits.get(endpoint, 0),
+            **summary,
+        }
+    return {
+        "generated_utc": datetime.now(timezone.utc).isoformat(),
+        "duration_s": round(duration, 3),
+        "stages": dict(sorted(stages.items(), key=lambda item: -item[1]["total_s"])),
+        "api": api,
+        "counters": counters,
+    }
+
+
+def write_profile(path=PROFILE_FILE, extra=None):
+    """
+    Writes the profile of the current run to `path` (atomically).
+
+    Args:
+        extra (dict, optional): Additional sections merged into the profile,
+            e.g. the HTTP client or response cache counters.
+
+    Returns:
+        dict: The profile written.
+    """
+    profile = get_profile()
+    profile.update(extra or {})
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(profile, f, indent=4)
+    os.replace(tmp_path, path)
+    return profile
+
+
+def format_profile(profile, top=8):
+    """Formats the slowest stages and the API calls of a profile as text lines for the run log."""
+    lines = [f"Run profile ({profile['duration_s']:.1f}s):"]
+    for stage, summary in list(profile["stages"].items())[:top]:
+        lines.append(
+            f"  {stage:<22} x{summary['count']:<5} total {summary['total_s']:8.2f}s | "
+            f"p50 {summary['p50_s'] * 1000:8.1f}ms | p95 {summary['p95_s'] * 1000:8.1f}ms"
+        )
+    for endpoint, summary in profile["api"].items():
+        latency = f" | p50 {summary['p50_s'] * 1000:.0f}ms p95 {summary['p95_s'] * 1000:.0f}ms" if summary["requests"] else ""
+        lines.append(f"  api {endpoint:<18} {summary['requests']} requests, {summary['cache_hits']} cache hits{latency}")
+    return "\n".join(lines)
@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import sys
+
+from decouple import config
+
+# Optional SQLite ledger of bets. When enabled, the collector reads pending bets
+# and checks already analysed fixtures with indexed queries instead of loading
+# the whole history into memory. The history store stays the source the
+# dashboards read from; the ledger is kept in sync alongside it.
+
+LEDGER_DB = config("LEDGER_DB", default=None)
+
+COLUMNS = [
+    "fixture_id", "match", "league", "match_date", "market", "bet_value",
+    "probability", "odds", "bookmaker", "value", "timestamp", "outcome",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bets (
+    fixture_id  INTEGER NOT NULL,
+    match       TEXT,
+    league      TEXT,
+    match_date  TEXT,
+    market      TEXT NOT NULL,
+    bet_value   TEXT NOT NULL,
+    probability REAL,
+    odds        REAL,
+    bookmaker   INTEGER,
+    value       REAL,
+    timestamp   TEXT,
+    outcome     TEXT,
+    PRIMARY KEY (fixture_id, market, bet_value)
+);
+CREATE INDEX IF NOT EXISTS idx_bets_fixture_id ON bets (fixture_id);
+CREATE INDEX IF NOT EXISTS idx_bets_outcome ON bets (outcome);
+CREATE INDEX IF NOT EXISTS idx_bets_league ON bets (league);
+CREATE INDEX IF NOT EXISTS idx_bets_market ON bets (market);
+CREATE INDEX IF NOT EXISTS idx_bets_match_date ON bets (match_date);
+CREATE INDEX IF NOT EXISTS idx_bets_pending ON bets (fixture_id) WHERE outcome IS NULL;
+"""
+
+
+class KnownFixtures:
+    """
+    Set-like view of the fixture IDs in the ledger.
+    Membership tests (`fixture_id in known`) run an indexed query instead of loading every ID.
+    """
+
+    def __init__(self, ledger):
+        self._ledger = ledger
+
+    def __contains__(self, fixture_id):
+        return self._ledger.has_fixture(fixture_id)
+
+
+class Ledger:
+    """
+    SQLite-backed bet ledger.
+
+    Args:
+        path (str): Path of the database file (created if missing).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(bets)")}
+        if "bookmaker" not in columns:
+            # Ledgers created before bets recorded the bookmaker of their odds.
+            with self.conn:
+                self.conn.execute("ALTER TABLE bets ADD COLUMN bookmaker INTEGER")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM bets").fetchone()[0]
+
+    def add_bets(self, bets):
+        """
+        Inserts bets, ignoring those already in the ledger.
+
+        Returns:
+            int: The number of bets inserted.
+        """
+        with self.conn:
+            cursor = self.conn.executemany(
+                f"INSERT OR IGNORE INTO bets ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+                [tuple(bet.get(column) for column in COLUMNS) for bet in bets],
+            )
+        return cursor.rowcount
+
+    def record_outcomes(self, settled_bets):
+        """Stores the outcome of settled bets."""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE bets SET outcome = ? WHERE fixture_id = ? AND market = ? AND bet_value = ?",
+                [
+                    (bet["outcome"], bet["fixture_id"], bet["market"], bet["bet_value"])
+                    for bet in settled_bets if bet.get("outcome")
+                ],
+            )
+
+    def pending_bets(self):
+        """
+        Returns every bet without an outcome, in the collector's record format
+        (no `outcome` key, missing values left out).
+        """
+        rows = self.conn.execute("SELECT * FROM bets WHERE outcome IS NULL ORDER BY fixture_id")
+        return [_row_to_record(row) for row in rows]
+
+    def has_fixture(self, fixture_id):
+        row = self.conn.execute("SELECT 1 FROM bets WHERE fixture_id = ? LIMIT 1", (fixture_id,)).fetchone()
+        return row is not None
+
+    def known_fixtures(self):
+        """Returns a `KnownFixtures` view, usable wherever a set of fixture IDs is expected."""
+        return KnownFixtures(self)
+
+    def all_bets(self):
+        rows = self.conn.execute("SELECT * FROM bets ORDER BY rowid")
+        return [_row_to_record(row) for row in rows]
+
+    def import_json(self, json_path):
+        """
+        Imports bets from a file in the `history.json` format.
+
+        Returns:
+            int: The number of bets inserted.
+        """
+        with open(json_path, "r") as f:
+            return self.add_bets(json.load(f))
+
+    def export_json(self, json_path):
+        """
+        Writes every bet to a file in the `history.json` format.
+
+        Returns:
+            int: The number of bets exported.
+        """
+        records = self.all_bets()
+        with open(json_path, "w") as f:
+            json.dump(records, f, indent=4)
+        return len(records)
+
+
+def _row_to_record(row):
+    return {column: row[column] for column in COLUMNS if row[column] is not None}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python -m src.ledger [import | export] <ledger.db> <history.json>")
+        sys.exit(1)
+    command, db_path, json_path = sys.argv[1:]
+    with Ledger(db_path) as bet_ledger:
+        if command == "import":
+            print(f"Imported {bet_ledger.import_json(json_path)} bets into '{db_path}'.")
+        else:
+            print(f"Exported {bet_ledger.export_json(json_path)} bets to '{json_path}'.")
@@ -1,6 +1,11 @@
+from datetime import date
+import json
+import os
+
 import numpy as np
+from decouple import config
 from scipy.stats import poisson
-from . import api_client
+from . import api_client, instrumentation, team_strength
 
 # NOTE: As the API documentation could not be accessed, the endpoint names and
 # parameter names used in this module are based on common API design patterns
@@ -15,31 +20,170 @@ def get_team_stats(team_id, league_id, season):
     params = {"team": team_id, "league": league_id, "season": season}
     # Example of expected data structure from API:
     # { 'goals': { 'for': { 'total': { 'home': 20, 'away': 15 } }, 'against': { 'total': { 'home': 10, 'away': 12 } } } }
-    return api_client.make_api_request(endpoint, params)
+    with instrumentation.timer("team_stats"):
+        return api_client.make_api_request(endpoint, params)
 
-def get_league_stats(league_id, season):
+async def get_team_stats_async(session, team_id, league_id, season):
+    """Async counterpart of `get_team_stats`, for use with `api_client.create_async_session`."""
+    endpoint = "teams/statistics"
+    params = {"team": team_id, "league": league_id, "season": season}
+    with instrumentation.timer("team_stats"):
+        return await api_client.make_api_request_async(session, endpoint, params)
+
+def compute_league_averages(standings_response):
     """
-    Fetches statistics for all teams in a league to calculate averages.
-    This is a conceptual function. The actual implementation depends heavily on the API's capabilities.
-    A more robust way is to fetch stats for each team and aggregate.
-    For now, we will assume an endpoint that provides league-level stats, which is unlikely.
-    A more realistic approach would be to get all teams from a `/teams?league=...` endpoint
-    and then loop through them calling `get_team_stats`.
+    Aggregates a standings response into per-match league scoring averages.
+
+    Groups (e.g. conferences or cup groups) are pooled together.
+
+    Returns:
+        dict: Home/away scoring and conceding averages, or None if the response has no usable data.
     """
-    # This is a major assumption. A real implementation would need to iterate through all teams.
-    # We will mock this for now.
-    print("Fetching league-wide stats is complex and depends on the API. Using mock data for now.")
+    try:
+        groups = standings_response['response'][0]['league']['standings']
+        home_played = home_for = home_against = 0
+        away_played = away_for = away_against = 0
+        for group in groups:
+            for entry in group:
+                home_played += entry['home']['played'] or 0
+                home_for += entry['home']['goals']['for'] or 0
+                home_against += entry['home']['goals']['against'] or 0
+                away_played += entry['away']['played'] or 0
+                away_for += entry['away']['goals']['for'] or 0
+                away_against += entry['away']['goals']['against'] or 0
+    except (KeyError, IndexError, TypeError):
+        return None
+
+    if home_played == 0 or away_played == 0 or 0 in (home_for, home_against, away_for, away_against):
+        return None
+
     return {
-        "avg_goals_scored_home": 1.5,
-        "avg_goals_conceded_home": 1.1,
-        "avg_goals_scored_away": 1.2,
-        "avg_goals_conceded_away": 1.4,
+        "avg_goals_scored_home": home_for / home_played,
+        "avg_goals_conceded_home": home_against / home_played,
+        "avg_goals_scored_away": away_for / away_played,
+        "avg_goals_conceded_away": away_against / away_played,
     }
 
+# Used when a competition has no standings (e.g. knockout cups) or no match played yet.
+DEFAULT_LEAGUE_AVERAGES = {
+    "avg_goals_scored_home": 1.5,
+    "avg_goals_conceded_home": 1.1,
+    "avg_goals_scored_away": 1.2,
+    "avg_goals_conceded_away": 1.4,
+}
+
+LEAGUE_STATS_DIR = config("LEAGUE_STATS_DIR", default=".cache/league_stats")
+
+# League averages already computed in this process, by (league_id, season).
+_league_stats_memo = {}
+
+def _league_stats_path(league_id, season):
+    return os.path.join(LEAGUE_STATS_DIR, f"{league_id}_{season}.json")
+
+def get_league_stats(league_id, season):
+    """
+    Returns the home/away scoring averages of a league for a season.
+
+    Averages are computed from the league standings and memoized in memory for
+    the run and on disk for the day, so each league costs at most one API call
+    per day however many of its fixtures are analysed. Defaults are kept for the
+    day only when the standings are valid but unusable (e.g. a knockout cup); a
+    failed standings request is retried on the next call.
+    """
+    key = (league_id, season)
+    if key in _league_stats_memo:
+        return _league_stats_memo[key]
+
+    today = date.today().isoformat()
+    path = _league_stats_path(league_id, season)
+    try:
+        with open(path, "r") as f:
+            stored = json.load(f)
+        if stored.get("date") == today:
+            _league_stats_memo[key] = stored["averages"]
+            return stored["averages"]
+    except (OSError, json.JSONDecodeError, KeyError):
+        pass
+
+    standings_response = team_strength.get_standings(league_id, season)
+    if standings_response is None or standings_response.get('errors'):
+        # The request failed (network, 429, quota, or an API error in the body): use the defaults for this call
+        # only, so the next call retries the standings instead of a day of defaults.
+        print(f"Could not fetch standings for league {league_id} ({season}). Using default league averages for now.")
+        return dict(DEFAULT_LEAGUE_AVERAGES)
+
+    averages = compute_league_averages(standings_response)
+    source = "standings"
+    if averages is None:
+        print(f"No usable standings for league {league_id} ({season}). Using default league averages.")
+        averages = dict(DEFAULT_LEAGUE_AVERAGES)
+        source = "default"
+
+    try:
+        os.makedirs(LEAGUE_STATS_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"date": today, "source": source, "averages": averages}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: could not save league averages for league {league_id}: {e}")
+
+    _league_stats_memo[key] = averages
+    return averages
+
+def get_current_seasons():
+    """
+    Returns the current season of every league, from a single `leagues` request.
+
+    Returns:
+        dict: League ID to current season year.
+    """
+    response = api_client.make_api_request("leagues", {"current": "true"})
+    seasons = {}
+    for entry in (response or {}).get('response') or []:
+        try:
+            current = next(s for s in entry['seasons'] if s.get('current'))
+            seasons[entry['league']['id']] = current['year']
+        except (KeyError, StopIteration):
+            continue
+    return seasons
+
+def prewarm_league_stats(league_ids):
+    """
+    Computes league averages ahead of the analysis for every given league, in its current season.
+
+    Args:
+        league_ids (iterable): League IDs, e.g. those of config/leagues.json.
+
+    Returns:
+        int: The number of leagues warmed up.
+    """
+    seasons = get_current_seasons()
+    warmed = 0
+    for league_id in league_ids:
+        if league_id in seasons:
+            get_league_stats(league_id, seasons[league_id])
+            warmed += 1
+    return warmed
+
 def calculate_poisson_probabilities(home_team_id, away_team_id, league_id, season):
     """
     Calculates match outcome probabilities using a Poisson distribution model.
     """
+    # Teams covered by the precomputed strength table need no API call at all.
+    from_table = calculate_poisson_from_table(home_team_id, away_team_id, league_id, season)
+    if from_table is not None:
+        return from_table
+    return calculate_poisson_from_team_stats(home_team_id, away_team_id, league_id, season)
+
+def calculate_poisson_from_team_stats(home_team_id, away_team_id, league_id, season):
+    """
+    Runs the Poisson model from the `teams/statistics` of both teams (two API
+    calls), for fixtures whose teams are not in a team-strength table.
+
+    Returns:
+        tuple: (score_matrix, home_lambda, away_lambda), or None if the stats are unusable.
+    """
     league_averages = get_league_stats(league_id, season)
     if not league_averages:
         print("Could not get league average stats. Aborting.")
@@ -48,6 +192,20 @@ def calculate_poisson_probabilities(home_team_id, away_team_id, league_id, seaso
     home_stats_response = get_team_stats(home_team_id, league_id, season)
     away_stats_response = get_team_stats(away_team_id, league_id, season)
 
+    return calculate_poisson_from_stats(home_stats_response, away_stats_response, league_averages)
+
+def calculate_poisson_from_stats(home_stats_response, away_stats_response, league_averages):
+    """
+    Runs the Poisson model on already fetched team statistics.
+
+    Args:
+        home_stats_response (dict): The `teams/statistics` response for the home team.
+        away_stats_response (dict): The `teams/statistics` response for the away team.
+        league_averages (dict): League averages, as returned by `get_league_stats`.
+
+    Returns:
+        tuple: (score_matrix, home_lambda, away_lambda), or None if the stats are unusable.
+    """
     if not home_stats_response or not away_stats_response:
         print("Could not retrieve team stats. Aborting calculation.")
         return None
@@ -91,21 +249,120 @@ def calculate_poisson_probabilities(home_team_id, away_team_id, league_id, seaso
     away_lambda = away_attack_strength * home_defense_strength * league_averages['avg_goals_scored_away']
 
     # --- Poisson Calculation ---
-    # Dynamic truncation based on quantile to avoid fixed max_goals
-    # We find the number of goals that covers 99.99% of the probability mass
-    max_goals_home = int(poisson.ppf(0.9999, home_lambda))
-    max_goals_away = int(poisson.ppf(0.9999, away_lambda))
-
-    score_matrix = np.zeros((max_goals_home + 1, max_goals_away + 1))
-
-    for i in range(max_goals_home + 1):  # Home goals
-        for j in range(max_goals_away + 1):  # Away goals
-            prob_home = poisson.pmf(k=i, mu=home_lambda)
-            prob_away = poisson.pmf(k=j, mu=away_lambda)
-            score_matrix[i, j] = prob_home * prob_away
+    score_matrix = build_score_matrix(home_lambda, away_lambda)
 
     # The sum of probabilities in the matrix might not be 1 because we cap at max_goals.
     # For more accuracy, we could normalize it, but for now, this is sufficient.
     # print(f"Sum of matrix probabilities: {np.sum(score_matrix)}")
 
     return score_matrix, home_lambda, away_lambda
+
+def calculate_poisson_from_table(home_team_id, away_team_id, league_id, season):
+    """
+    Runs the Poisson model using the league's team-strength table.
+
+    Returns:
+        tuple: (score_matrix, home_lambda, away_lambda), or None if either team is not in the table.
+    """
+    table = team_strength.get_table(league_id, season)
+    if table is None:
+        return None
+    home_lambdas, away_lambdas, found = table.expected_goals([home_team_id], [away_team_id])
+    if not found[0]:
+        return None
+    home_lambda, away_lambda = float(home_lambdas[0]), float(away_lambdas[0])
+    return build_score_matrix(home_lambda, away_lambda), home_lambda, away_lambda
+
+def calculate_poisson_probabilities_batch(fixtures):
+    """
+    Runs the Poisson model on a whole slate of fixtures from the team-strength
+    tables, with one vectorized lookup per league and a single stacked score-matrix build.
+
+    Args:
+        fixtures (list): Fixtures as returned by the `fixtures` endpoint.
+
+    Returns:
+        tuple: (score_matrices, home_lambdas, away_lambdas, found). Score matrices
+        are stacked as in `build_score_matrices`; fixtures whose teams are not in
+        a table have `found` set to False and zero-filled matrices.
+    """
+    home_lambdas = np.full(len(fixtures), np.nan)
+    away_lambdas = np.full(len(fixtures), np.nan)
+
+    by_league = {}
+    for position, fixture_data in enumerate(fixtures):
+        key = (fixture_data['league']['id'], fixture_data['league']['season'])
+        by_league.setdefault(key, []).append(position)
+
+    for (league_id, season), positions in by_league.items():
+        table = team_strength.get_table(league_id, season)
+        if table is None:
+            continue
+        league_home, league_away, _ = table.expected_goals(
+            [fixtures[p]['teams']['home']['id'] for p in positions],
+            [fixtures[p]['teams']['away']['id'] for p in positions],
+        )
+        home_lambdas[positions] = league_home
+        away_lambdas[positions] = league_away
+
+    found = ~(np.isnan(home_lambdas) | np.isnan(away_lambdas))
+    score_matrices = build_score_matrices(np.where(found, home_lambdas, 0.0), np.where(found, away_lambdas, 0.0))
+    score_matrices[~found] = 0.0
+    return score_matrices, home_lambdas, away_lambdas, found
+
+# Dynamic truncation based on quantile to avoid fixed max_goals:
+# each side is cut at the number of goals that covers 99.99% of its probability mass.
+TRUNCATION_QUANTILE = 0.9999
+
+def build_score_matrix(home_lambda, away_lambda):
+    """
+    Builds the matrix of exact-score probabilities for one fixture.
+
+    Each marginal Poisson PMF is evaluated once and the matrix is their outer
+    product, as home and away goals are modelled as independent.
+
+    Args:
+        home_lambda (float): Expected home goals.
+        away_lambda (float): Expected away goals.
+
+    Returns:
+        np.array: A 2D array where [i, j] is the probability of the score i-j.
+    """
+    max_goals_home = int(poisson.ppf(TRUNCATION_QUANTILE, home_lambda))
+    max_goals_away = int(poisson.ppf(TRUNCATION_QUANTILE, away_lambda))
+
+    home_pmf = poisson.pmf(np.arange(max_goals_home + 1), home_lambda)
+    away_pmf = poisson.pmf(np.arange(max_goals_away + 1), away_lambda)
+    return np.outer(home_pmf, away_pmf)
+
+def build_score_matrices(home_lambdas, away_lambdas):
+    """
+    Builds the score matrices for a whole slate of fixtures at once.
+
+    Every fixture keeps its own truncation point; the matrices are zero-padded
+    to the largest one so they can be stacked. Slice `n` therefore holds
+    `build_score_matrix(home_lambdas[n], away_lambdas[n])` in its top-left corner.
+
+    Args:
+        home_lambdas (array-like): Expected home goals, one per fixture.
+        away_lambdas (array-like): Expected away goals, one per fixture.
+
+    Returns:
+        np.array: A 3D array of shape (fixtures, max home goals + 1, max away goals + 1).
+    """
+    home_lambdas = np.asarray(home_lambdas, dtype=float)
+    away_lambdas = np.asarray(away_lambdas, dtype=float)
+    if home_lambdas.size == 0:
+        return np.zeros((0, 1, 1))
+
+    max_goals_home = poisson.ppf(TRUNCATION_QUANTILE, home_lambdas).astype(int)
+    max_goals_away = poisson.ppf(TRUNCATION_QUANTILE, away_lambdas).astype(int)
+
+    home_goals = np.arange(max_goals_home.max() + 1)
+    away_goals = np.arange(max_goals_away.max() + 1)
+    home_pmf = poisson.pmf(home_goals[None, :], home_lambdas[:, None])
+    away_pmf = poisson.pmf(away_goals[None, :], away_lambdas[:, None])
+    home_pmf[home_goals[None, :] > max_goals_home[:, None]] = 0.0
+    away_pmf[away_goals[None, :] > max_goals_away[:, None]] = 0.0
+
+    return home_pmf[:, :, None] * away_pmf[:, None, :]
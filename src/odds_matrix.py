@@ -0,0 +1,212 @@
+import warnings
+
+import numpy as np
+
+from . import probabilities, value_finder
+
+# Array-backed odds of many fixtures from every bookmaker that prices them:
+# a (fixtures x selections x bookmakers) matrix, NaN where a bookmaker does
+# not price a selection. Best price, median price and bookmaker margins are
+# computed over whole slates at once, and value bets are found for every
+# fixture in a single comparison with our probabilities. A bookmaker's market
+# only enters the matrix when it prices every selection: a suspended or
+# partial market (e.g. 1X2 without a Draw) is left as NaN.
+
+# Selections of every modelled market, in matrix column order.
+MARKET_SELECTIONS = {
+    '1x2': ('home', 'draw', 'away'),
+    'btts': ('yes', 'no'),
+    **{probabilities.market_key_for_line(line): ('over', 'under') for line in probabilities.OU_LINES},
+}
+COLUMNS = [(market, selection) for market, selections in MARKET_SELECTIONS.items() for selection in selections]
+COLUMN_INDEX = {column: i for i, column in enumerate(COLUMNS)}
+MARKET_SLICES = {
+    market: slice(COLUMN_INDEX[(market, selections[0])], COLUMN_INDEX[(market, selections[0])] + len(selections))
+    for market, selections in MARKET_SELECTIONS.items()
+}
+
+# Selections compared with our probabilities (the markets `settlement` can settle):
+# (matrix column, key in the probabilities dict, market label, selection label).
+VALUE_SELECTIONS = [
+    (('1x2', 'home'), ('1x2', 'home_win'), '1X2', 'Home'),
+    (('1x2', 'draw'), ('1x2', 'draw'), '1X2', 'Draw'),
+    (('1x2', 'away'), ('1x2', 'away_win'), '1X2', 'Away'),
+    (('ou_2_5', 'over'), ('ou_2_5', 'over'), 'O/U 2.5', 'Over'),
+    (('ou_2_5', 'under'), ('ou_2_5', 'under'), 'O/U 2.5', 'Under'),
+    (('btts', 'yes'), ('btts', 'btts_yes'), 'BTTS', 'Yes'),
+    (('btts', 'no'), ('btts', 'btts_no'), 'BTTS', 'No'),
+]
+VALUE_COLUMNS = np.array([COLUMN_INDEX[column] for column, _, _, _ in VALUE_SELECTIONS])
+
+
+class OddsMatrix:
+    """
+    Odds of many fixtures from many bookmakers.
+
+    Attributes:
+        fixture_ids (np.array): Fixture ID of each row.
+        bookmaker_ids (list): Bookmaker ID of each position of the last axis.
+        odds (np.array): Decimal odds, shape (fixtures, len(COLUMNS), bookmakers), NaN where missing.
+        listed (np.array): Whether each bookmaker is listed for each fixture, shape (fixtures, bookmakers).
+        first_listed (np.array): Position of the first bookmaker listed for each fixture (-1 if none).
+    """
+
+    def __init__(self, fixture_ids, bookmaker_ids, odds, listed, first_listed):
+        self.fixture_ids = np.asarray(fixture_ids)
+        self.bookmaker_ids = list(bookmaker_ids)
+        self.odds = odds
+        self.listed = listed
+        self.first_listed = first_listed
+
+    @classmethod
+    def from_index(cls, odds_index):
+        """
+        Builds the matrix from `value_finder.index_odds` entries. Only the markets
+        of MARKET_SELECTIONS are parsed, for every bookmaker; markets missing a
+        selection (see `value_finder.is_complete_market`) are left out.
+
+        Args:
+            odds_index (dict): Fixture ID to its index entry (entries may be None).
+
+        Returns:
+            OddsMatrix: One row per fixture, in the order of `odds_index`.
+        """
+        fixture_ids = list(odds_index)
+        entries = [odds_index[fixture_id] or {'bookmakers': {}} for fixture_id in fixture_ids]
+        positions = {}
+        for entry in entries:
+            for bookmaker_id in entry['bookmakers']:
+                positions.setdefault(bookmaker_id, len(positions))
+
+        odds = np.full((len(fixture_ids), len(COLUMNS), len(positions)), np.nan)
+        listed = np.zeros((len(fixture_ids), len(positions)), dtype=bool)
+        first_listed = np.full(len(fixture_ids), -1)
+        for row, entry in enumerate(entries):
+            for bookmaker_id in entry['bookmakers']:
+                position = positions[bookmaker_id]
+                listed[row, position] = True
+                if first_listed[row] < 0:
+                    first_listed[row] = position
+                for market in MARKET_SELECTIONS:
+                    selections = value_finder.get_market_odds(entry, bookmaker_id, market)
+                    if not value_finder.is_complete_market(market, selections):
+                        continue
+                    for selection, odd in selections.items():
+                        column = COLUMN_INDEX.get((market, selection))
+                        # Odds of 1.0 or less are placeholders (suspended markets), not prices.
+                        if column is not None and odd > 1.0:
+                            odds[row, column, position] = odd
+        return cls(fixture_ids, positions, odds, listed, first_listed)
+
+    def __len__(self):
+        return len(self.fixture_ids)
+
+    def best_prices(self):
+        """Highest odds of each selection over all bookmakers, shape (fixtures, len(COLUMNS)), NaN if unpriced."""
+        if not self.bookmaker_ids:
+            return np.full(self.odds.shape[:2], np.nan)
+        return np.fmax.reduce(self.odds, axis=2)
+
+    def best_bookmakers(self):
+        """Bookmaker ID offering each best price, shape (fixtures, len(COLUMNS)); None if unpriced."""
+        if not self.bookmaker_ids:
+            return np.full(self.odds.shape[:2], None, dtype=object)
+        positions = np.argmax(np.where(np.isnan(self.odds), -np.inf, self.odds), axis=2)
+        ids = np.array(self.bookmaker_ids + [None], dtype=object)
+        return ids[np.where(np.isnan(self.best_prices()), len(self.bookmaker_ids), positions)]
+
+    def median_prices(self):
+        """Median odds of each selection over the bookmakers pricing it, shape (fixtures, len(COLUMNS))."""
+        if not self.bookmaker_ids:
+            return np.full(self.odds.shape[:2], np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN slices: unpriced selections.
+            return np.nanmedian(self.odds, axis=2)
+
+    def _preferred_positions(self, bookmaker_id):
+        """Position of the bookmaker used for each fixture by `preferred_prices` (-1 if none)."""
+        if bookmaker_id in self.bookmaker_ids:
+            preferred = self.bookmaker_ids.index(bookmaker_id)
+            return np.where(self.listed[:, preferred], preferred, self.first_listed)
+        return self.first_listed
+
+    def preferred_prices(self, bookmaker_id=value_finder.PREFERRED_BOOKMAKER_ID):
+        """
+        Odds of the preferred bookmaker, or of the first bookmaker listed for the
+        fixtures it does not cover. Markets that bookmaker leaves incomplete stay
+        NaN: they are not filled in from other bookmakers.
+
+        Returns:
+            np.array: Shape (fixtures, len(COLUMNS)), NaN if unpriced.
+        """
+        prices = np.full(self.odds.shape[:2], np.nan)
+        chosen = self._preferred_positions(bookmaker_id)
+        rows = np.flatnonzero(chosen >= 0)
+        prices[rows] = self.odds[rows, :, chosen[rows]]
+        return prices
+
+    def preferred_bookmakers(self, bookmaker_id=value_finder.PREFERRED_BOOKMAKER_ID):
+        """Bookmaker ID behind each of `preferred_prices`, shape (fixtures, len(COLUMNS)); None if unpriced."""
+        chosen = self._preferred_positions(bookmaker_id)
+        ids = np.array(self.bookmaker_ids + [None], dtype=object)
+        positions = np.where(chosen >= 0, chosen, len(self.bookmaker_ids))[:, None]
+        return np.where(np.isnan(self.preferred_prices(bookmaker_id)), None, ids[positions])
+
+    def implied_margins(self, market, prices=None):
+        """
+        Bookmaker margin (overround) of a market: the sum of the implied
+        probabilities of its selections, minus 1. NaN where a selection is unpriced.
+
+        Args:
+            market (str): A key of MARKET_SELECTIONS, e.g. '1x2' or 'ou_2_5'.
+            prices (np.array, optional): A (fixtures, len(COLUMNS)) price array, e.g.
+                `best_prices()`, to get the margin of that combined line.
+
+        Returns:
+            np.array: Shape (fixtures, bookmakers), or (fixtures,) when `prices` is given.
+        """
+        selected = (self.odds if prices is None else prices)[:, MARKET_SLICES[market]]
+        return np.sum(1.0 / selected, axis=1) - 1.0
+
+
+def stack_probabilities(markets):
+    """
+    Arranges the output of `probabilities.get_market_probabilities_batch` (which
+    must include the 2.5 goal line) as an array aligned with VALUE_SELECTIONS.
+
+    Returns:
+        np.array: Shape (fixtures, len(VALUE_SELECTIONS)).
+    """
+    return np.column_stack([
+        np.asarray(markets[market][key], dtype=float) for _, (market, key), _, _ in VALUE_SELECTIONS
+    ])
+
+
+def find_value_bets(probs, prices, bookmakers=None):
+    """
+    Finds the value bets of many fixtures at once: selections whose probability
+    times the price is above 1.
+
+    Args:
+        probs (np.array): Our probabilities, one row per fixture, from `stack_probabilities`.
+        prices (np.array): Prices per fixture and column, e.g. `OddsMatrix.best_prices()`.
+        bookmakers (np.array, optional): Bookmaker of each price, e.g. `best_bookmakers()`;
+            added to each bet as 'bookmaker'.
+
+    Returns:
+        list: For each fixture, its value bets as dicts with 'market', 'value',
+        'prob' and 'odds' (and 'bookmaker').
+    """
+    prices = np.asarray(prices, dtype=float)
+    probs = np.asarray(probs, dtype=float).reshape(len(prices), len(VALUE_SELECTIONS))
+    value_prices = prices[:, VALUE_COLUMNS]
+    with np.errstate(invalid="ignore"):
+        is_value = probs * value_prices > 1
+    value_bets = [[] for _ in range(len(probs))]
+    for row, column in zip(*np.nonzero(is_value)):
+        _, _, market, selection = VALUE_SELECTIONS[column]
+        bet = {'market': market, 'value': selection, 'prob': float(probs[row, column]), 'odds': float(value_prices[row, column])}
+        if bookmakers is not None:
+            bet['bookmaker'] = bookmakers[row, VALUE_COLUMNS[column]]
+        value_bets[row].append(bet)
+    return value_bets
@@ -1,10 +1,17 @@
+from functools import lru_cache
+
 import numpy as np
 from scipy.stats import skellam
 
+# Over/Under goal lines computed by the batched engine.
+OU_LINES = (0.5, 1.5, 2.5, 3.5, 4.5)
+
 def calculate_1x2_probs_skellam(home_lambda, away_lambda):
     """
     Calculates Home Win (1), Draw (X), and Away Win (2) probabilities
     using the Skellam distribution. This is more accurate than matrix summation.
+
+    Works element-wise when given arrays of lambdas.
     """
     # The difference of two Poisson variables is a Skellam distribution.
     # We are interested in the difference k = home_goals - away_goals.
@@ -21,6 +28,26 @@ def calculate_1x2_probs_skellam(home_lambda, away_lambda):
     }
 
 
+@lru_cache(maxsize=64)
+def _goal_sum_index(shape):
+    """
+    Returns, for a score matrix of the given shape, the one-hot matrix mapping
+    each flattened cell (i, j) to its total number of goals i + j.
+    Shape: (rows * cols, rows + cols - 1).
+    """
+    rows, cols = shape
+    goal_sums = np.add.outer(np.arange(rows), np.arange(cols)).ravel()
+    index = np.zeros((rows * cols, rows + cols - 1))
+    index[np.arange(rows * cols), goal_sums] = 1.0
+    index.setflags(write=False)
+    return index
+
+
+def market_key_for_line(line):
+    """Returns the market key used for an Over/Under line, e.g. 2.5 -> 'ou_2_5'."""
+    return "ou_" + f"{line:g}".replace(".", "_")
+
+
 def calculate_over_under_probs(score_matrix, threshold=2.5):
     """
     Calculates Over/Under probabilities for a given goal threshold.
@@ -32,20 +59,11 @@ def calculate_over_under_probs(score_matrix, threshold=2.5):
     Returns:
         dict: Probabilities for {'over', 'under'}.
     """
-    over_prob = 0
-    under_prob = 0
-    max_goals_home = score_matrix.shape[0]
-    max_goals_away = score_matrix.shape[1]
-
-    for i in range(max_goals_home):
-        for j in range(max_goals_away):
-            if i + j > threshold:
-                over_prob += score_matrix[i, j]
-            else:
-                under_prob += score_matrix[i, j]
-
-    total_prob = over_prob + under_prob
+    goal_totals = score_matrix.ravel() @ _goal_sum_index(score_matrix.shape)
+    under_prob = goal_totals[:int(np.floor(threshold)) + 1].sum() if threshold >= 0 else 0.0
+    total_prob = goal_totals.sum()
     if total_prob == 0: return {'over': 0, 'under': 0}
+    over_prob = total_prob - under_prob
 
     return {
         "over": over_prob / total_prob,
@@ -78,15 +96,68 @@ def calculate_btts_probs(score_matrix):
         "btts_no": btts_no_prob,
     }
 
-def get_market_probabilities(score_matrix, home_lambda, away_lambda):
+def get_market_probabilities_batch(score_matrices, home_lambdas, away_lambdas, lines=OU_LINES):
+    """
+    Computes every target market for a whole slate of fixtures at once.
+
+    All Over/Under lines are read from a single goal-total distribution per
+    fixture, obtained by projecting the score matrices onto a precomputed
+    goal-sum index. Matrices with zero total probability yield zeros, like the
+    single-fixture functions.
+
+    Args:
+        score_matrices (np.array): A 3D array of shape (fixtures, home goals, away goals),
+            e.g. from `model.build_score_matrices`.
+        home_lambdas (array-like): Expected home goals, one per fixture.
+        away_lambdas (array-like): Expected away goals, one per fixture.
+        lines (iterable): Over/Under goal lines to compute. Defaults to OU_LINES.
+
+    Returns:
+        dict: Market key ('1x2', 'btts', 'ou_2_5', ...) to a dict of probability arrays of length N.
+    """
+    score_matrices = np.asarray(score_matrices, dtype=float)
+    n_fixtures, rows, cols = score_matrices.shape
+
+    goal_totals = score_matrices.reshape(n_fixtures, -1) @ _goal_sum_index((rows, cols))
+    cumulative = np.cumsum(goal_totals, axis=1)  # P(total goals <= k)
+    total_prob = cumulative[:, -1]
+    has_mass = total_prob != 0
+    safe_total = np.where(has_mass, total_prob, 1.0)
+
+    markets = {
+        "1x2": calculate_1x2_probs_skellam(np.asarray(home_lambdas, dtype=float), np.asarray(away_lambdas, dtype=float)),
+    }
+
+    for line in lines:
+        k = int(np.floor(line))
+        if k < 0:
+            under_prob = np.zeros(n_fixtures)
+        else:
+            under_prob = cumulative[:, min(k, cumulative.shape[1] - 1)]
+        markets[market_key_for_line(line)] = {
+            "over": np.where(has_mass, (total_prob - under_prob) / safe_total, 0.0),
+            "under": np.where(has_mass, under_prob / safe_total, 0.0),
+        }
+
+    btts_no_prob = (
+        score_matrices[:, 0, :].sum(axis=1) + score_matrices[:, :, 0].sum(axis=1) - score_matrices[:, 0, 0]
+    ) / safe_total
+    markets["btts"] = {
+        "btts_yes": np.where(has_mass, 1 - btts_no_prob, 0.0),
+        "btts_no": np.where(has_mass, btts_no_prob, 0.0),
+    }
+    return markets
+
+def get_market_probabilities(score_matrix, home_lambda, away_lambda, lines=(2.5,)):
     """
     A wrapper function to get probabilities for all target markets.
+    Runs the batched engine on a single fixture.
     """
     if score_matrix is None or score_matrix.size == 0:
         return None
 
+    markets = get_market_probabilities_batch(score_matrix[np.newaxis], [home_lambda], [away_lambda], lines)
     return {
-        "1x2": calculate_1x2_probs_skellam(home_lambda, away_lambda),
-        "ou_2_5": calculate_over_under_probs(score_matrix, threshold=2.5),
-        "btts": calculate_btts_probs(score_matrix)
+        market: {outcome: probs[0] for outcome, probs in outcomes.items()}
+        for market, outcomes in markets.items()
     }
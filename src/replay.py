@@ -0,0 +1,289 @@
+"""
+Record and replay of API responses, for load tests that cost no API quota.
+
+Recording: with API_RECORD_DIR set, `api_client` saves every response it
+returns to that directory (one JSON file per request, named like the response
+cache entries). Replay: a local HTTP server answers API requests from such an
+archive, with configurable latency, errors, 429s and rate-limit headers, so
+the collector can be pointed at it through API_BASE_URL.
+
+    python -m src.replay serve --archive fixtures/replay --port 8765 --latency 0.08 --error-rate 0.02
+    API_KEY=replay API_BASE_URL=http://127.0.0.1:8765/v3 python data_collector.py --concurrency 8
+
+`benchmarks/replay_archive.py` writes synthetic archives of any size.
+"""
+import argparse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+from . import api_client, response_cache
+
+# Prefix of the API paths, as in https://{API_HOST}/v3/{endpoint}.
+PATH_PREFIX = "/v3/"
+ERROR_STATUSES = (500, 502, 503)
+
+
+def record(archive_dir, endpoint, params, payload):
+    """
+    Saves one API response to an archive (atomically).
+
+    Args:
+        archive_dir (str): The archive directory.
+        endpoint (str): The API endpoint.
+        params (dict, optional): The query parameters.
+        payload (dict): The decoded JSON response.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{response_cache.make_key(endpoint, params)}.json")
+    entry = {
+        "endpoint": endpoint.strip("/"),
+        "params": {str(k): str(v) for k, v in (params or {}).items()},
+        "recorded_utc": datetime.now(timezone.utc).isoformat(),
+        "payload": payload,
+    }
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+
+def load_archive(archive_dir):
+    """
+    Reads every response of an archive.
+
+    Returns:
+        list: The archive entries (dicts with 'endpoint', 'params' and 'payload').
+    """
+    entries = []
+    for name in sorted(os.listdir(archive_dir)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(archive_dir, name), "r") as f:
+                entries.append(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: skipping archive entry '{name}': {e}")
+    return entries
+
+
+class ReplayArchive:
+    """
+    Responses of an archive, indexed by request.
+
+    Two fallbacks let a recorded day be replayed on any other day and serve the
+    multi-id lookups of the settlement step:
+    - a request with a `date` that was not recorded (e.g. `fixtures?date=` or a
+      page of `odds?date=`) gets the most recently recorded date's response to
+      the same request;
+    - a `fixtures?ids=` request that was not recorded is assembled from the
+      recorded `fixtures?id=` responses.
+    """
+
+    def __init__(self, entries):
+        self.responses = {}
+        self.fixtures_by_id = {}
+        self.latest_by_date = {}
+        for entry in entries:
+            endpoint, params, payload = entry["endpoint"], entry.get("params") or {}, entry["payload"]
+            body = json.dumps(payload).encode("utf-8")
+            self.responses[response_cache.make_key(endpoint, params)] = body
+            if "date" in params:
+                key = self._undated_key(endpoint, params)
+                if params["date"] >= self.latest_by_date.get(key, ("",))[0]:
+                    self.latest_by_date[key] = (params["date"], body)
+            if endpoint == "fixtures" and set(params) <= {"id", "ids"}:
+                for fixture_info in payload.get("response") or []:
+                    self.fixtures_by_id[str(fixture_info["fixture"]["id"])] = fixture_info
+
+    @staticmethod
+    def _undated_key(endpoint, params):
+        return response_cache.make_key(endpoint, {k: v for k, v in params.items() if k != "date"})
+
+    def __len__(self):
+        return len(self.responses)
+
+    def lookup(self, endpoint, params):
+        """
+        Returns the encoded JSON response for a request, or None if it was not recorded.
+        """
+        body = self.responses.get(response_cache.make_key(endpoint, params))
+        if body is not None:
+            return body
+        if "date" in params:
+            latest = self.latest_by_date.get(self._undated_key(endpoint, params))
+            if latest is not None:
+                return latest[1]
+        if endpoint == "fixtures" and set(params) == {"ids"}:
+            found = [self.fixtures_by_id[i] for i in params["ids"].split("-") if i in self.fixtures_by_id]
+            return json.dumps({"results": len(found), "response": found}).encode("utf-8")
+        return None
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    HTTP server answering API requests from a `ReplayArchive`.
+
+    Args:
+        address (tuple): (host, port) to listen on; port 0 picks a free port.
+        archive (ReplayArchive): The recorded responses.
+        latency (float): Seconds added to every response.
+        jitter (float): Maximum extra seconds, drawn uniformly per response.
+        error_rate (float): Share of requests answered with a 500, 502 or 503.
+        rate_429 (float): Share of requests answered with a 429 and a Retry-After header.
+        rate_limit_per_minute (int): Requests per minute before the server answers 429
+            (0 for no limit), reported in the X-RateLimit-* headers as RapidAPI does.
+        daily_quota (int): Value of x-ratelimit-requests-remaining at start (0 to omit the header).
+        seed (int): Seed of the injected latency and errors, for repeatable runs.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, archive, latency=0.0, jitter=0.0, error_rate=0.0, rate_429=0.0,
+                 rate_limit_per_minute=0, daily_quota=0, seed=0):
+        super().__init__(address, ReplayHandler)
+        self.archive = archive
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self.bucket = api_client.TokenBucket(rate_limit_per_minute) if rate_limit_per_minute else None
+        self.daily_quota = daily_quota
+        self.quota_remaining = daily_quota
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "served": 0, "not_recorded": 0, "errors": 0, "throttled": 0}
+
+    def draw(self):
+        """Returns (delay, injected status or None) for the next request."""
+        with self.lock:
+            self.stats["requests"] += 1
+            self.quota_remaining = max(0, self.quota_remaining - 1)
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            roll = self.random.random()
+            if roll < self.rate_429:
+                return delay, 429
+            if roll < self.rate_429 + self.error_rate:
+                return delay, self.random.choice(ERROR_STATUSES)
+            return delay, None
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{PATH_PREFIX.rstrip('/')}"
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        if url.path == "/__stats":
+            self._send(200, json.dumps(server.stats).encode("utf-8"))
+            return
+
+        delay, injected = server.draw()
+        if delay > 0:
+            time.sleep(delay)
+
+        if server.bucket is not None and not server.bucket.try_take():
+            server.count("throttled")
+            self._send(429, b'{"message": "Too many requests"}', retry_after=1)
+        elif injected == 429:
+            server.count("throttled")
+            self._send(429, b'{"message": "Too many requests"}', retry_after=1)
+        elif injected:
+            server.count("errors")
+            self._send(injected, b'{"message": "Injected error"}')
+        else:
+            endpoint = url.path[len(PATH_PREFIX):] if url.path.startswith(PATH_PREFIX) else url.path.strip("/")
+            body = server.archive.lookup(endpoint, dict(parse_qsl(url.query)))
+            if body is None:
+                # The API answers unknown queries with an empty result, not an error.
+                server.count("not_recorded")
+                body = json.dumps({"results": 0, "response": [], "errors": {"replay": "not recorded"}}).encode("utf-8")
+            else:
+                server.count("served")
+            self._send(200, body)
+
+    def _send(self, status, body, retry_after=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        if self.server.bucket is not None:
+            self.send_header("X-RateLimit-Limit", str(self.server.rate_limit_per_minute))
+            self.send_header("X-RateLimit-Remaining", str(max(0, int(self.server.bucket.tokens))))
+        if self.server.daily_quota:
+            self.send_header("x-ratelimit-requests-limit", str(self.server.daily_quota))
+            self.send_header("x-ratelimit-requests-remaining", str(self.server.quota_remaining))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown the collector's own output.
+
+
+def start_server(archive_dir, host="127.0.0.1", port=0, **options):
+    """
+    Starts a replay server in a background thread.
+
+    Args:
+        archive_dir (str): The archive directory.
+        **options: See `ReplayServer`.
+
+    Returns:
+        ReplayServer: The running server; its `base_url` is the value for API_BASE_URL.
+            Stop it with `shutdown()`.
+    """
+    server = ReplayServer((host, port), ReplayArchive(load_archive(archive_dir)), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded API responses over HTTP.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="Serve an archive.")
+    serve.add_argument("--archive", required=True, help="Directory of recorded responses (see API_RECORD_DIR).")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    serve.add_argument("--jitter", type=float, default=0.0, help="Maximum random extra seconds per response.")
+    serve.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 5xx.")
+    serve.add_argument("--rate-429", type=float, default=0.0, help="Share of requests answered with a 429.")
+    serve.add_argument("--rate-limit", type=int, default=0, help="Requests per minute before answering 429 (0: no limit).")
+    serve.add_argument("--daily-quota", type=int, default=0, help="Daily quota reported in the headers (0: not reported).")
+    serve.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    archive = ReplayArchive(load_archive(args.archive))
+    server = ReplayServer(
+        (args.host, args.port), archive, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, rate_429=args.rate_429, rate_limit_per_minute=args.rate_limit,
+        daily_quota=args.daily_quota, seed=args.seed,
+    )
+    print(f"Replaying {len(archive)} responses from '{args.archive}' on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Replay stats: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
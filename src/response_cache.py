@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from decouple import config
+
+# On-disk cache for API responses. Each entry is a JSON file named after the
+# SHA-256 of its endpoint and sorted query parameters, so identical requests made
+# by different runs (or different fixtures in the same run) resolve to the same file.
+
+CACHE_ENABLED = config("API_CACHE_ENABLED", default=True, cast=bool)
+CACHE_DIR = config("API_CACHE_DIR", default=".cache/api")
+CACHE_MAX_BYTES = config("API_CACHE_MAX_MB", default=200, cast=int) * 1024 * 1024
+
+# Time-to-live per endpoint, in seconds.
+ODDS_TTL = config("API_CACHE_ODDS_TTL", default=15 * 60, cast=int)
+FIXTURES_TTL = config("API_CACHE_FIXTURES_TTL", default=10 * 60, cast=int)
+
+FINISHED_STATUSES = {"FT", "AET", "PEN"}
+
+_lock = threading.Lock()
+_total_bytes = None
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def make_key(endpoint, params=None):
+    """
+    Builds the cache key for a request.
+
+    Args:
+        endpoint (str): The API endpoint (leading/trailing slashes are ignored).
+        params (dict, optional): The query parameters. Their order does not matter.
+
+    Returns:
+        str: A hex SHA-256 digest identifying the request.
+    """
+    canonical = {
+        "endpoint": endpoint.strip("/"),
+        "params": sorted((str(k), str(v)) for k, v in (params or {}).items()),
+    }
+    return hashlib.sha256(json.dumps(canonical).encode("utf-8")).hexdigest()
+
+
+def _seconds_until_midnight_utc():
+    now = datetime.now(timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+def ttl_for(endpoint, params, payload):
+    """
+    Decides how long a response may be served from the cache.
+
+    - `teams/statistics`, `standings`, `leagues`: until the end of the current UTC day.
+    - `odds`: a few minutes, as prices move.
+    - `fixtures` looked up by id: forever once every fixture in it is finished,
+      otherwise a few minutes.
+    - other `fixtures` queries: a few minutes.
+
+    Returns:
+        float or None: TTL in seconds, None for a permanent entry, or 0 to skip caching.
+    """
+    endpoint = endpoint.strip("/")
+    params = params or {}
+
+    if endpoint in ("teams/statistics", "standings", "leagues"):
+        return _seconds_until_midnight_utc()
+    if endpoint == "odds":
+        return ODDS_TTL
+    if endpoint == "fixtures":
+        fixtures = payload.get("response") or []
+        by_id = "id" in params or "ids" in params
+        if by_id and fixtures and all(
+            f.get("fixture", {}).get("status", {}).get("short") in FINISHED_STATUSES for f in fixtures
+        ):
+            return None
+        return FIXTURES_TTL
+    return 0
+
+
+def _path_for(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+
+def _iter_entries():
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(".json"):
+                yield os.path.join(root, name)
+
+
+def _remove(path):
+    global _total_bytes
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except OSError:
+        return
+    if _total_bytes is not None:
+        _total_bytes -= size
+
+
+def get(endpoint, params=None):
+    """
+    Returns the cached payload for a request, or None on a miss or expired entry.
+    """
+    if not CACHE_ENABLED:
+        return None
+    path = _path_for(make_key(endpoint, params))
+    try:
+        with open(path, "r") as f:
+            entry = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    expires_at = entry.get("expires_at")
+    with _lock:
+        if expires_at is not None and expires_at <= time.time():
+            _remove(path)
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+    # Reading an entry bumps its mtime, which is what LRU eviction sorts on.
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry["payload"]
+
+
+def contains(endpoint, params=None):
+    """
+    Checks whether a request has a fresh cached response, without counting a hit or miss.
+    Used to estimate how many real API calls a piece of work will cost.
+    """
+    if not CACHE_ENABLED:
+        return False
+    try:
+        with open(_path_for(make_key(endpoint, params)), "r") as f:
+            expires_at = json.load(f).get("expires_at")
+    except (OSError, json.JSONDecodeError):
+        return False
+    return expires_at is None or expires_at > time.time()
+
+
+def put(endpoint, params, payload):
+    """
+    Stores a successful API payload according to the endpoint's TTL policy.
+    Payloads carrying API-level errors are never cached.
+    """
+    global _total_bytes
+    if not CACHE_ENABLED or not isinstance(payload, dict) or payload.get("errors"):
+        return
+    ttl = ttl_for(endpoint, params, payload)
+    if ttl == 0:
+        return
+
+    now = time.time()
+    entry = {
+        "endpoint": endpoint.strip("/"),
+        "params": params or {},
+        "stored_at": now,
+        "expires_at": None if ttl is None else now + ttl,
+        "payload": payload,
+    }
+    path = _path_for(make_key(endpoint, params))
+    data = json.dumps(entry).encode("utf-8")
+
+    with _lock:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not write response cache entry: {e}")
+            return
+        _stats["stores"] += 1
+
+        if _total_bytes is None:
+            _total_bytes = sum(os.path.getsize(p) for p in _iter_entries())
+        else:
+            _total_bytes += len(data) - previous
+        if _total_bytes > CACHE_MAX_BYTES:
+            _evict()
+
+
+def _evict():
+    """Deletes least recently used entries until the cache is back under 90% of its budget."""
+    target = CACHE_MAX_BYTES * 0.9
+    entries = []
+    for path in _iter_entries():
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    for _, path in sorted(entries):
+        if _total_bytes <= target:
+            break
+        _remove(path)
+        _stats["evictions"] += 1
+
+
+def clear():
+    """Removes every cached entry."""
+    global _total_bytes
+    with _lock:
+        for path in list(_iter_entries()):
+            _remove(path)
+        _total_bytes = 0
+
+
+def get_cache_stats():
+    """
+    Returns:
+        dict: Hit, miss, store and eviction counts, plus the hit ratio.
+    """
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
@@ -1,6 +1,78 @@
 import pandas as pd
 import numpy as np
 
+# Bins used by the range breakdowns: (column, bins, labels, output column name).
+ODDS_RANGES = ('odds', [1, 1.5, 2.0, 2.5, 3.0, 4.0, np.inf],
+               ['1.0-1.5', '1.5-2.0', '2.0-2.5', '2.5-3.0', '3.0-4.0', '4.0+'], 'Tranche de Cotes')
+# Value is defined as (probability * odds) and must be > 1.
+VALUE_RANGES = ('value', [1.0, 1.1, 1.2, 1.4, 1.6, 2.0, np.inf],
+                ['1.0-1.1', '1.1-1.2', '1.2-1.4', '1.4-1.6', '1.6-2.0', '2.0+'], 'Tranche de Valeur')
+PROB_RANGES = ('probability', [0, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.01],  # Use 1.01 to include 1.0
+               ['<40%', '40-50%', '50-60%', '60-70%', '70-80%', '80-90%', '90-100%'], 'Tranche de Proba')
+
+# Name of the precomputed range column of each binned column, used by the stats
+# cube and the prepared dashboard frame. When present it is used instead of
+# binning again.
+RANGE_COLUMNS = {'odds': 'odds_range', 'value': 'value_range', 'probability': 'prob_range'}
+
+
+def _bet_results(df):
+    """
+    Precomputes, once per DataFrame, the per-bet quantities every breakdown sums:
+    win and loss flags and the profit of winning bets (1 unit stake).
+    """
+    is_win = (df['outcome'] == 'Win').to_numpy(dtype=float)
+    is_loss = (df['outcome'] == 'Loss').to_numpy(dtype=float)
+    win_profit = np.where(is_win > 0, df['odds'].to_numpy(dtype=float) - 1, 0.0)
+    return is_win, is_loss, win_profit
+
+
+def _group_codes(keys):
+    """Returns integer codes (-1 for missing keys) and the sorted categories of a key Series."""
+    categorical = keys if isinstance(keys.dtype, pd.CategoricalDtype) else keys.astype('category')
+    return categorical.cat.codes.to_numpy(), categorical.cat.categories
+
+
+def _aggregate(keys, bet_results, group_by_col, sort_by='ROI'):
+    """
+    Computes the metrics of every group with one `bincount` per quantity.
+
+    Args:
+        keys (pd.Series): The group of each bet.
+        bet_results (tuple): The output of `_bet_results` for the same bets.
+        group_by_col (str): Name of the key column in the output.
+        sort_by (str): The column to sort the results by.
+
+    Returns:
+        pd.DataFrame: One row per group with at least one bet.
+    """
+    is_win, is_loss, win_profit = bet_results
+    codes, categories = _group_codes(keys)
+    valid = codes >= 0
+    codes = codes[valid]
+    n_groups = len(categories)
+
+    bets = np.bincount(codes, minlength=n_groups).astype(float)
+    wins = np.bincount(codes, weights=is_win[valid], minlength=n_groups)
+    losses = np.bincount(codes, weights=is_loss[valid], minlength=n_groups)
+    profit = np.bincount(codes, weights=win_profit[valid], minlength=n_groups) - losses
+
+    present = bets > 0
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        key_values = pd.Categorical(categories[present], categories=categories, ordered=keys.cat.ordered)
+    else:
+        key_values = pd.array(categories[present], dtype=keys.dtype)
+
+    stats_df = pd.DataFrame({
+        group_by_col: key_values,
+        'Paris': bets[present],
+        'Taux de Victoire': wins[present] / bets[present],
+        'Profit (u)': profit[present],
+        'ROI': profit[present] / bets[present],
+    })
+    return stats_df.sort_values(by=sort_by, ascending=False).reset_index(drop=True)
+
+
 def _calculate_grouped_stats(df, group_by_col, sort_by='ROI'):
     """
     Generic function to calculate performance statistics (ROI, Win Rate, Profit)
@@ -16,34 +88,221 @@ def _calculate_grouped_stats(df, group_by_col, sort_by='ROI'):
     """
     if df.empty or group_by_col not in df.columns:
         return pd.DataFrame()
+    return _aggregate(df[group_by_col], _bet_results(df), group_by_col, sort_by)
+
+
+def _range_stats(df, ranges, bet_results=None):
+    column, bins, labels, name = ranges
+    if df.empty or column not in df.columns:
+        return pd.DataFrame()
+    range_column = RANGE_COLUMNS[column]
+    if range_column in df.columns:
+        keys = df[range_column]
+    else:
+        keys = pd.cut(df[column], bins=bins, labels=labels, right=False)
+    return _aggregate(keys, bet_results or _bet_results(df), name)
+
 
-    def calculate_metrics(group):
-        """Calculates performance metrics for a single group of bets."""
-        settled = len(group)
-        if settled == 0:
-            return pd.Series({
-                'Paris': 0, 'Taux de Victoire': 0, 'Profit (u)': 0, 'ROI': 0
-            })
+def _league_stats(df, min_bets, bet_results=None):
+    if df.empty or 'league' not in df.columns:
+        return pd.DataFrame()
+    stats = _aggregate(df['league'], bet_results or _bet_results(df), 'league')
+    stats = stats[stats['Paris'] >= min_bets]
+    return stats.rename(columns={'league': 'Ligue'})
 
-        wins = group[group['outcome'] == 'Win']
-        losses = group[group['outcome'] == 'Loss']
 
-        win_rate = len(wins) / settled
-        # Profit is calculated assuming a 1 unit stake on each bet
-        profit = (wins['odds'] - 1).sum() - len(losses)
-        roi = profit / settled
+def _market_stats(df, bet_results=None):
+    if df.empty or 'market' not in df.columns:
+        return pd.DataFrame()
+    return _aggregate(df['market'], bet_results or _bet_results(df), 'market').rename(columns={'market': 'Type de Pari'})
 
-        return pd.Series({
-            'Paris': settled,
-            'Taux de Victoire': win_rate,
-            'Profit (u)': profit,
-            'ROI': roi
-        })
 
-    stats_df = df.groupby(group_by_col, observed=True).apply(calculate_metrics)
-    stats_df = stats_df.sort_values(by=sort_by, ascending=False).reset_index()
+def compute_breakdown(df, name, min_bets=10):
+    """
+    Computes a single performance breakdown of settled bets.
 
-    return stats_df
+    Args:
+        df (pd.DataFrame): Settled bets DataFrame.
+        name (str): 'league', 'market', 'odds', 'value' or 'prob'.
+        min_bets (int): Minimum number of bets for a league to be included.
+
+    Returns:
+        pd.DataFrame: The same table as `compute_all_stats(df)[name]`.
+    """
+    if df.empty:
+        return pd.DataFrame()
+    if name == 'league':
+        return _league_stats(df, min_bets)
+    if name == 'market':
+        return _market_stats(df)
+    return _range_stats(df, {'odds': ODDS_RANGES, 'value': VALUE_RANGES, 'prob': PROB_RANGES}[name])
+
+
+def compute_all_stats(df, min_bets=10):
+    """
+    Computes the five performance breakdowns in one pass over the settled bets.
+
+    Per-bet results are computed once and shared by every breakdown; each
+    breakdown is then a handful of `bincount` calls on precomputed group codes.
+
+    Args:
+        df (pd.DataFrame): Settled bets DataFrame.
+        min_bets (int): Minimum number of bets for a league to be included.
+
+    Returns:
+        dict: Tables keyed by 'league', 'market', 'odds', 'value' and 'prob',
+        identical to the corresponding `get_stats_by_*` functions.
+    """
+    if df.empty:
+        empty = pd.DataFrame()
+        return {'league': empty, 'market': empty, 'odds': empty, 'value': empty, 'prob': empty}
+
+    bet_results = _bet_results(df)
+    return {
+        'league': _league_stats(df, min_bets, bet_results),
+        'market': _market_stats(df, bet_results),
+        'odds': _range_stats(df, ODDS_RANGES, bet_results),
+        'value': _range_stats(df, VALUE_RANGES, bet_results),
+        'prob': _range_stats(df, PROB_RANGES, bet_results),
+    }
+
+# Breakdowns answered from the stats cube (`src.stats_cube`):
+# key -> (cube dimension, output column name, ordered range labels or None).
+CUBE_BREAKDOWNS = {
+    'league': ('league', 'Ligue', None),
+    'market': ('market', 'Type de Pari', None),
+    'odds': ('odds_range', ODDS_RANGES[3], ODDS_RANGES[2]),
+    'value': ('value_range', VALUE_RANGES[3], VALUE_RANGES[2]),
+    'prob': ('prob_range', PROB_RANGES[3], PROB_RANGES[2]),
+}
+
+
+def filter_cube(cube, leagues=None, markets=None, start_day=None, end_day=None):
+    """
+    Keeps the cube cells matching the filters (None means no filter).
+
+    Args:
+        cube (pd.DataFrame): Stats cube cells.
+        leagues (iterable, optional): Leagues to keep.
+        markets (iterable, optional): Markets to keep.
+        start_day (str, optional): First match day to keep, 'YYYY-MM-DD'.
+        end_day (str, optional): Last match day to keep, 'YYYY-MM-DD'.
+
+    Returns:
+        pd.DataFrame: The matching cells.
+    """
+    mask = np.ones(len(cube), dtype=bool)
+    if leagues is not None:
+        mask &= cube['league'].isin(list(leagues)).to_numpy()
+    if markets is not None:
+        mask &= cube['market'].isin(list(markets)).to_numpy()
+    # ISO days compare correctly as strings.
+    if start_day is not None:
+        mask &= (cube['day'] >= start_day).fillna(False).to_numpy(dtype=bool)
+    if end_day is not None:
+        mask &= (cube['day'] <= end_day).fillna(False).to_numpy(dtype=bool)
+    return cube[mask]
+
+
+def cube_totals(cube):
+    """
+    Overall performance of the bets in the cube cells.
+
+    Returns:
+        dict: bets, wins, losses, pushes, profit, win_rate and roi.
+    """
+    bets = int(cube['bets'].sum())
+    wins = int(cube['wins'].sum())
+    losses = int(cube['losses'].sum())
+    profit = float(cube['win_profit'].sum()) - losses
+    return {
+        'bets': bets,
+        'wins': wins,
+        'losses': losses,
+        'pushes': int(cube['pushes'].sum()),
+        'profit': profit,
+        'win_rate': wins / bets if bets else 0,
+        'roi': profit / bets if bets else 0,
+    }
+
+
+def bet_totals(df):
+    """
+    Overall performance of settled bets, in the same format as `cube_totals`.
+    """
+    if df.empty:
+        return {'bets': 0, 'wins': 0, 'losses': 0, 'pushes': 0, 'profit': 0.0, 'win_rate': 0, 'roi': 0}
+    is_win, is_loss, win_profit = _bet_results(df)
+    bets = len(df)
+    profit = float(win_profit.sum() - is_loss.sum())
+    return {
+        'bets': bets,
+        'wins': int(is_win.sum()),
+        'losses': int(is_loss.sum()),
+        'pushes': int((df['outcome'] == 'Push').sum()),
+        'profit': profit,
+        'win_rate': is_win.sum() / bets,
+        'roi': profit / bets,
+    }
+
+
+def _cube_breakdown(cube, dimension, name, labels=None):
+    keys = cube[dimension]
+    if labels is not None:
+        keys = pd.Series(pd.Categorical(keys, categories=labels, ordered=True), index=cube.index)
+    sums = cube.groupby(keys, observed=True, sort=True)[['bets', 'wins', 'losses', 'win_profit']].sum()
+    sums = sums[sums['bets'] > 0]
+    bets = sums['bets'].to_numpy(dtype=float)
+    profit = sums['win_profit'].to_numpy(dtype=float) - sums['losses'].to_numpy(dtype=float)
+
+    stats_df = pd.DataFrame({
+        name: sums.index.values if labels is None else pd.Categorical(sums.index, categories=labels, ordered=True),
+        'Paris': bets,
+        'Taux de Victoire': sums['wins'].to_numpy(dtype=float) / bets,
+        'Profit (u)': profit,
+        'ROI': profit / bets,
+    })
+    return stats_df.sort_values(by='ROI', ascending=False).reset_index(drop=True)
+
+
+def compute_breakdown_from_cube(cube, name, min_bets=10, **filters):
+    """
+    Computes a single performance breakdown from the stats cube.
+
+    Returns:
+        pd.DataFrame: The same table as `compute_all_stats_from_cube(cube, ...)[name]`.
+    """
+    cube = filter_cube(cube, **filters)
+    if cube.empty:
+        return pd.DataFrame()
+    dimension, column_name, labels = CUBE_BREAKDOWNS[name]
+    stats = _cube_breakdown(cube, dimension, column_name, labels)
+    if name == 'league':
+        stats = stats[stats['Paris'] >= min_bets]
+    return stats
+
+
+def compute_all_stats_from_cube(cube, min_bets=10, **filters):
+    """
+    Computes the five performance breakdowns from the stats cube instead of the raw bets.
+
+    Each breakdown sums a few thousand pre-aggregated cells, so the cost no
+    longer grows with the size of the history.
+
+    Args:
+        cube (pd.DataFrame): Stats cube cells (see `src.stats_cube`).
+        min_bets (int): Minimum number of bets for a league to be included.
+        **filters: Passed to `filter_cube` (leagues, markets, start_day, end_day).
+
+    Returns:
+        dict: The same tables as `compute_all_stats`.
+    """
+    cube = filter_cube(cube, **filters)
+    if cube.empty:
+        empty = pd.DataFrame()
+        return {key: empty for key in CUBE_BREAKDOWNS}
+
+    return {key: compute_breakdown_from_cube(cube, key, min_bets) for key in CUBE_BREAKDOWNS}
 
 def get_stats_by_league(df, min_bets=10):
     """
@@ -56,37 +315,23 @@ def get_stats_by_league(df, min_bets=10):
     Returns:
         pd.DataFrame: Statistics per league.
     """
-    stats = _calculate_grouped_stats(df, 'league')
-    stats = stats[stats['Paris'] >= min_bets]
-    return stats.rename(columns={'league': 'Ligue'})
+    return _league_stats(df, min_bets)
 
 def get_stats_by_market(df):
     """Calculates statistics per bet type (market)."""
-    return _calculate_grouped_stats(df, 'market').rename(columns={'market': 'Type de Pari'})
+    return _market_stats(df)
 
 def get_stats_by_odds_range(df):
     """Calculates statistics per odds range."""
-    bins = [1, 1.5, 2.0, 2.5, 3.0, 4.0, np.inf]
-    labels = ['1.0-1.5', '1.5-2.0', '2.0-2.5', '2.5-3.0', '3.0-4.0', '4.0+']
-    df_copy = df.copy()
-    df_copy['odds_range'] = pd.cut(df_copy['odds'], bins=bins, labels=labels, right=False)
-    return _calculate_grouped_stats(df_copy, 'odds_range').rename(columns={'odds_range': 'Tranche de Cotes'})
+    return _range_stats(df, ODDS_RANGES)
 
 def get_stats_by_value_range(df):
     """
     Calculates statistics per value range.
     Value is defined as (probability * odds) and must be > 1.
     """
-    bins = [1.0, 1.1, 1.2, 1.4, 1.6, 2.0, np.inf]
-    labels = ['1.0-1.1', '1.1-1.2', '1.2-1.4', '1.4-1.6', '1.6-2.0', '2.0+']
-    df_copy = df.copy()
-    df_copy['value_range'] = pd.cut(df_copy['value'], bins=bins, labels=labels, right=False)
-    return _calculate_grouped_stats(df_copy, 'value_range').rename(columns={'value_range': 'Tranche de Valeur'})
+    return _range_stats(df, VALUE_RANGES)
 
 def get_stats_by_prob_range(df):
     """Calculates statistics per probability range."""
-    bins = [0, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.01] # Use 1.01 to include 1.0
-    labels = ['<40%', '40-50%', '50-60%', '60-70%', '70-80%', '80-90%', '90-100%']
-    df_copy = df.copy()
-    df_copy['prob_range'] = pd.cut(df_copy['probability'], bins=bins, labels=labels, right=False)
-    return _calculate_grouped_stats(df_copy, 'prob_range').rename(columns={'prob_range': 'Tranche de Proba'})
+    return _range_stats(df, PROB_RANGES)
@@ -0,0 +1,157 @@
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from . import history_store, statistics
+
+# Performance aggregates of settled bets, kept up to date by the collector at
+# settlement time. Each cell of the cube holds the counts and profit of the bets
+# sharing the same league, market, odds/value/probability range and match day,
+# so any breakdown or filter over those dimensions is a sum over a few thousand
+# cells instead of a pass over the raw history. The file also records (in its
+# Parquet metadata) the name of the last outcome patch it counts (see
+# `history_store.record_outcomes`), so applying the same patch twice leaves it
+# unchanged.
+
+CUBE_FILE = os.path.join(history_store.HISTORY_DIR, "stats_cube.parquet")
+
+DIMENSIONS = ["league", "market", "odds_range", "value_range", "prob_range", "day"]
+MEASURES = ["bets", "wins", "losses", "pushes", "win_profit"]
+
+OUTCOMES = ["Win", "Loss", "Push"]
+# Parquet metadata key holding the name of the last outcome patch counted in the cube.
+APPLIED_PATCH_METADATA = b"stats_cube.applied_patch"
+
+RANGE_DIMENSIONS = {
+    statistics.RANGE_COLUMNS[ranges[0]]: ranges
+    for ranges in (statistics.ODDS_RANGES, statistics.VALUE_RANGES, statistics.PROB_RANGES)
+}
+
+
+def _bet_days(df):
+    """Match day of each bet (from `match_date`, falling back to `timestamp`), as 'YYYY-MM-DD'."""
+    days = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns, UTC]")
+    for column in ("timestamp", "match_date"):
+        if column in df.columns:
+            parsed = pd.to_datetime(df[column], errors="coerce", utc=True, format="ISO8601")
+            days = parsed.fillna(days)
+    return days.dt.strftime("%Y-%m-%d")
+
+
+def cube_from_bets(df):
+    """
+    Aggregates settled bets into cube cells.
+
+    Args:
+        df (pd.DataFrame): Bets with an `outcome` and a date; others are ignored.
+
+    Returns:
+        pd.DataFrame: One row per non-empty cell, with DIMENSIONS and MEASURES columns.
+    """
+    if df.empty or "outcome" not in df.columns:
+        return pd.DataFrame(columns=DIMENSIONS + MEASURES)
+    df = df[df["outcome"].isin(OUTCOMES)]
+    # Bets without a usable date are not shown by the dashboards, so they are not counted either.
+    days = _bet_days(df)
+    df, days = df[days.notna()], days[days.notna()]
+    if df.empty:
+        return pd.DataFrame(columns=DIMENSIONS + MEASURES)
+
+    is_win, is_loss, win_profit = statistics._bet_results(df)
+    cells = pd.DataFrame({
+        "league": df["league"].astype(object).to_numpy(),
+        "market": df["market"].astype(object).to_numpy(),
+        "day": days.astype(object).to_numpy(),
+        "bets": 1,
+        "wins": is_win.astype(int),
+        "losses": is_loss.astype(int),
+        "pushes": (df["outcome"] == "Push").to_numpy(dtype=int),
+        "win_profit": win_profit,
+    })
+    for dimension, (column, bins, labels, _) in RANGE_DIMENSIONS.items():
+        cells[dimension] = pd.cut(df[column], bins=bins, labels=labels, right=False).astype(object).to_numpy()
+
+    return _sum_cells(cells)
+
+
+def _sum_cells(cells):
+    # Missing keys (e.g. odds outside every range) get their own cell, like any other value.
+    return (
+        cells.groupby(DIMENSIONS, dropna=False, sort=False)[MEASURES]
+        .sum()
+        .reset_index()
+    )
+
+
+def load_cube(path=CUBE_FILE):
+    """
+    Loads the persisted cube, building it from the history store if it does not exist yet.
+    """
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    return cube_from_bets(history_store.load_frame())
+
+
+def load_applied_patch(path=CUBE_FILE):
+    """
+    Returns the name of the last outcome patch counted in the persisted cube
+    (empty for a cube saved before it was recorded).
+    """
+    metadata = pq.read_schema(path).metadata or {}
+    return metadata.get(APPLIED_PATCH_METADATA, b"").decode()
+
+
+def save_cube(cube, applied_patch, path=CUBE_FILE):
+    """Writes the cube and the name of the last patch it counts atomically to `path`."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), APPLIED_PATCH_METADATA: applied_patch.encode()}
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def add_settled_bets(settled_bets, patch, path=CUBE_FILE):
+    """
+    Adds the bets settled by one outcome patch to the persisted cube. A patch
+    the cube already counts (its name sorts at or before the recorded one) is
+    skipped, so the call is idempotent.
+
+    If the cube does not exist yet it is built from the history store, where
+    the outcomes of these bets are expected to be recorded already.
+
+    Args:
+        settled_bets (list): The bet records of the patch, with their `outcome`.
+        patch (str): The patch file name returned by `history_store.record_outcomes`.
+    """
+    if not os.path.exists(path):
+        return rebuild(path)
+
+    cube = pd.read_parquet(path)
+    if patch <= load_applied_patch(path):
+        return cube
+
+    frames = [frame for frame in (cube, cube_from_bets(pd.DataFrame(settled_bets))) if not frame.empty]
+    if frames:
+        cube = _sum_cells(pd.concat(frames, ignore_index=True))
+    save_cube(cube, patch, path)
+    return cube
+
+
+def rebuild(path=CUBE_FILE):
+    """Rebuilds the persisted cube from the whole history store."""
+    # Names are time-ordered, so every patch written so far sorts before this one.
+    applied_patch = history_store.new_file_name()
+    cube = cube_from_bets(history_store.load_frame())
+    save_cube(cube, applied_patch, path)
+    return cube
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m src.stats_cube rebuild")
+        sys.exit(1)
+    print(f"Stats cube rebuilt with {len(rebuild())} cells.")
@@ -0,0 +1,152 @@
+from collections import OrderedDict
+import threading
+
+from decouple import config
+
+from . import statistics
+
+# Memoization of the filter -> statistics computation shared by both dashboards.
+# Results are keyed by (data version, selected leagues, team search), so toggling
+# back to a filter combination that was already viewed costs a dictionary lookup.
+# Entries of older data versions are dropped as soon as a new version is seen.
+
+MEMO_SIZE = config("STATS_MEMO_SIZE", default=128, cast=int)
+
+
+class StatsMemo:
+    """
+    Thread-safe LRU cache of computed results.
+
+    Args:
+        maxsize (int): Maximum number of results kept.
+    """
+
+    def __init__(self, maxsize=MEMO_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, version, key, compute):
+        """
+        Returns the result stored for (version, key), computing and storing it if missing.
+
+        Args:
+            version (str): Version of the data the result is computed from.
+            key (tuple): Hashable description of the query.
+            compute (callable): Computes the result; called without the lock held.
+        """
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        result = compute()
+
+        with self._lock:
+            # Results computed from data that was replaced meanwhile are not kept.
+            if version == self._version:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        """Returns the hit/miss counters and the number of results currently kept."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+
+_memo = StatsMemo()
+
+
+def _normalize_filters(leagues, search_query):
+    return tuple(sorted(leagues or [])), (search_query or "").strip().lower()
+
+
+def _settled_bets(version, bets, leagues, search_query):
+    """Settled bets matching the leagues and a (non-empty) team search, memoized."""
+    def compute():
+        settled = bets[bets['league'].isin(leagues) & bets['outcome'].notna()]
+        return settled[settled['match'].str.contains(search_query, case=False, na=False, regex=False)]
+
+    return _memo.get_or_compute(version, ('settled', leagues, search_query), compute)
+
+
+def performance_totals(version, bets, stats_cells, leagues, search_query=None):
+    """
+    Overall metrics of the settled bets matching the filters, memoized.
+
+    Without a team search every filter maps to cube dimensions, so the stats cube
+    answers; with one, the matching settled bets are aggregated.
+
+    Args:
+        version (str): Version of `bets` and `stats_cells` (see `history_store.store_version`).
+        bets (pd.DataFrame): The history, with the column names `src.statistics` uses.
+        stats_cells (pd.DataFrame): The stats cube.
+        leagues (iterable): Selected leagues.
+        search_query (str, optional): Team search, matched case-insensitively against `match`.
+
+    Returns:
+        dict: See `statistics.cube_totals`.
+    """
+    leagues, search_query = _normalize_filters(leagues, search_query)
+
+    def compute():
+        if not search_query:
+            return statistics.cube_totals(statistics.filter_cube(stats_cells, leagues=leagues))
+        return statistics.bet_totals(_settled_bets(version, bets, leagues, search_query))
+
+    return _memo.get_or_compute(version, ('totals', leagues, search_query), compute)
+
+
+def performance_breakdown(version, bets, stats_cells, leagues, search_query, name, min_bets=10):
+    """
+    One detailed breakdown ('league', 'market', 'odds', 'value' or 'prob') of the
+    settled bets matching the filters, memoized. Arguments as in `performance_totals`.
+
+    Returns:
+        pd.DataFrame: See `statistics.compute_breakdown`. Shared between callers: do not modify.
+    """
+    leagues, search_query = _normalize_filters(leagues, search_query)
+
+    def compute():
+        if not search_query:
+            return statistics.compute_breakdown_from_cube(stats_cells, name, min_bets=min_bets, leagues=leagues)
+        return statistics.compute_breakdown(_settled_bets(version, bets, leagues, search_query), name, min_bets=min_bets)
+
+    return _memo.get_or_compute(version, ('breakdown', name, leagues, search_query, min_bets), compute)
+
+
+def performance_summary(version, bets, stats_cells, leagues, search_query=None, min_bets=10):
+    """
+    Overall metrics and all detailed breakdowns of the settled bets matching the filters.
+
+    Returns:
+        dict: 'totals' (see `performance_totals`) and 'stats' (the five breakdowns,
+        keyed as in `statistics.compute_all_stats`).
+    """
+    return {
+        'totals': performance_totals(version, bets, stats_cells, leagues, search_query),
+        'stats': {
+            name: performance_breakdown(version, bets, stats_cells, leagues, search_query, name, min_bets)
+            for name in statistics.CUBE_BREAKDOWNS
+        },
+    }
+
+
+def get_memo_stats():
+    return _memo.stats()
@@ -0,0 +1,291 @@
+from datetime import date, datetime, timezone
+import os
+
+import numpy as np
+from decouple import config
+
+from . import api_client
+
+# Team-strength tables: for every (league, season), the home and away record of
+# each team, stored as a small .npz artifact. They are built from a single
+# standings request and then kept up to date with the results of the fixtures
+# we settle, so the model can compute expected goals for a whole day of
+# fixtures without any `teams/statistics` call.
+
+TEAM_STRENGTH_DIR = config("TEAM_STRENGTH_DIR", default=".cache/team_strength")
+# Settled results only cover fixtures we bet on, so tables are rebuilt from the
+# standings after this many days to pick up every other result.
+MAX_TABLE_AGE_DAYS = config("TEAM_STRENGTH_MAX_AGE_DAYS", default=7, cast=int)
+
+# Columns of TeamStrengthTable.records
+HOME_PLAYED, HOME_FOR, HOME_AGAINST, AWAY_PLAYED, AWAY_FOR, AWAY_AGAINST = range(6)
+
+_tables = {}
+
+
+def get_standings(league_id, season):
+    """
+    Fetches the league table for a season.
+    Each team entry holds its home and away record, including goals for/against.
+    """
+    endpoint = "standings"
+    params = {"league": league_id, "season": season}
+    # Example of expected data structure from API:
+    # { 'response': [ { 'league': { 'standings': [ [ { 'team': {...}, 'home': { 'played': 5, 'goals': { 'for': 9, 'against': 4 } }, 'away': {...} } ] ] } } ] }
+    return api_client.make_api_request(endpoint, params)
+
+
+class TeamStrengthTable:
+    """
+    Home/away records of every team of a league season.
+
+    Attributes:
+        team_ids (np.array): Sorted team IDs.
+        records (np.array): One row per team: home played/for/against, away played/for/against.
+        applied_fixture_ids (set): Settled fixtures already added on top of the standings.
+        built_on (str): ISO date of the standings the table was built from.
+        built_at (str): ISO UTC time the standings were fetched. Fixtures that kicked
+            off before it are already counted in them and are not applied again.
+    """
+
+    def __init__(self, team_ids, records, applied_fixture_ids=(), built_on=None, built_at=None):
+        order = np.argsort(team_ids)
+        self.team_ids = np.asarray(team_ids, dtype=np.int64)[order]
+        self.records = np.asarray(records, dtype=np.int32).reshape(-1, 6)[order]
+        self.applied_fixture_ids = set(int(f) for f in applied_fixture_ids)
+        self.built_at = built_at or datetime.now(timezone.utc).isoformat()
+        self.built_on = built_on or self.built_at[:10]
+
+    @classmethod
+    def from_standings(cls, standings_response):
+        """
+        Builds a table from a `standings` API response.
+
+        Returns:
+            TeamStrengthTable: The table, or None if the response has no usable data.
+        """
+        rows = {}
+        try:
+            for group in standings_response['response'][0]['league']['standings']:
+                for entry in group:
+                    rows[entry['team']['id']] = [
+                        entry['home']['played'] or 0,
+                        entry['home']['goals']['for'] or 0,
+                        entry['home']['goals']['against'] or 0,
+                        entry['away']['played'] or 0,
+                        entry['away']['goals']['for'] or 0,
+                        entry['away']['goals']['against'] or 0,
+                    ]
+        except (KeyError, IndexError, TypeError):
+            return None
+        if not rows:
+            return None
+        return cls(list(rows.keys()), list(rows.values()))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            built_on = str(data['built_on'])
+            # Tables saved before `built_at` existed count from the start of their build day.
+            built_at = str(data['built_at']) if 'built_at' in data.files else f"{built_on}T00:00:00+00:00"
+            return cls(
+                data['team_ids'], data['records'],
+                applied_fixture_ids=data['applied_fixture_ids'],
+                built_on=built_on,
+                built_at=built_at,
+            )
+
+    def save(self, path):
+        """Writes the table atomically to `path` (.npz)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            team_ids=self.team_ids,
+            records=self.records,
+            applied_fixture_ids=np.array(sorted(self.applied_fixture_ids), dtype=np.int64),
+            built_on=np.array(self.built_on),
+            built_at=np.array(self.built_at),
+        )
+        os.replace(tmp_path, path)
+
+    def is_stale(self, today=None):
+        today = today or date.today()
+        return (today - date.fromisoformat(self.built_on)).days >= MAX_TABLE_AGE_DAYS
+
+    def lookup(self, team_ids):
+        """
+        Finds the rows of the given teams.
+
+        Returns:
+            tuple: (row indices, boolean mask of the teams present in the table).
+        """
+        team_ids = np.asarray(team_ids, dtype=np.int64)
+        if self.team_ids.size == 0:
+            return np.zeros(team_ids.shape, dtype=int), np.zeros(team_ids.shape, dtype=bool)
+        rows = np.clip(np.searchsorted(self.team_ids, team_ids), 0, self.team_ids.size - 1)
+        return rows, self.team_ids[rows] == team_ids
+
+    def predates_build(self, fixture_info):
+        """
+        Tells whether a fixture kicked off before the standings were fetched, and
+        is therefore already counted in them. Fixtures without a usable date are not.
+        """
+        try:
+            kickoff = datetime.fromisoformat(fixture_info['fixture']['date'])
+            built_at = datetime.fromisoformat(self.built_at)
+        except (KeyError, TypeError, ValueError):
+            return False
+        if kickoff.tzinfo is None:
+            kickoff = kickoff.replace(tzinfo=timezone.utc)
+        return kickoff < built_at
+
+    def apply_result(self, fixture_info):
+        """
+        Adds a finished fixture to the home team's home record and the away team's away record.
+        Fixtures already applied, or already in the standings (see `predates_build`), are skipped.
+
+        Returns:
+            bool: True if the table changed.
+        """
+        fixture_id = fixture_info['fixture']['id']
+        home_goals = fixture_info['goals']['home']
+        away_goals = fixture_info['goals']['away']
+        if fixture_id in self.applied_fixture_ids or home_goals is None or away_goals is None:
+            return False
+        if self.predates_build(fixture_info):
+            return False
+        rows, found = self.lookup([fixture_info['teams']['home']['id'], fixture_info['teams']['away']['id']])
+        if not found.all():
+            return False
+
+        home_row, away_row = rows
+        self.records[home_row, [HOME_PLAYED, HOME_FOR, HOME_AGAINST]] += [1, home_goals, away_goals]
+        self.records[away_row, [AWAY_PLAYED, AWAY_FOR, AWAY_AGAINST]] += [1, away_goals, home_goals]
+        self.applied_fixture_ids.add(fixture_id)
+        return True
+
+    def league_averages(self):
+        """Returns the per-match league averages, in the same format as `model.get_league_stats`."""
+        totals = self.records.sum(axis=0).astype(float)
+        home_played = totals[HOME_PLAYED] or 1
+        away_played = totals[AWAY_PLAYED] or 1
+        return {
+            "avg_goals_scored_home": totals[HOME_FOR] / home_played,
+            "avg_goals_conceded_home": totals[HOME_AGAINST] / home_played,
+            "avg_goals_scored_away": totals[AWAY_FOR] / away_played,
+            "avg_goals_conceded_away": totals[AWAY_AGAINST] / away_played,
+        }
+
+    def expected_goals(self, home_team_ids, away_team_ids):
+        """
+        Computes the Poisson lambdas of many fixtures of this league at once.
+
+        Uses the same attack/defense strength model as
+        `model.calculate_poisson_from_stats`: the home team's home record
+        against the away team's away record, relative to the league averages.
+
+        Returns:
+            tuple: (home_lambdas, away_lambdas, found), where `found` flags the
+            fixtures whose two teams are in the table. Lambdas of the others are NaN.
+        """
+        home_rows, home_found = self.lookup(home_team_ids)
+        away_rows, away_found = self.lookup(away_team_ids)
+        found = home_found & away_found
+
+        averages = self.league_averages()
+        if 0 in averages.values():
+            found = np.zeros_like(found)
+
+        home = self.records[home_rows].astype(float)
+        away = self.records[away_rows].astype(float)
+        num_matches_home = np.where(home[:, HOME_PLAYED] == 0, 1, home[:, HOME_PLAYED])  # Avoid division by zero
+        num_matches_away = np.where(away[:, AWAY_PLAYED] == 0, 1, away[:, AWAY_PLAYED])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            home_attack_strength = home[:, HOME_FOR] / num_matches_home / averages['avg_goals_scored_home']
+            home_defense_strength = home[:, HOME_AGAINST] / num_matches_home / averages['avg_goals_conceded_home']
+            away_attack_strength = away[:, AWAY_FOR] / num_matches_away / averages['avg_goals_scored_away']
+            away_defense_strength = away[:, AWAY_AGAINST] / num_matches_away / averages['avg_goals_conceded_away']
+
+            home_lambdas = home_attack_strength * away_defense_strength * averages['avg_goals_scored_home']
+            away_lambdas = away_attack_strength * home_defense_strength * averages['avg_goals_scored_away']
+
+        return np.where(found, home_lambdas, np.nan), np.where(found, away_lambdas, np.nan), found
+
+
+def _table_path(league_id, season):
+    return os.path.join(TEAM_STRENGTH_DIR, f"{league_id}_{season}.npz")
+
+
+def _load_table(league_id, season):
+    try:
+        return TeamStrengthTable.load(_table_path(league_id, season))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def get_table(league_id, season):
+    """
+    Returns the team-strength table of a league season, building it from the
+    standings when it is missing or stale.
+
+    Returns:
+        TeamStrengthTable: The table, or None if the league has no usable standings.
+        A failed standings request is not memoized, so the next call retries it.
+    """
+    key = (league_id, season)
+    if key in _tables:
+        return _tables[key]
+
+    table = _load_table(league_id, season)
+    if table is None or table.is_stale():
+        standings_response = get_standings(league_id, season)
+        if standings_response is None or standings_response.get('errors'):
+            return table
+        fresh = TeamStrengthTable.from_standings(standings_response)
+        if fresh is not None:
+            table = fresh
+            try:
+                table.save(_table_path(league_id, season))
+            except OSError as e:
+                print(f"Warning: could not save team strengths for league {league_id}: {e}")
+
+    _tables[key] = table
+    return table
+
+
+def apply_settled_fixtures(fixture_infos):
+    """
+    Adds finished fixtures to the tables that already exist, and saves the ones that changed.
+    Tables that were never built are left alone: they will include these results
+    when they are built from the standings.
+
+    Args:
+        fixture_infos (iterable): Finished fixtures, as returned by the `fixtures` endpoint.
+
+    Returns:
+        int: The number of fixtures applied.
+    """
+    changed = {}
+    applied = 0
+    for fixture_info in fixture_infos:
+        try:
+            key = (fixture_info['league']['id'], fixture_info['league']['season'])
+        except (KeyError, TypeError):
+            continue
+        table = _tables.get(key)
+        if table is None:
+            table = _load_table(*key)
+            if table is not None:
+                _tables[key] = table
+        if table is not None and table.apply_result(fixture_info):
+            changed[key] = table
+            applied += 1
+
+    for (league_id, season), table in changed.items():
+        try:
+            table.save(_table_path(league_id, season))
+        except OSError as e:
+            print(f"Warning: could not save team strengths for league {league_id}: {e}")
+    return applied
@@ -1,103 +1,285 @@
-from . import api_client
+import asyncio
+from collections import Counter
+from functools import lru_cache
+import math
+
+from decouple import config
+
+from . import api_client, probabilities
 
 # Note: The parsing logic here is highly dependent on the actual structure
 # of the API's /odds response, which is currently unknown. The code is
 # written based on a plausible structure and will likely need adjustments.
 
-def get_odds_for_fixture(fixture_id):
+def _single_entry(response):
+    # None only when the request failed; a fixture without odds gets an empty entry.
+    if response is None or response.get('errors'):
+        return None
+    index = index_odds(response)
+    return next(iter(index.values())) if index else {'bookmakers': {}, 'markets': {}, 'parsed': {}}
+
+
+def get_fixture_odds_index(fixture_id):
     """
-    Fetches and parses betting odds for a specific fixture.
+    Fetches the odds of a fixture from every bookmaker.
+
+    Returns:
+        dict: The `index_odds` entry of the fixture (with no bookmakers if it has no odds),
+        or None if the request failed.
+    """
+    return _single_entry(api_client.make_api_request("odds", {"fixture": fixture_id}))
+
+
+async def get_fixture_odds_index_async(session, fixture_id):
+    """Async counterpart of `get_fixture_odds_index`."""
+    return _single_entry(await api_client.make_api_request_async(session, "odds", {"fixture": fixture_id}))
+
+
+# Fixtures per page of the `odds` endpoint when it is queried by date or league.
+ODDS_PAGE_SIZE = config("API_ODDS_PAGE_SIZE", default=10, cast=int)
+
+
+def plan_bulk_odds_queries(fixtures, day_fixtures, day):
+    """
+    Chooses the paged `odds` queries that cover the given fixtures: either one
+    query for the whole day, or one per league of the fixtures, whichever is
+    expected to take fewer pages.
 
     Args:
-        fixture_id (int): The ID of the fixture.
+        fixtures (list): The fixtures whose odds are needed.
+        day_fixtures (list): Every fixture of the day (a query returns the odds of all of them).
+        day (str): The date, as YYYY-MM-DD.
 
     Returns:
-        dict: A structured dictionary of odds for target markets, or None.
+        tuple: (list of query parameters, expected number of pages).
     """
-    endpoint = "odds"
-    params = {"fixture": fixture_id}
+    leagues = {(f['league']['id'], f['league']['season']) for f in fixtures}
+    if not leagues:
+        return [], 0
+    per_league = Counter((f['league']['id'], f['league']['season']) for f in day_fixtures)
+    league_pages = sum(math.ceil(per_league.get(league, 1) / ODDS_PAGE_SIZE) for league in leagues)
+    day_pages = math.ceil(max(len(day_fixtures), 1) / ODDS_PAGE_SIZE)
+    if day_pages <= league_pages:
+        return [{"date": day}], day_pages
+    return [{"league": league_id, "season": season, "date": day} for league_id, season in sorted(leagues)], league_pages
 
-    response = api_client.make_api_request(endpoint, params)
-
-    if not response or not response.get('response'):
-        return None
 
-    # --- Parsing Logic ---
-    # We'll try to find the specific bookmaker requested by the user (ID 8 for Bet365).
-    # The structure is based on the sample response provided.
+def _page_count(response):
     try:
-        bookmaker_data = next(
-            (b for b in response['response'][0]['bookmakers'] if b['id'] == 8),
-            response['response'][0]['bookmakers'][0]  # Fallback to the first available bookmaker
+        return max(1, int(response['paging']['total']))
+    except (KeyError, TypeError, ValueError):
+        return 1
+
+
+def iter_odds_pages(params):
+    """
+    Yields the pages of a paged `odds` query one at a time, so each page can be
+    parsed and dropped before the next one is fetched.
+
+    Yields:
+        dict: The API response of each page, or None for a page that failed
+        (the following pages are then not requested).
+    """
+    page, total = 1, 1
+    while page <= total:
+        response = api_client.make_api_request("odds", {**params, "page": page})
+        yield response
+        if response is None:
+            return
+        total = _page_count(response)
+        page += 1
+
+
+def fetch_bulk_odds(queries):
+    """
+    Fetches and indexes the odds of every fixture covered by paged `odds` queries.
+
+    Returns:
+        tuple: (fixture ID to its `index_odds` entry, whether every page was fetched).
+    """
+    odds_index = {}
+    complete = True
+    for params in queries:
+        for response in iter_odds_pages(params):
+            if response is None:
+                complete = False
+                break
+            odds_index.update(index_odds(response))
+    return odds_index, complete
+
+
+async def fetch_bulk_odds_async(session, queries, concurrency):
+    """
+    Async counterpart of `fetch_bulk_odds`: the first page of each query tells
+    how many pages follow, which are then fetched concurrently (at most
+    `concurrency` at a time) and parsed as they arrive.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_page(params, page):
+        async with semaphore:
+            return await api_client.make_api_request_async(session, "odds", {**params, "page": page})
+
+    first_pages = await asyncio.gather(*(fetch_page(params, 1) for params in queries))
+    odds_index = {}
+    complete = True
+    pending = []
+    for params, response in zip(queries, first_pages):
+        if response is None:
+            complete = False
+            continue
+        odds_index.update(index_odds(response))
+        pending += [fetch_page(params, page) for page in range(2, _page_count(response) + 1)]
+
+    for next_page in asyncio.as_completed(pending):
+        response = await next_page
+        if response is None:
+            complete = False
+            continue
+        odds_index.update(index_odds(response))
+    return odds_index, complete
+
+
+# Bookmaker of the "preferred" odds line (Bet365); the first bookmaker listed is the fallback.
+PREFERRED_BOOKMAKER_ID = 8
+
+# API market name -> (market key, API selection -> selection key).
+MARKETS = {
+    'Match Winner': ('1x2', {'Home': 'home', 'Draw': 'draw', 'Away': 'away'}),
+    'Both Teams Score': ('btts', {'Yes': 'yes', 'No': 'no'}),
+}
+# Every line of this market is read: 'Over 2.5' -> ('ou_2_5', 'over').
+OVER_UNDER_MARKET = 'Goals Over/Under'
+MARKET_NAMES = {market: name for name, (market, _) in MARKETS.items()}
+
+# Selections a market needs before it is compared with our probabilities.
+REQUIRED_SELECTIONS = {'1x2': {'home', 'draw', 'away'}, 'btts': {'yes', 'no'}}
+OVER_UNDER_SELECTIONS = {'over', 'under'}
+
+
+@lru_cache(maxsize=4096)
+def _selection_key(market_name, value):
+    """
+    Maps an API market name and selection label to (market key, selection key).
+    Markets we do not model keep their API names.
+    """
+    if market_name in MARKETS:
+        market, selections = MARKETS[market_name]
+        if value in selections:
+            return market, selections[value]
+    elif market_name == OVER_UNDER_MARKET and isinstance(value, str):
+        side, _, line = value.partition(' ')
+        try:
+            return probabilities.market_key_for_line(float(line)), side.lower()
+        except ValueError:
+            pass
+    return market_name, value
+
+
+def _api_market_name(market):
+    if market.startswith('ou_'):
+        return OVER_UNDER_MARKET
+    return MARKET_NAMES.get(market, market)
+
+
+def index_odds(response):
+    """
+    Indexes an `odds` API response by fixture and bookmaker, in a single pass.
+
+    Works for single-fixture responses as well as bulk (by date or league)
+    responses covering many fixtures. The markets of a bookmaker are indexed the
+    first time one of them is looked up, and a market's selections are parsed
+    once, on its first lookup (see `get_market_odds`): every market and goal
+    line is available without paying for those nobody reads.
+
+    Args:
+        response (dict): The raw API response.
+
+    Returns:
+        dict: Fixture ID to {'bookmakers': {bookmaker ID: raw bets} in listed order,
+        'markets': {bookmaker ID: {API market name: raw values}}, 'parsed': lookup cache}.
+    """
+    index = {}
+    for entry in (response or {}).get('response') or []:
+        fixture_odds = index.setdefault(
+            (entry.get('fixture') or {}).get('id'), {'bookmakers': {}, 'markets': {}, 'parsed': {}}
         )
+        for bookmaker in entry.get('bookmakers') or []:
+            fixture_odds['bookmakers'].setdefault(bookmaker.get('id'), bookmaker.get('bets') or [])
+    return index
 
-        odds = {}
-        for market in bookmaker_data['bets']:
-            if market['name'] == 'Match Winner':
-                odds['1x2'] = {
-                    'home': float(next(v['odd'] for v in market['values'] if v['value'] == 'Home')),
-                    'draw': float(next(v['odd'] for v in market['values'] if v['value'] == 'Draw')),
-                    'away': float(next(v['odd'] for v in market['values'] if v['value'] == 'Away')),
-                }
-            elif market['name'] == 'Goals Over/Under':
-                # Find the 2.5 goal line
-                ou_2_5 = next((v for v in market['values'] if v['value'] == 'Over 2.5'), None)
-                if ou_2_5:
-                    odds['ou_2_5'] = {'over': float(ou_2_5['odd'])}
-                    # Find corresponding Under 2.5
-                    under_2_5 = next((v for v in market['values'] if v['value'] == 'Under 2.5'), None)
-                    if under_2_5:
-                        odds['ou_2_5']['under'] = float(under_2_5['odd'])
-
-            elif market['name'] == 'Both Teams Score':
-                odds['btts'] = {
-                    'yes': float(next(v['odd'] for v in market['values'] if v['value'] == 'Yes')),
-                    'no': float(next(v['odd'] for v in market['values'] if v['value'] == 'No')),
-                }
-        return odds
-
-    except (KeyError, StopIteration, IndexError) as e:
-        print(f"Could not parse odds from API response. Error: {e}")
-        return None
+
+def _parse_bet(fixture_odds, bookmaker_id, market_name):
+    """{market key: {selection key: odd}} for one API market of one bookmaker, parsed once."""
+    key = (bookmaker_id, market_name)
+    parsed = fixture_odds['parsed'].get(key)
+    if parsed is None:
+        markets = fixture_odds['markets'].get(bookmaker_id)
+        if markets is None:
+            markets = fixture_odds['markets'][bookmaker_id] = {
+                bet.get('name'): bet.get('values') or [] for bet in fixture_odds['bookmakers'].get(bookmaker_id, ())
+            }
+        parsed = {}
+        for value in markets.get(market_name, ()):
+            try:
+                odd = float(value['odd'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            market, selection = _selection_key(market_name, value.get('value'))
+            parsed.setdefault(market, {})[selection] = odd
+        fixture_odds['parsed'][key] = parsed
+    return parsed
+
+
+def get_market_odds(fixture_odds, bookmaker_id, market):
+    """
+    Looks up the odds of one market of one bookmaker in an entry of `index_odds`.
+
+    Args:
+        fixture_odds (dict): The index entry of a fixture.
+        bookmaker_id (int): The bookmaker.
+        market (str): A market key ('1x2', 'btts', 'ou_3_5', ...) or an API market name.
+
+    Returns:
+        dict: Selection key to odd (empty if the bookmaker does not price the market).
+    """
+    return _parse_bet(fixture_odds, bookmaker_id, _api_market_name(market)).get(market, {})
 
 
 def find_value_bets(our_probs, bookmaker_odds):
     """
-    Compares our probabilities with bookmaker odds to find value bets.
+    Compares our probabilities with one bookmaker's odds to find the value bets of
+    one fixture. Thin wrapper over `odds_matrix.find_value_bets`, which compares
+    whole slates of fixtures with the odds of every bookmaker at once.
 
     Args:
-        our_probs (dict): A dictionary of our calculated probabilities for different markets.
-        bookmaker_odds (dict): A dictionary of bookmaker odds for the same markets.
+        our_probs (dict): Our probabilities, keyed by market as in `probabilities`.
+        bookmaker_odds (dict): Market key to the odds of `get_market_odds`.
 
     Returns:
         list: A list of dictionaries, where each dictionary is a value bet.
     """
+    from . import odds_matrix  # odds_matrix builds on this module
+
     if not our_probs or not bookmaker_odds:
         return []
+    probs = [
+        our_probs.get(market, {}).get(key, math.nan)
+        for _, (market, key), _, _ in odds_matrix.VALUE_SELECTIONS
+    ]
+    prices = [[
+        bookmaker_odds.get(market, {}).get(selection, math.nan)
+        for market, selection in odds_matrix.COLUMNS
+    ]]
+    return odds_matrix.find_value_bets(probs, prices)[0]
+
 
-    value_bets = []
-
-    # 1X2 Market
-    if '1x2' in our_probs and '1x2' in bookmaker_odds:
-        if our_probs['1x2']['home_win'] * bookmaker_odds['1x2']['home'] > 1:
-            value_bets.append({'market': '1X2', 'value': 'Home', 'prob': our_probs['1x2']['home_win'], 'odds': bookmaker_odds['1x2']['home']})
-        if our_probs['1x2']['draw'] * bookmaker_odds['1x2']['draw'] > 1:
-            value_bets.append({'market': '1X2', 'value': 'Draw', 'prob': our_probs['1x2']['draw'], 'odds': bookmaker_odds['1x2']['draw']})
-        if our_probs['1x2']['away_win'] * bookmaker_odds['1x2']['away'] > 1:
-            value_bets.append({'market': '1X2', 'value': 'Away', 'prob': our_probs['1x2']['away_win'], 'odds': bookmaker_odds['1x2']['away']})
-
-    # Over/Under 2.5 Market
-    if 'ou_2_5' in our_probs and 'ou_2_5' in bookmaker_odds:
-        if our_probs['ou_2_5']['over'] * bookmaker_odds['ou_2_5']['over'] > 1:
-            value_bets.append({'market': 'O/U 2.5', 'value': 'Over', 'prob': our_probs['ou_2_5']['over'], 'odds': bookmaker_odds['ou_2_5']['over']})
-        if our_probs['ou_2_5']['under'] * bookmaker_odds['ou_2_5']['under'] > 1:
-            value_bets.append({'market': 'O/U 2.5', 'value': 'Under', 'prob': our_probs['ou_2_5']['under'], 'odds': bookmaker_odds['ou_2_5']['under']})
-
-    # BTTS Market
-    if 'btts' in our_probs and 'btts' in bookmaker_odds:
-        if our_probs['btts']['btts_yes'] * bookmaker_odds['btts']['yes'] > 1:
-            value_bets.append({'market': 'BTTS', 'value': 'Yes', 'prob': our_probs['btts']['btts_yes'], 'odds': bookmaker_odds['btts']['yes']})
-        if our_probs['btts']['btts_no'] * bookmaker_odds['btts']['no'] > 1:
-            value_bets.append({'market': 'BTTS', 'value': 'No', 'prob': our_probs['btts']['btts_no'], 'odds': bookmaker_odds['btts']['no']})
-
-    return value_bets
+def is_complete_market(market, selections):
+    """
+    Tells whether a market of `get_market_odds` has every selection it needs to be
+    compared with our probabilities (e.g. 1X2 without a Draw price is suspended).
+    """
+    required = REQUIRED_SELECTIONS.get(market)
+    if required is None and market.startswith('ou_'):
+        required = OVER_UNDER_SELECTIONS
+    return required is None or required <= selections.keys()
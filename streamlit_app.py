@@ -1,11 +1,10 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import json
 import os
 from datetime import datetime
-from src import statistics
-
-HISTORY_FILE = "history.json"
+from src import dashboard_data, instrumentation, stats_cube, stats_memo
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -14,23 +13,48 @@ st.set_page_config(
     layout="wide"
 )
 
+# Rows of the history table shown per page.
+PAGE_SIZE = 50
+
 # --- Data Loading ---
-@st.cache_data(ttl=3600) # Cache data for 1 hour
+# cache_resource: the frames are shared by every rerun and session instead of being
+# copied out of the cache each time. They are read-only: never modify them in place.
+@st.cache_resource(ttl=3600) # Cache data for 1 hour
 def load_data():
-    """Loads all historical value bets from the history file."""
-    if not os.path.exists(HISTORY_FILE):
-        return pd.DataFrame()
-
-    with open(HISTORY_FILE, "r") as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError:
-            return pd.DataFrame() # Return empty df if file is corrupt/empty
-
-    if not data:
-        return pd.DataFrame()
-
-    return pd.DataFrame(data)
+    """
+    Loads all historical value bets, prepared for display (see src/dashboard_data.py),
+    the performance aggregates of settled bets (see src/stats_cube.py) and their version.
+
+    Returns:
+        tuple: (bets with a valid date, number of bets with an invalid date, stats cube, version).
+    """
+    bets, version = dashboard_data.load_prepared_bets()
+    # Dates are parsed once by src/dashboard_data.py (match date, falling back to the bet timestamp).
+    valid_dates = bets['display_date_dt'].notna()
+    invalid_dates = int((~valid_dates).sum())
+    if invalid_dates:
+        bets = bets[valid_dates].reset_index(drop=True)
+    return bets, invalid_dates, stats_cube.load_cube(), version
+
+@st.cache_data(max_entries=4)
+def league_options(_bets, version):
+    return sorted(_bets['league'].dropna().unique())
+
+@st.cache_data(max_entries=64)
+def filter_positions(_bets, version, leagues, search_query, sort_by_col, sort_ascending):
+    """
+    Row positions of the bets matching the filters, in display order.
+    Keyed on the data version and the filter inputs; positions are cheap to cache and copy.
+    """
+    mask = _bets['league'].isin(leagues).to_numpy()
+    if search_query:
+        mask = mask & _bets['match'].str.contains(search_query, case=False, na=False, regex=False).to_numpy()
+    positions = np.flatnonzero(mask)
+    # The prepared frame is already in the default order (most recent match first).
+    if (sort_by_col, sort_ascending) != ("display_date_dt", False):
+        values = _bets[sort_by_col].iloc[positions].reset_index(drop=True)
+        positions = positions[values.sort_values(ascending=sort_ascending, kind="stable").index.to_numpy()]
+    return positions
 
 # --- Main App ---
 def load_status():
@@ -44,6 +68,40 @@ def load_status():
         except (json.JSONDecodeError, FileNotFoundError):
             return None
 
+def load_run_profile():
+    """Loads the timings of the last run, written by the collector next to status.json."""
+    if not os.path.exists(instrumentation.PROFILE_FILE):
+        return None
+    with open(instrumentation.PROFILE_FILE, "r") as f:
+        try:
+            return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return None
+
+def show_run_profile(profile):
+    """Duration, slowest stages and API calls of the last run, below the status banner."""
+    stages = profile.get("stages") or {}
+    api = profile.get("api") or {}
+    api_requests = sum(summary.get("requests", 0) for summary in api.values())
+    cache_hits = sum(summary.get("cache_hits", 0) for summary in api.values())
+    slowest = ", ".join(f"{stage} {summary['total_s']:.1f}s" for stage, summary in list(stages.items())[:3])
+    with st.expander(
+        f"⏱️ Durée de l'exécution : {profile.get('duration_s', 0):.0f}s | Appels API : {api_requests} "
+        f"(+{cache_hits} depuis le cache) | Étapes les plus longues : {slowest or 'N/A'}"
+    ):
+        if stages:
+            st.dataframe(pd.DataFrame([
+                {"Étape": stage, "Exécutions": summary["count"], "Total (s)": summary["total_s"],
+                 "p50 (ms)": summary["p50_s"] * 1000, "p95 (ms)": summary["p95_s"] * 1000}
+                for stage, summary in stages.items()
+            ]), use_container_width=True, hide_index=True)
+        if api:
+            st.dataframe(pd.DataFrame([
+                {"Endpoint": endpoint, "Requêtes": summary.get("requests", 0), "Cache": summary.get("cache_hits", 0),
+                 "p50 (ms)": summary.get("p50_s", 0) * 1000, "p95 (ms)": summary.get("p95_s", 0) * 1000}
+                for endpoint, summary in api.items()
+            ]), use_container_width=True, hide_index=True)
+
 status_data = load_status()
 if status_data:
     try:
@@ -57,33 +115,104 @@ if status_data:
 else:
     st.info("Statut de la dernière mise à jour non disponible.")
 
+run_profile = load_run_profile()
+if run_profile:
+    try:
+        show_run_profile(run_profile)
+    except Exception:
+        # A malformed profile must not break the page
+        pass
+
 
 st.title("⚽ Bilan & Historique des Value Bets")
 st.markdown("Analyse de la performance de l'algorithme au fil du temps.")
 
-df = load_data()
+df, parsing_errors, stats_cells, data_version = load_data()
 
 # --- Data Preparation ---
-if not df.empty:
-    # Robust date handling
-    if 'match_date' in df.columns:
-        # Convert each date column to UTC-aware datetime objects separately.
-        # This prevents TypeErrors when sorting mixed timezone-aware and naive datetimes.
-        match_dates_dt = pd.to_datetime(df['match_date'], errors='coerce', utc=True)
-        timestamps_dt = pd.to_datetime(df['timestamp'], errors='coerce', utc=True)
-
-        # Prioritize the official match_date, but fall back to the timestamp if match_date is invalid/missing.
-        df['display_date_dt'] = match_dates_dt.fillna(timestamps_dt)
-    else:
-        # Fallback for very old data before the match_date column existed.
-        df['display_date_dt'] = pd.to_datetime(df['timestamp'], errors='coerce', utc=True)
+# Check for any dates that are still invalid after all fallbacks and warn the user.
+if parsing_errors > 0:
+    st.warning(f"Attention : {parsing_errors} paris ont une date invalide et ont été exclus de l'affichage.")
+
+
+# --- DataFrame Styling ---
+def style_outcome(outcome):
+    if pd.isna(outcome): return ''
+    color = 'green' if outcome == 'Win' else 'red' if outcome == 'Loss' else 'grey'
+    return f'color: {color}; font-weight: bold;'
+
+# Helper function to style the stats tables
+def style_stats_df(df):
+    # sourcery skip: hide_index
+    return df.style.format({
+        'Taux de Victoire': '{:.2%}',
+        'ROI': '{:.2%}',
+        'Profit (u)': '{:+.2f}'
+    }).background_gradient(
+        cmap='RdYlGn', subset=['ROI'], vmin=-0.5, vmax=0.5
+    ).hide(axis="index")
+
+@st.fragment
+def history_table(bets, positions):
+    """
+    Paginated history table. Changing page reruns only this fragment, and only
+    the rows of the page are formatted and styled.
+    """
+    page_count = max(1, -(-len(positions) // PAGE_SIZE))
+    page = st.number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count, step=1, key="history_page")
+    start = (min(page, page_count) - 1) * PAGE_SIZE
+
+    display_df = bets.iloc[positions[start:start + PAGE_SIZE]][[
+        "display_date_dt", "match", "league", "market", "bet_value", "probability", "odds", "value", "outcome"
+    ]].copy()
 
-    # Check for any dates that are still invalid after all fallbacks and warn the user.
-    parsing_errors = df['display_date_dt'].isna().sum()
-    if parsing_errors > 0:
-        st.warning(f"Attention : {parsing_errors} paris ont une date invalide et ont été exclus de l'affichage.")
-        # Drop rows that still have invalid dates to prevent app from crashing.
-        df.dropna(subset=['display_date_dt'], inplace=True)
+    # Format the date for display
+    display_df['display_date_dt'] = display_df['display_date_dt'].dt.strftime('%Y-%m-%d %H:%M')
+
+    display_df.rename(columns={
+        "display_date_dt": "Date Match", "match": "Match", "league": "Ligue", "market": "Marché",
+        "bet_value": "Pari", "probability": "Notre Prob.", "odds": "Cote",
+        "value": "Valeur", "outcome": "Résultat"
+    }, inplace=True)
+
+    # Fill NaN for display
+    display_df['Résultat'] = display_df['Résultat'].astype(object).fillna('En attente')
+
+    st.dataframe(
+        display_df.style
+            .format({"Notre Prob.": "{:.2%}", "Valeur": "{:.2f}", "Cote": "{:.2f}"})
+            .apply(lambda x: x.map(style_outcome), subset=['Résultat']),
+        use_container_width=True,
+        hide_index=True
+    )
+    st.caption(f"{len(positions)} paris")
+
+# Detailed breakdowns: (key, section title, metric prefix, key column, message when empty, rows shown).
+BREAKDOWN_SECTIONS = [
+    ('league', "👑 Par Ligue (Top 10)", "Roi des Ligues", 'Ligue', "Pas assez de données par ligue (min 10 paris).", 10),
+    ('market', "👑 Par Type de Pari", "Roi des Marchés", 'Type de Pari', "Aucune donnée de marché.", None),
+    ('odds', "👑 Par Tranche de Cotes", "Reine des Cotes", 'Tranche de Cotes', "Aucune donnée de cote.", None),
+    ('value', "👑 Par Tranche de Valeur", "Reine de la Valeur", 'Tranche de Valeur', "Aucune donnée de valeur.", None),
+    ('prob', "👑 Par Tranche de Probabilité", "Reine de la Proba", 'Tranche de Proba', "Aucune donnée de probabilité.", None),
+]
+
+def breakdown_section(name, title, metric_prefix, key_col, empty_message, rows, filters):
+    # The expander reports whether it is open, so closed sections compute nothing.
+    section = st.expander(title, key=f"breakdown_{name}", on_change="rerun")
+    if not section.open:
+        return
+    with section:
+        stats_df = stats_memo.performance_breakdown(data_version, df, stats_cells, *filters, name, min_bets=10)
+        if stats_df.empty:
+            st.info(empty_message)
+            return
+        top = stats_df.iloc[0]
+        st.metric(
+            f"{metric_prefix} : {top[key_col]}",
+            f"{top['ROI']:.2%}",
+            f"{top['Profit (u)']:.2f}u en {top['Paris']} paris"
+        )
+        st.dataframe(style_stats_df(stats_df.head(rows) if rows else stats_df), use_container_width=True)
 
 
 if df.empty:
@@ -91,7 +220,7 @@ if df.empty:
 else:
     # --- Sidebar for Filters and Sorting ---
     st.sidebar.header("Filtres et Options")
-    leagues = sorted(df['league'].unique())
+    leagues = league_options(df, data_version)
     selected_leagues = st.sidebar.multiselect("Filtrer par ligue :", options=leagues, default=leagues)
     search_query = st.sidebar.text_input("Rechercher une équipe :")
     sort_options = {
@@ -102,23 +231,18 @@ else:
     sort_by_col, sort_ascending = sort_options[sort_by_label]
 
     # --- Filtering and Sorting Data ---
-    filtered_df = df[df['league'].isin(selected_leagues)]
-    if search_query:
-        filtered_df = filtered_df[filtered_df['match'].str.contains(search_query, case=False, na=False)]
-    sorted_df = filtered_df.sort_values(by=sort_by_col, ascending=sort_ascending)
+    filter_state = (data_version, tuple(selected_leagues), search_query, sort_by_col, sort_ascending)
+    positions = filter_positions(df, *filter_state)
+    # Back to the first page whenever the filters change.
+    if st.session_state.get("history_filters") != filter_state:
+        st.session_state["history_filters"] = filter_state
+        st.session_state["history_page"] = 1
 
     # --- Performance Metrics Calculation ---
-    settled_bets = sorted_df.dropna(subset=['outcome'])
-    total_settled = len(settled_bets)
-    wins = settled_bets[settled_bets['outcome'] == 'Win']
-    losses = settled_bets[settled_bets['outcome'] == 'Loss']
-    pushes = settled_bets[settled_bets['outcome'] == 'Push']
-
-    win_rate = len(wins) / total_settled if total_settled > 0 else 0
-
-    # Calculate profit/loss assuming 1 unit stake
-    profit = (wins['odds'] - 1).sum() - len(losses)
-    roi = (profit / total_settled) if total_settled > 0 else 0
+    # Memoized per (data version, leagues, search) and shared by every session:
+    # filter combinations already viewed are not recomputed.
+    totals = stats_memo.performance_totals(data_version, df, stats_cells, selected_leagues, search_query)
+    total_settled, win_rate, profit, roi = totals['bets'], totals['win_rate'], totals['profit'], totals['roi']
 
     # --- Display Logic ---
     st.header("Bilan de Performance (sur les paris terminés)")
@@ -129,132 +253,26 @@ else:
     col4.metric("ROI", f"{roi:.2%}")
 
     st.header("Historique des Paris")
-
-    # --- DataFrame Styling ---
-    def style_outcome(outcome):
-        if pd.isna(outcome): return ''
-        color = 'green' if outcome == 'Win' else 'red' if outcome == 'Loss' else 'grey'
-        return f'color: {color}; font-weight: bold;'
-
-    display_df = sorted_df[[
-        "display_date_dt", "match", "league", "market", "bet_value", "probability", "odds", "value", "outcome"
-    ]].copy()
-
-    # Safely format the date for display
-    display_df['display_date_dt'] = display_df['display_date_dt'].apply(
-        lambda x: x.strftime('%Y-%m-%d %H:%M') if pd.notna(x) else "Date Invalide"
-    )
-
-    display_df.rename(columns={
-        "display_date_dt": "Date Match", "match": "Match", "league": "Ligue", "market": "Marché",
-        "bet_value": "Pari", "probability": "Notre Prob.", "odds": "Cote",
-        "value": "Valeur", "outcome": "Résultat"
-    }, inplace=True)
-
-    # Fill NaN for display
-    display_df['Résultat'] = display_df['Résultat'].fillna('En attente')
-
-    st.dataframe(
-        display_df.style
-            .format({"Notre Prob.": "{:.2%}", "Valeur": "{:.2f}", "Cote": "{:.2f}"})
-            .apply(lambda x: x.map(style_outcome), subset=['Résultat']),
-        use_container_width=True,
-        hide_index=True
-    )
+    history_table(df, positions)
 
     # --- Detailed Statistics Section ---
     st.header("Analyses Détaillées")
     st.markdown("Analyses de performance par catégorie pour identifier les paris les plus et les moins rentables.")
 
-    with st.expander("Voir les analyses détaillées", expanded=True):
-        # Helper function to style the stats tables
-        def style_stats_df(df):
-            # sourcery skip: hide_index
-            return df.style.format({
-                'Taux de Victoire': '{:.2%}',
-                'ROI': '{:.2%}',
-                'Profit (u)': '{:+.2f}'
-            }).background_gradient(
-                cmap='RdYlGn', subset=['ROI'], vmin=-0.5, vmax=0.5
-            ).hide(axis="index")
-
-        # Calculate stats only on settled bets
-        settled_df = sorted_df.dropna(subset=['outcome'])
-
-        if settled_df.empty:
-            st.info("Aucun pari terminé à analyser pour les statistiques détaillées.")
-        else:
-            col1, col2 = st.columns(2)
-
-            with col1:
-                st.subheader("👑 Par Ligue (Top 10)")
-                league_stats = statistics.get_stats_by_league(settled_df, min_bets=10)
-                if not league_stats.empty:
-                    top_league = league_stats.iloc[0]
-                    st.metric(
-                        f"Roi des Ligues : {top_league['Ligue']}",
-                        f"{top_league['ROI']:.2%}",
-                        f"{top_league['Profit (u)']:.2f}u en {top_league['Paris']} paris"
-                    )
-                    st.dataframe(style_stats_df(league_stats.head(10)), use_container_width=True)
-                else:
-                    st.info("Pas assez de données par ligue (min 10 paris).")
-
-                st.subheader("👑 Par Type de Pari")
-                market_stats = statistics.get_stats_by_market(settled_df)
-                if not market_stats.empty:
-                    top_market = market_stats.iloc[0]
-                    st.metric(
-                        f"Roi des Marchés : {top_market['Type de Pari']}",
-                        f"{top_market['ROI']:.2%}",
-                        f"{top_market['Profit (u)']:.2f}u en {top_market['Paris']} paris"
-                    )
-                    st.dataframe(style_stats_df(market_stats), use_container_width=True)
-                else:
-                    st.info("Aucune donnée de marché.")
-
-
-            with col2:
-                st.subheader("👑 Par Tranche de Cotes")
-                odds_stats = statistics.get_stats_by_odds_range(settled_df)
-                if not odds_stats.empty:
-                    top_odds = odds_stats.iloc[0]
-                    st.metric(
-                        f"Reine des Cotes : {top_odds['Tranche de Cotes']}",
-                        f"{top_odds['ROI']:.2%}",
-                        f"{top_odds['Profit (u)']:.2f}u en {top_odds['Paris']} paris"
-                    )
-                    st.dataframe(style_stats_df(odds_stats), use_container_width=True)
-                else:
-                    st.info("Aucune donnée de cote.")
-
-
-                st.subheader("👑 Par Tranche de Valeur")
-                value_stats = statistics.get_stats_by_value_range(settled_df)
-                if not value_stats.empty:
-                    top_value = value_stats.iloc[0]
-                    st.metric(
-                        f"Reine de la Valeur : {top_value['Tranche de Valeur']}",
-                        f"{top_value['ROI']:.2%}",
-                        f"{top_value['Profit (u)']:.2f}u en {top_value['Paris']} paris"
-                    )
-                    st.dataframe(style_stats_df(value_stats), use_container_width=True)
-                else:
-                    st.info("Aucune donnée de valeur.")
-
-            # Probability stats can take the full width
-            st.subheader("👑 Par Tranche de Probabilité")
-            prob_stats = statistics.get_stats_by_prob_range(settled_df)
-            if not prob_stats.empty:
-                top_prob = prob_stats.iloc[0]
-                st.metric(
-                    f"Reine de la Proba : {top_prob['Tranche de Proba']}",
-                    f"{top_prob['ROI']:.2%}",
-                    f"{top_prob['Profit (u)']:.2f}u en {top_prob['Paris']} paris"
-                )
-                st.dataframe(style_stats_df(prob_stats), use_container_width=True)
-            else:
-                st.info("Aucune donnée de probabilité.")
+    # Calculate stats only on settled bets
+    if total_settled == 0:
+        st.info("Aucun pari terminé à analyser pour les statistiques détaillées.")
+    else:
+        filters = (selected_leagues, search_query)
+        col1, col2 = st.columns(2)
+        with col1:
+            for section in BREAKDOWN_SECTIONS[:2]:
+                breakdown_section(*section, filters)
+        with col2:
+            for section in BREAKDOWN_SECTIONS[2:4]:
+                breakdown_section(*section, filters)
+        # Probability stats can take the full width
+        breakdown_section(*BREAKDOWN_SECTIONS[4], filters)
 
 
 # --- Sidebar for Explanations ---